@@ -0,0 +1,157 @@
+import socket
+import threading
+from collections import deque
+
+import stats
+from collector import Reporter, tick_time
+from protocol import AgentSample, PORTS, FILES, encode_hello, encode_samples, encode_delta
+
+
+class AgentClient:
+    """
+    Streams the samples and security changes of this host to an aggregator over TCP.
+
+    Samples are buffered and sent in one batch every `batch_interval` seconds, which keeps
+    the traffic at a few dozen bytes per second at one sample per second. While the
+    aggregator cannot be reached, up to `buffer_size` samples are kept and sent after
+    reconnecting, the oldest ones are dropped beyond that. The agent keeps the complete
+    sets of open ports and insecure files, so after every (re)connect it sends them in full
+    and then only their changes.
+
+    Args:
+        address (tuple): (host, port) of the aggregator.
+        name (str): Name of this agent, shown by the aggregator. Usually the host name.
+        batch_interval (float, optional): Seconds between two batches. Defaults to 10.
+        buffer_size (int, optional): Most samples kept while disconnected. Defaults to 3600.
+        timeout (float, optional): Connect and send timeout in seconds. Defaults to 10.
+    """
+
+    def __init__(self, address, name, batch_interval=10, buffer_size=3600, timeout=10):
+        self.address = address
+        self.name = name
+        self.batch_interval = batch_interval
+        self.timeout = timeout
+        self.bytes_sent = 0
+        self._samples = deque(maxlen=buffer_size)
+        self._state = {PORTS: set(), FILES: set()}
+        self._deltas = []  # Encoded DELTA frames not sent yet
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._socket = None
+        self._thread = None
+
+    def add_sample(self, sample):
+        """Queue one `AgentSample` for the next batch."""
+        with self._lock:
+            self._samples.append(sample)
+
+    def update(self, kind, added, removed):
+        """
+        Record a change of the open ports or insecure files and queue it for the next batch.
+
+        Args:
+            kind (int): protocol.PORTS or protocol.FILES.
+            added (list of str): Lines that appeared.
+            removed (list of str): Lines that disappeared.
+        """
+        with self._lock:
+            self._state[kind].difference_update(removed)
+            self._state[kind].update(added)
+            if self._socket is not None:
+                self._deltas.append(encode_delta(kind, added, removed))
+
+    def start(self):
+        """Start the sender thread."""
+        self._thread = threading.Thread(target=self._run, name="agent-sender", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Send what is buffered and stop the sender thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.timeout)
+            self._thread = None
+
+    def flush(self):
+        """
+        Send the buffered samples and changes, connecting first if needed.
+
+        Returns:
+            bool: True if everything was sent, False if the aggregator could not be reached.
+        """
+        try:
+            if self._socket is None:
+                self._connect()
+            with self._lock:
+                samples = list(self._samples)
+                data = b"".join(self._deltas) + encode_samples(samples)
+                self._deltas = []
+            if data:
+                self._socket.sendall(data)
+                self.bytes_sent += len(data)
+                stats.count("agent.bytes_sent", len(data))
+            with self._lock:
+                for _ in range(len(samples)):
+                    self._samples.popleft()
+            return True
+        except OSError as e:
+            stats.count("agent.errors")
+            print(f"Cannot send to aggregator {self.address[0]}:{self.address[1]}: {e}")
+            self._close()
+            return False
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=self.timeout)
+        with self._lock:
+            # Send the complete state first; changes queued before are part of it
+            data = encode_hello(self.name)
+            data += encode_delta(PORTS, sorted(self._state[PORTS]), [], reset=True)
+            data += encode_delta(FILES, sorted(self._state[FILES]), [], reset=True)
+            self._deltas = []
+            self._socket = sock
+        try:
+            sock.sendall(data)
+        except OSError:
+            self._close()
+            raise
+        self.bytes_sent += len(data)
+        stats.count("agent.bytes_sent", len(data))
+        stats.count("agent.connects")
+
+    def _close(self):
+        with self._lock:
+            sock, self._socket = self._socket, None
+        if sock is not None:
+            sock.close()
+
+    def _run(self):
+        while not self._stop.wait(self.batch_interval):
+            self.flush()
+        self.flush()
+        self._close()
+
+
+class AgentReporter(Reporter):
+    """
+    Reporter of an agent: passes the collector results to an `AgentClient` instead of a window.
+
+    Args:
+        client (AgentClient): The client that sends the results to the aggregator.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def show_health(self, cpu_usage, memory_usage, disk_usage, sent_per_sec, recv_per_sec, alerting=()):
+        self.client.add_sample(AgentSample(tick_time(), cpu_usage, memory_usage, disk_usage, sent_per_sec, recv_per_sec))
+
+    def show_port_changes(self, ports_added, ports_removed):
+        self.client.update(PORTS, ports_added, ports_removed)
+
+    def show_insecure_file_changes(self, files_added, files_removed):
+        self.client.update(FILES, files_added, files_removed)
+
+
+def default_agent_name():
+    """Return the host name, used as the agent name by default."""
+    return socket.gethostname()
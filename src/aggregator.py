@@ -0,0 +1,159 @@
+import threading
+
+import stats
+from protocol import HEADER, HELLO, VERSION, Hello, ProtocolError, decode
+
+
+class AgentHandler:
+    """
+    Receives what the agents send to an `Aggregator`.
+
+    This base class ignores everything; `monitor.MonitorAgentHandler` feeds the agents'
+    data into the metric store, alerting and display. All methods are called from the
+    aggregator's event loop thread, so they must not block.
+    """
+
+    def agent_connected(self, name, address):
+        """An agent called `name` connected from `address` (host, port)."""
+
+    def agent_samples(self, name, samples):
+        """An agent sent a batch of `protocol.AgentSample`."""
+
+    def agent_delta(self, name, delta):
+        """An agent sent a change (`protocol.Delta`) of its open ports or insecure files."""
+
+    def agent_disconnected(self, name):
+        """An agent disconnected, or sent nothing for longer than the timeout."""
+
+
+class Aggregator:
+    """
+    Receives samples and security changes from many agents over TCP.
+
+    The server runs an asyncio event loop on its own thread, so hundreds of agents are
+    served by one thread without a thread per connection. Each connection must start with
+    a HELLO frame; after that, every frame is decoded and passed to the handler. A
+    connection that sends a malformed frame, or nothing for `timeout` seconds, is closed;
+    the timeout catches agents whose host died without closing the connection.
+
+    When an agent reconnects under the same name, its previous connection is closed, and
+    only the close of the connection currently registered for a name reports the agent
+    disconnected.
+
+    Args:
+        host (str): Address to listen on, e.g. "0.0.0.0" for all interfaces.
+        port (int): Port to listen on.
+        handler (AgentHandler): Receives the decoded messages.
+        timeout (float, optional): Seconds without a frame before a connection is closed,
+            a few batch intervals of the agents. Defaults to 60.
+    """
+
+    def __init__(self, host, port, handler, timeout=60.0):
+        self.host = host
+        self.port = port
+        self.handler = handler
+        self.timeout = timeout
+        self.connections = 0
+        self._agents = {}  # Agent name -> writer of its current connection
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._error = None
+
+    def start(self):
+        """
+        Start listening.
+
+        Raises:
+            OSError: If the address cannot be bound.
+        """
+        self._thread = threading.Thread(target=self._run, name="aggregator", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+        stats.register_gauge("aggregator.connections", lambda: self.connections)
+
+    def stop(self):
+        """Close all connections and stop the event loop."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    def _run(self):
+        # asyncio is only imported when the aggregator runs, it is slow to import
+        import asyncio
+
+        loop = asyncio.new_event_loop()
+        try:
+            self._server = loop.run_until_complete(asyncio.start_server(self._serve, self.host, self.port))
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+            loop.close()
+            return
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._loop = loop
+        self._ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            self._server.close()
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.close()
+
+    async def _serve(self, reader, writer):
+        import asyncio
+
+        address = writer.get_extra_info("peername")
+        name = None
+        self.connections += 1
+        try:
+            message_type, hello = await self._read_frame(reader)
+            if message_type != HELLO or not isinstance(hello, Hello) or hello.version != VERSION:
+                raise ProtocolError("expected a HELLO frame of a supported version")
+            name = hello.name
+            previous = self._agents.get(name)
+            self._agents[name] = writer
+            if previous is not None:
+                # A reconnect while the old connection is still open, e.g. half-open
+                previous.close()
+            self.handler.agent_connected(name, address)
+            while True:
+                message_type, message = await self._read_frame(reader)
+                if isinstance(message, list):
+                    self.handler.agent_samples(name, message)
+                elif message_type != HELLO:
+                    self.handler.agent_delta(name, message)
+        except asyncio.IncompleteReadError:
+            pass  # The agent closed the connection
+        except asyncio.TimeoutError:
+            stats.count("aggregator.timeouts")
+            print(f"Closing agent connection from {address}: nothing received for {self.timeout:g} seconds")
+        except (ProtocolError, OSError) as e:
+            stats.count("aggregator.errors")
+            print(f"Closing agent connection from {address}: {e}")
+        except Exception as e:
+            stats.count("aggregator.errors")
+            print(f"Agent handler failed for {name}, closing the connection: {e}")
+        finally:
+            self.connections -= 1
+            writer.close()
+            if name is not None and self._agents.get(name) is writer:
+                del self._agents[name]
+                self.handler.agent_disconnected(name)
+
+    async def _read_frame(self, reader):
+        import asyncio
+
+        header = await asyncio.wait_for(reader.readexactly(HEADER.size), self.timeout)
+        length, message_type = HEADER.unpack(header)
+        payload = await asyncio.wait_for(reader.readexactly(length), self.timeout)
+        stats.count("aggregator.bytes_received", HEADER.size + length)
+        return message_type, decode(message_type, payload)
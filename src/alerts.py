@@ -0,0 +1,392 @@
+import json
+import queue
+import threading
+import time
+import stats
+from datetime import datetime
+
+
+class SmtpSink:
+    """
+    Sends alerts by email over one reused, authenticated SMTP connection.
+
+    The connection is opened on the first alert and kept open. smtplib and the email package
+    are only imported then, since most runs never send an alert. While idle it is kept alive
+    with NOOP through `keepalive`, and it is reopened when the server has dropped it.
+
+    Args:
+        server (str): SMTP server address.
+        port (int): SMTP server port.
+        email_from (str): Sender email address.
+        email_to (str): Recipient email address.
+        username (str, optional): SMTP username. No login is done without it. Defaults to None.
+        password (str, optional): SMTP password. Defaults to None.
+        starttls (bool, optional): Whether to upgrade the connection with STARTTLS. Defaults to True.
+        timeout (float, optional): Socket timeout in seconds. Defaults to 30.
+    """
+
+    name = "smtp"
+
+    def __init__(self, server, port, email_from, email_to, username=None, password=None, starttls=True, timeout=30):
+        self.server = server
+        self.port = port
+        self.email_from = email_from
+        self.email_to = email_to
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self._connection = None
+
+    def send(self, subject, body):
+        """
+        Send one alert email, reconnecting once if the connection was dropped.
+
+        Args:
+            subject (str): The subject of the email.
+            body (str): The body content of the email.
+
+        Raises:
+            smtplib.SMTPException, OSError: If the email cannot be sent.
+        """
+        import smtplib
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
+
+        msg = MIMEMultipart()
+        msg['From'] = self.email_from
+        msg['To'] = self.email_to
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain'))
+
+        try:
+            self._connect().sendmail(self.email_from, self.email_to, msg.as_string())
+        except smtplib.SMTPServerDisconnected:
+            self.close()
+            self._connect().sendmail(self.email_from, self.email_to, msg.as_string())
+
+    def keepalive(self):
+        """Send NOOP on an open connection so the server does not drop it while idle."""
+        if self._connection is None:
+            return
+        import smtplib
+        try:
+            self._connection.noop()
+        except (smtplib.SMTPException, OSError):
+            self.close()
+
+    def close(self):
+        """Close the connection, if any."""
+        if self._connection is None:
+            return
+        import smtplib
+        try:
+            self._connection.quit()
+        except (smtplib.SMTPException, OSError):
+            self._connection.close()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is not None:
+            return self._connection
+        import smtplib
+        connection = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                connection.starttls()
+            if self.username:
+                connection.login(self.username, self.password)
+        except Exception:
+            connection.close()
+            raise
+        self._connection = connection
+        return connection
+
+
+class WebhookSink:
+    """
+    Sends alerts as a JSON POST request to an HTTP webhook.
+
+    The request body is {"subject": ..., "body": ...}.
+
+    Args:
+        url (str): Webhook URL.
+        timeout (float, optional): Request timeout in seconds. Defaults to 10.
+    """
+
+    name = "webhook"
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, subject, body):
+        """
+        Post one alert to the webhook.
+
+        Args:
+            subject (str): The subject of the alert.
+            body (str): The body content of the alert.
+
+        Raises:
+            urllib.error.URLError, OSError: If the request fails.
+        """
+        import urllib.request
+
+        data = json.dumps({"subject": subject, "body": body}).encode()
+        request = urllib.request.Request(self.url, data=data, headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    def keepalive(self):
+        """Webhooks use a new request per alert, so there is nothing to keep alive."""
+
+    def close(self):
+        """Webhooks hold no connection, so there is nothing to close."""
+
+
+class StubSink:
+    """
+    Keeps alerts in memory instead of sending them, for replays and load tests.
+
+    Args:
+        clock (callable, optional): Returns the time stored with each alert. Defaults to time.time.
+    """
+
+    name = "stub"
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.alerts = []  # (time, subject, body)
+
+    def send(self, subject, body):
+        """Keep one alert."""
+        self.alerts.append((self.clock(), subject, body))
+
+    def keepalive(self):
+        """Nothing is connected, so there is nothing to keep alive."""
+
+    def close(self):
+        """Nothing is connected, so there is nothing to close."""
+
+
+class AlertDispatcher:
+    """
+    Delivers alerts to the sinks on a background thread.
+
+    Collectors only put alerts on a bounded queue, so a slow or unreachable mail server can
+    never stall metric collection. When the queue is full, new alerts are dropped. Each sink
+    is retried with exponential backoff. While no alerts arrive, the sinks are asked every
+    `keepalive_interval` seconds to keep their connections alive. Send latencies per sink,
+    the sent, failed and dropped counts and the queue depth are recorded in `stats`.
+
+    Args:
+        sinks (list): Sinks with `send(subject, body)`, `keepalive()` and `close()` methods,
+            e.g. `SmtpSink` and `WebhookSink`.
+        queue_size (int, optional): Most alerts waiting to be sent. Defaults to 100.
+        retries (int, optional): Retries per sink after a failed send. Defaults to 3.
+        backoff (float, optional): Seconds before the first retry, doubled on every retry.
+            Defaults to 1.0.
+        keepalive_interval (float, optional): Idle seconds between keepalives. Defaults to 60.
+    """
+
+    def __init__(self, sinks, queue_size=100, retries=3, backoff=1.0, keepalive_interval=60):
+        self.sinks = list(sinks)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.retries = retries
+        self.backoff = backoff
+        self.keepalive_interval = keepalive_interval
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self._thread = None
+        stats.register_gauge("alerts.queue", self.queue.qsize)
+
+    def start(self):
+        """Start the dispatcher thread."""
+        self._thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop the dispatcher after the queued alerts have been handled and close the sinks.
+
+        Args:
+            timeout (float, optional): Seconds to wait for the thread. Defaults to None.
+        """
+        if self._thread is None:
+            return
+        self.queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, subject, body):
+        """
+        Queue an alert for delivery. Never blocks.
+
+        Args:
+            subject (str): The subject of the alert.
+            body (str): The body content of the alert.
+
+        Returns:
+            bool: True if the alert was queued, False if the queue was full and it was dropped.
+        """
+        try:
+            self.queue.put_nowait((subject, body))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            stats.count("alerts.dropped")
+            print(f"Alert queue full, dropping alert: {subject}")
+            return False
+
+    def _run(self):
+        while True:
+            try:
+                alert = self.queue.get(timeout=self.keepalive_interval)
+            except queue.Empty:
+                for sink in self.sinks:
+                    sink.keepalive()
+                continue
+            if alert is None:
+                break
+            for sink in self.sinks:
+                self._deliver(sink, *alert)
+        for sink in self.sinks:
+            sink.close()
+
+    def _deliver(self, sink, subject, body):
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                with stats.timed(f"alerts.{sink.name}"):
+                    sink.send(subject, body)
+                self.sent += 1
+                stats.count("alerts.sent")
+                return
+            except Exception as e:
+                stats.count(f"alerts.{sink.name}.errors")
+                print(f"Failed to send alert via {sink.name} (attempt {attempt + 1}): {e}")
+                sink.close()
+            if attempt < self.retries:
+                time.sleep(delay)
+                delay *= 2
+        self.failed += 1
+        stats.count("alerts.failed")
+
+
+class AlertWindow:
+    """
+    Summary of the alerts of one type during one aggregation window.
+
+    Args:
+        opened (float): Time the window was opened, in seconds since the epoch.
+    """
+
+    __slots__ = ("opened", "count", "first_seen", "last_seen", "peak", "last_message")
+
+    def __init__(self, opened):
+        self.opened = opened
+        self.count = 0
+        self.first_seen = None
+        self.last_seen = None
+        self.peak = None
+        self.last_message = None
+
+    def record(self, now, message, value):
+        """Count one alert of this window."""
+        self.count += 1
+        if self.first_seen is None:
+            self.first_seen = now
+        self.last_seen = now
+        if value is not None and (self.peak is None or value > self.peak):
+            self.peak = value
+        self.last_message = message
+
+
+class AlertAggregator:
+    """
+    Coalesces alerts per alert type into at most one digest per window.
+
+    The first alert of a type is sent right away and opens a window of `window` seconds.
+    Further alerts of that type during the window are not sent but counted, with the time
+    they were first and last seen, the peak value and the last message. When the window ends,
+    one digest with that summary is sent and a new window opens; a window without further
+    alerts closes quietly. The mail volume is therefore bounded per alert type however many
+    alerts are raised, without losing the information that they happened.
+
+    Windows are closed by `add` and `flush`, so `flush` should be called periodically.
+
+    Args:
+        send (callable): Function called with (subject, body) for every alert and digest.
+        window (float, optional): Window length in seconds. Defaults to 300.
+        clock (callable, optional): Returns the current time in seconds. Defaults to time.time.
+    """
+
+    def __init__(self, send, window=300, clock=time.time):
+        self.send = send
+        self.window = window
+        self.clock = clock
+        self._windows = {}  # alert type -> AlertWindow
+        self._lock = threading.Lock()
+
+    def add(self, alert_type, message, value=None):
+        """
+        Raise an alert.
+
+        Args:
+            alert_type (str): Alert type, also used as the email subject, e.g. "Network Monitor Warning".
+            message (str): Description of this occurrence.
+            value (float, optional): Measured value, whose peak is reported in digests. Defaults to None.
+
+        Returns:
+            bool: True if the alert was sent right away, False if it was added to a digest.
+        """
+        with self._lock:
+            now = self.clock()
+            digests = self._expire(now)
+            window = self._windows.get(alert_type)
+            if window is None:
+                self._windows[alert_type] = AlertWindow(now)
+            else:
+                window.record(now, message, value)
+        for subject, body in digests:
+            self.send(subject, body)
+        if window is None:
+            self.send(alert_type, message)
+        return window is None
+
+    def flush(self):
+        """Send the digests of all windows that have ended."""
+        with self._lock:
+            digests = self._expire(self.clock())
+        for subject, body in digests:
+            self.send(subject, body)
+
+    def _expire(self, now):
+        digests = []
+        for alert_type, window in list(self._windows.items()):
+            if now - window.opened < self.window:
+                continue
+            if window.count:
+                digests.append(self._digest(alert_type, window, now))
+                self._windows[alert_type] = AlertWindow(now)
+            else:
+                del self._windows[alert_type]
+        return digests
+
+    def _digest(self, alert_type, window, now):
+        minutes = (now - window.opened) / 60
+        lines = [
+            f"{window.count} more '{alert_type}' alerts in the last {minutes:.0f} minutes.",
+            f"First seen: {_format_time(window.first_seen)}",
+            f"Last seen: {_format_time(window.last_seen)}",
+        ]
+        if window.peak is not None:
+            lines.append(f"Peak value: {window.peak:.2f}")
+        lines.append(f"Last alert: {window.last_message}")
+        return f"{alert_type} (digest of {window.count} alerts)", "\n".join(lines)
+
+
+def _format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
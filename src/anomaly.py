@@ -0,0 +1,286 @@
+import math
+import threading
+import time
+from collections import namedtuple
+
+# Detectors of the anomaly engine
+DETECTORS = ("ewma", "zscore", "seasonal")
+
+# An observation that is unusually high for its series: the detector that found it, the
+# value, the baseline (mean) it was compared with and its z-score
+Anomaly = namedtuple("Anomaly", ["series", "detector", "value", "baseline", "score"])
+
+
+class AnomalyEngine:
+    """
+    Finds values that are unusually high compared with the recent or usual values of their
+    series, also when they are below the static thresholds.
+
+    Three detectors can be enabled, each scoring an observation as a z-score against its
+    own baseline:
+
+    - "ewma": exponentially weighted moving mean and variance with a half-life of
+      `halflife` observations. Catches sudden changes.
+    - "zscore": mean and standard deviation of the last `window` observations.
+    - "seasonal": an EWMA per hour of the day with a half-life of `seasonal_halflife`
+      observations of that hour, so a value is compared with the same time on previous
+      days. Catches gradual drifts such as leaks, which the other two follow.
+
+    Both EWMAs are cumulative (Welford) means and variances of all observations until they
+    have seen as many as their weights average over, so a young baseline does not start out
+    with a variance far below the real one.
+
+    An observation is an anomaly when its z-score is above `threshold` once the baseline has
+    seen `warmup` observations (`seasonal_warmup` per hour for "seasonal"). Standard
+    deviations are at least `min_std`, so flat series do not fire on tiny changes.
+
+    Series (e.g. "cpu" or "web1:memory") are registered on their first observation. The
+    state of all series is kept in columns, and `evaluate` updates them together: with NumPy,
+    one vectorized step per round updates every series, so many metrics of many hosts stay
+    cheap on one core. Without NumPy, the same statistics are computed per series in Python.
+
+    `observe` may be called from any thread; `evaluate` is called from one thread.
+
+    Args:
+        detectors (iterable of str, optional): Detectors to run. Defaults to all of `DETECTORS`.
+        threshold (float, optional): z-score above which a value is an anomaly. Defaults to 4.
+        window (int, optional): Observations in the "zscore" window. Defaults to 300.
+        halflife (float, optional): Half-life of the "ewma" baseline in observations.
+            Defaults to 60.
+        seasonal_halflife (float, optional): Half-life of every hourly "seasonal" baseline in
+            observations of that hour. Defaults to 25200, a week at one sample per second.
+        warmup (int, optional): Observations before "ewma" and "zscore" can fire. Defaults to 60.
+        seasonal_warmup (int, optional): Observations of an hour before "seasonal" can fire
+            for it. Defaults to 3600, an hour at one sample per second.
+        min_std (float, optional): Lowest standard deviation used. Defaults to 0.5.
+        use_numpy (bool, optional): Whether to use NumPy. Defaults to using it if installed.
+    """
+
+    def __init__(self, detectors=DETECTORS, threshold=4.0, window=300, halflife=60, seasonal_halflife=25200,
+                 warmup=60, seasonal_warmup=3600, min_std=0.5, use_numpy=None):
+        self.detectors = tuple(detectors)
+        self.threshold = threshold
+        self.window = window
+        self.alpha = 1 - 0.5 ** (1 / halflife)
+        self.seasonal_alpha = 1 - 0.5 ** (1 / seasonal_halflife)
+        self.warmup = min(warmup, window)
+        self.seasonal_warmup = seasonal_warmup
+        self.min_std = min_std
+        self.names = []
+        self.index = {}
+        self._pending = {}  # Series index -> observations since the last evaluate
+        self.evaluated = []  # Series that had observations in the last evaluate
+        self._lock = threading.Lock()
+        self._rounds = 0
+
+        self.np = None
+        if use_numpy is not False:
+            try:
+                import numpy
+                self.np = numpy
+            except ImportError:
+                if use_numpy:
+                    raise
+        self._capacity = 0
+        self._grow(16)
+
+    def observe(self, series, value):
+        """
+        Add an observation of a series, evaluated by the next `evaluate`.
+
+        Args:
+            series (str): Name of the series, e.g. "cpu" or "web1:cpu".
+            value (float): The observed value.
+        """
+        with self._lock:
+            i = self.index.get(series)
+            if i is None:
+                i = self.index[series] = len(self.names)
+                self.names.append(series)
+            self._pending.setdefault(i, []).append(value)
+
+    def evaluate(self, timestamp=None):
+        """
+        Score the observations since the previous call and update the baselines.
+
+        Observations are evaluated in rounds: round r holds the r-th pending observation of
+        every series, so a batch of samples of one host takes as many rounds as it has
+        samples, however many hosts there are. The names of the series that had observations
+        are kept in `evaluated`, e.g. to tell which series are no longer anomalous.
+
+        Args:
+            timestamp (float, optional): Time of the observations, in seconds since the epoch,
+                which selects the hour of the "seasonal" baseline. Defaults to now.
+
+        Returns:
+            list of Anomaly: The anomalies, in round and series order.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self.evaluated = [self.names[i] for i in pending]
+            if len(self.names) > self._capacity:
+                self._grow(max(len(self.names), 2 * self._capacity))
+        if not pending:
+            return []
+        hour = time.localtime(time.time() if timestamp is None else timestamp).tm_hour
+
+        anomalies = []
+        rounds = max(len(values) for values in pending.values())
+        for r in range(rounds):
+            indices = [i for i, values in pending.items() if len(values) > r]
+            values = [pending[i][r] for i in indices]
+            if self.np is not None:
+                anomalies.extend(self._round_numpy(indices, values, hour))
+            else:
+                anomalies.extend(self._round_python(indices, values, hour))
+            self._rounds += 1
+            if self.np is not None and self._rounds % self.window == 0:
+                # Recompute the window sums now and then, so rounding errors do not add up
+                self._sum[:] = self._ring.sum(axis=0)
+                self._sumsq[:] = (self._ring ** 2).sum(axis=0)
+        return anomalies
+
+    def _grow(self, capacity):
+        added = capacity - self._capacity
+        if self.np is not None:
+            np = self.np
+
+            def extend(array, rows=None):
+                shape = (added,) if rows is None else (rows, added)
+                filler = np.zeros(shape, dtype=array.dtype if array is not None else float)
+                return filler if array is None else np.concatenate([array, filler], axis=-1)
+
+            first = self._capacity == 0
+            self._ewma_mean = extend(None if first else self._ewma_mean)
+            self._ewma_var = extend(None if first else self._ewma_var)
+            self._ewma_count = extend(None if first else self._ewma_count)
+            self._ring = extend(None if first else self._ring, self.window)
+            self._position = extend(None if first else self._position)
+            self._filled = extend(None if first else self._filled)
+            self._sum = extend(None if first else self._sum)
+            self._sumsq = extend(None if first else self._sumsq)
+            self._season_mean = extend(None if first else self._season_mean, 24)
+            self._season_var = extend(None if first else self._season_var, 24)
+            self._season_count = extend(None if first else self._season_count, 24)
+            if first:
+                self._position = self._position.astype(int)
+                self._filled = self._filled.astype(int)
+        else:
+            if self._capacity == 0:
+                self._ewma_mean, self._ewma_var, self._ewma_count = [], [], []
+                self._ring, self._position, self._filled, self._sum, self._sumsq = [], [], [], [], []
+                self._season_mean, self._season_var, self._season_count = [], [], []
+            for _ in range(added):
+                for column in (self._ewma_mean, self._ewma_var, self._ewma_count, self._sum, self._sumsq):
+                    column.append(0.0)
+                self._position.append(0)
+                self._filled.append(0)
+                self._ring.append([0.0] * self.window)
+                self._season_mean.append([0.0] * 24)
+                self._season_var.append([0.0] * 24)
+                self._season_count.append([0] * 24)
+        self._capacity = capacity
+
+    def _round_numpy(self, indices, values, hour):
+        np = self.np
+        idx = np.array(indices)
+        x = np.array(values, dtype=float)
+        fired = []
+
+        def ewma(mean, var, count, alpha, warmup):
+            # Score against the baseline before this value, then move the baseline
+            std = np.maximum(np.sqrt(var), self.min_std)
+            score = (x - mean) / std
+            fire = (count >= warmup) & (score > self.threshold)
+            diff = x - mean
+            weight = np.maximum(alpha, 1 / (count + 1))
+            increment = weight * diff
+            return fire, score, mean, mean + increment, (1 - weight) * (var + diff * increment)
+
+        if "ewma" in self.detectors:
+            fire, score, baseline, self._ewma_mean[idx], self._ewma_var[idx] = ewma(
+                self._ewma_mean[idx], self._ewma_var[idx], self._ewma_count[idx], self.alpha, self.warmup)
+            self._ewma_count[idx] += 1
+            fired.append(("ewma", fire, score, baseline))
+
+        if "zscore" in self.detectors:
+            position = self._position[idx]
+            filled = self._filled[idx]
+            total, total_sq = self._sum[idx], self._sumsq[idx]
+            n = np.maximum(filled, 1)
+            mean = total / n
+            std = np.maximum(np.sqrt(np.maximum(total_sq / n - mean ** 2, 0.0)), self.min_std)
+            score = (x - mean) / std
+            fire = (filled >= self.warmup) & (score > self.threshold)
+            old = self._ring[position, idx]
+            self._sum[idx] = total - old + x
+            self._sumsq[idx] = total_sq - old ** 2 + x ** 2
+            self._ring[position, idx] = x
+            self._position[idx] = (position + 1) % self.window
+            self._filled[idx] = np.minimum(filled + 1, self.window)
+            fired.append(("zscore", fire, score, mean))
+
+        if "seasonal" in self.detectors:
+            fire, score, baseline, self._season_mean[hour, idx], self._season_var[hour, idx] = ewma(
+                self._season_mean[hour, idx], self._season_var[hour, idx], self._season_count[hour, idx],
+                self.seasonal_alpha, self.seasonal_warmup)
+            self._season_count[hour, idx] += 1
+            fired.append(("seasonal", fire, score, baseline))
+
+        anomalies = []
+        for k in np.flatnonzero(np.logical_or.reduce([fire for _, fire, _, _ in fired])):
+            for detector, fire, score, baseline in fired:
+                if fire[k]:
+                    anomalies.append(Anomaly(self.names[indices[k]], detector, values[k], float(baseline[k]), float(score[k])))
+        return anomalies
+
+    def _round_python(self, indices, values, hour):
+        anomalies = []
+        for i, x in zip(indices, values):
+            if "ewma" in self.detectors:
+                mean, var, count = self._ewma_mean[i], self._ewma_var[i], self._ewma_count[i]
+                score = (x - mean) / max(math.sqrt(var), self.min_std)
+                if count >= self.warmup and score > self.threshold:
+                    anomalies.append(Anomaly(self.names[i], "ewma", x, mean, score))
+                self._ewma_mean[i], self._ewma_var[i] = _ewma_step(mean, var, count, x, self.alpha)
+                self._ewma_count[i] = count + 1
+
+            if "zscore" in self.detectors:
+                position, filled = self._position[i], self._filled[i]
+                n = max(filled, 1)
+                mean = self._sum[i] / n
+                std = max(math.sqrt(max(self._sumsq[i] / n - mean ** 2, 0.0)), self.min_std)
+                score = (x - mean) / std
+                if filled >= self.warmup and score > self.threshold:
+                    anomalies.append(Anomaly(self.names[i], "zscore", x, mean, score))
+                ring = self._ring[i]
+                old = ring[position]
+                ring[position] = x
+                self._position[i] = (position + 1) % self.window
+                self._filled[i] = min(filled + 1, self.window)
+                if position == self.window - 1:
+                    # Recompute the window sums once per pass over the ring
+                    self._sum[i] = sum(ring)
+                    self._sumsq[i] = sum(value * value for value in ring)
+                else:
+                    self._sum[i] += x - old
+                    self._sumsq[i] += x * x - old * old
+
+            if "seasonal" in self.detectors:
+                mean, var = self._season_mean[i][hour], self._season_var[i][hour]
+                count = self._season_count[i][hour]
+                score = (x - mean) / max(math.sqrt(var), self.min_std)
+                if count >= self.seasonal_warmup and score > self.threshold:
+                    anomalies.append(Anomaly(self.names[i], "seasonal", x, mean, score))
+                self._season_mean[i][hour], self._season_var[i][hour] = _ewma_step(mean, var, count, x, self.seasonal_alpha)
+                self._season_count[i][hour] = count + 1
+        return anomalies
+
+
+def _ewma_step(mean, var, count, x, alpha):
+    # One update of an exponentially weighted mean and variance. Until 1 / alpha values were
+    # seen, the weight 1 / n makes it the cumulative (Welford) mean and variance instead.
+    weight = max(alpha, 1 / (count + 1))
+    diff = x - mean
+    increment = weight * diff
+    return mean + increment, (1 - weight) * (var + diff * increment)
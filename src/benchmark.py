@@ -0,0 +1,483 @@
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Arguments that determine the work of the cases, saved with the results
+PARAMETERS = ("repeat", "seed", "files", "sockets", "log_mb", "lines")
+
+# Metrics compared against a baseline, and whether a higher value is better
+COMPARED = {"throughput": True, "p50": False, "p95": False, "p99": False, "peak_rss": False}
+
+
+def parse_arguments(argv=None):
+    """
+    Parse the command-line arguments of the benchmark suite.
+
+    Args:
+        argv (list of str, optional): Arguments to parse. Defaults to sys.argv[1:].
+
+    Returns:
+        argparse.Namespace: Parsed command-line arguments.
+
+    Command-line Arguments:
+        --cases (list of str): Cases to run, see `CASES`. Default is all of them.
+        --repeat (int): Measured runs per case, after one warm-up run. Default is 5.
+        --seed (int): Seed of the generated data, so runs are reproducible. Default is 0.
+        --files (int): Files in the generated tree of the scan cases. Default is 10000.
+        --sockets (int): Sockets in each generated socket table. Default is 10000.
+        --log_mb (int): Size of the generated log in MiB. Default is 256.
+        --lines (int): Lines in the generated port and file listings. Default is 100000.
+        --data_dir (str): Directory for the generated data, kept and reused by later runs with
+            the same sizes. Default is a temporary directory that is removed afterwards.
+        --save (str): Write the results to this JSON file, e.g. as a baseline.
+        --compare (str): Compare the results with a baseline saved with --save.
+        --tolerance (float): Percentage by which a metric may be worse than the baseline
+            before it counts as a regression. Default is 10.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmarks of the monitoring hot paths")
+    parser.add_argument("--cases", nargs="*", choices=list(CASES), default=list(CASES), help="Cases to run")
+    parser.add_argument("--repeat", type=int, default=5, help="Measured runs per case")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated data")
+    parser.add_argument("--files", type=int, default=10000, help="Files in the generated tree")
+    parser.add_argument("--sockets", type=int, default=10000, help="Sockets per generated socket table")
+    parser.add_argument("--log_mb", type=int, default=256, help="Size of the generated log in MiB")
+    parser.add_argument("--lines", type=int, default=100000, help="Lines in the generated listings")
+    parser.add_argument("--data_dir", type=str, default=None, help="Directory for the generated data (reused)")
+    parser.add_argument("--save", type=str, default=None, help="Write the results to a JSON file")
+    parser.add_argument("--compare", type=str, default=None, help="Compare with a baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="Allowed regression in percent")
+    parser.add_argument("--run_case", type=str, default=None, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+# Data generation
+
+def generate_tree(root, files, seed):
+    """
+    Generate a directory tree for the scan cases: 100 files per directory, 100 directories
+    per level, and one file in ten world-readable.
+
+    Returns:
+        str: The root of the tree.
+    """
+    rng = random.Random(seed)
+    for i in range(files):
+        directory = os.path.join(root, f"d{i // 10000:03d}", f"d{i // 100 % 100:02d}")
+        if i % 100 == 0:
+            os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"f{i % 100:02d}.conf")
+        with open(path, "w") as f:
+            f.write("key = value\n")
+        os.chmod(path, 0o644 if rng.random() < 0.1 else 0o600)
+    return root
+
+
+def generate_socket_tables(proc_root, sockets, seed):
+    """
+    Generate /proc/net/{tcp,tcp6,udp,udp6} tables with random addresses and states.
+
+    One socket in ten is listening, like on a busy server with many connections.
+
+    Returns:
+        str: The fake procfs root, for `ports.get_listening_sockets`.
+    """
+    rng = random.Random(seed)
+    net = os.path.join(proc_root, "net")
+    os.makedirs(net, exist_ok=True)
+    for proto in ("tcp", "tcp6", "udp", "udp6"):
+        digits = 32 if proto.endswith("6") else 8
+        listening = "0A" if proto.startswith("tcp") else "07"
+        lines = ["  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode"]
+        for i in range(sockets):
+            local = f"{rng.getrandbits(digits * 4):0{digits}X}:{rng.randrange(1, 65536):04X}"
+            remote = f"{rng.getrandbits(digits * 4):0{digits}X}:{rng.randrange(1, 65536):04X}"
+            state = listening if rng.random() < 0.1 else "01"
+            lines.append(f"{i:4d}: {local} {remote} {state} 00000000:00000000 00:00000000 00000000  1000        0 {rng.randrange(10 ** 7)} 1 0000000000000000 20 4 30 10 -1")
+        with open(os.path.join(net, proto), "w") as f:
+            f.write("\n".join(lines) + "\n")
+    return proc_root
+
+
+def log_lines(count, start=0):
+    """Return `count` log lines in the format of the monitor logs."""
+    return "".join(
+        f"2024-08-29 12:{i // 60 % 60:02d}:{i % 60:02d},{i % 1000:03d} - WARNING - High CPU usage detected! CPU: {i % 100}.5%\n"
+        for i in range(start, start + count))
+
+
+def generate_log(path, size_mb):
+    """Generate a log file of `size_mb` MiB, written in 1 MiB blocks."""
+    block = log_lines(20000).encode()
+    block = block[:block.rfind(b"\n", 0, 1024 * 1024) + 1]
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+    return path
+
+
+def generate_listing(count, seed):
+    """Return `count` sorted lines like those of the insecure files listing."""
+    rng = random.Random(seed)
+    return sorted(f"/etc/generated/{rng.getrandbits(40):010x}/file{i}.conf" for i in range(count))
+
+
+def prepare_data(args, data_dir):
+    """
+    Generate the data of the selected cases in `data_dir`, unless it is there already.
+
+    A marker file records the sizes and seed the data was generated with, so a kept data
+    directory is only generated again when they change.
+    """
+    wanted = {"files": args.files, "sockets": args.sockets, "log_mb": args.log_mb, "seed": args.seed}
+    marker = os.path.join(data_dir, "generated.json")
+    try:
+        with open(marker) as f:
+            generated = json.load(f)
+    except (OSError, ValueError):
+        generated = {}
+
+    for case in args.cases:
+        part, size_key = CASE_DATA.get(case, (None, None))
+        if part is None or generated.get(part) == [wanted[size_key], args.seed]:
+            continue
+        path = os.path.join(data_dir, part)
+        shutil.rmtree(path, ignore_errors=True)
+        if os.path.isfile(path):
+            os.remove(path)
+        print(f"Generating {part} data...", flush=True)
+        if part == "tree":
+            generate_tree(path, args.files, args.seed)
+        elif part == "proc":
+            generate_socket_tables(path, args.sockets, args.seed)
+        elif part == "monitor.log":
+            generate_log(path, args.log_mb)
+        generated[part] = [wanted[size_key], args.seed]
+        with open(marker, "w") as f:
+            json.dump(generated, f)
+
+
+# Cases: each one runs in its own process and returns (latencies, items per run, unit)
+
+def case_scan(args, data_dir):
+    from scanner import check_insecure_files
+
+    tree = os.path.join(data_dir, "tree")
+    return measure(lambda: check_insecure_files([tree]), args.repeat), args.files, "files"
+
+
+def case_scan_incremental(args, data_dir):
+    from scanner import InsecureFileScanner
+
+    # Never a full rescan, this measures the scans between them
+    scanner = InsecureFileScanner([os.path.join(data_dir, "tree")], full_rescan_every=10 ** 9)
+    scanner.scan()
+    return measure(scanner.scan, args.repeat), args.files, "files"
+
+
+def case_ports(args, data_dir):
+    from ports import get_listening_sockets
+
+    proc_root = os.path.join(data_dir, "proc")
+    return measure(lambda: get_listening_sockets(proc_root), args.repeat), 4 * args.sockets, "sockets"
+
+
+def case_logtail(args, data_dir):
+    from logtail import LogTailer
+
+    log_path = os.path.join(data_dir, "tail.log")
+    shutil.copyfile(os.path.join(data_dir, "monitor.log"), log_path)
+    tailer = LogTailer(log_path)
+    tailer.read()
+    chunk = log_lines(1000).encode()
+
+    def append_and_read():
+        with open(log_path, "ab") as f:
+            f.write(chunk)
+        start = time.perf_counter()
+        tailer.read()
+        return time.perf_counter() - start
+
+    try:
+        latencies = [append_and_read() for _ in range(max(args.repeat, 100))]
+    finally:
+        os.remove(log_path)
+    return latencies, len(chunk), "bytes"
+
+
+def case_log_view(args, data_dir):
+    import config
+    from gui import update_log_content
+
+    root, text = hidden_text_widget()
+    log_path = os.path.join(data_dir, "view.log")
+    shutil.copyfile(os.path.join(data_dir, "monitor.log"), log_path)
+    chunk = log_lines(1000).encode()
+    update_log_content(text, log_path)
+
+    def append_and_update():
+        with open(log_path, "ab") as f:
+            f.write(chunk)
+        start = time.perf_counter()
+        update_log_content(text, log_path)
+        return time.perf_counter() - start
+
+    try:
+        latencies = [append_and_update() for _ in range(max(args.repeat, 100))]
+    finally:
+        os.remove(log_path)
+        root.destroy()
+    return latencies, min(1000, config.args.log_lines), "lines"
+
+
+def case_ssh_texts(args, data_dir):
+    from gui import update_ssh_texts
+
+    root, ports_text = hidden_text_widget()
+    files_text = type(ports_text)(root)
+    ports = "\n".join(f"tcp LISTEN 0.0.0.0:{port}" for port in range(args.lines)) + "\n"
+    files = generate_listing(args.lines, args.seed)
+    latencies = measure(lambda: update_ssh_texts(ports_text, files_text, ports, files), args.repeat)
+    root.destroy()
+    return latencies, 2 * args.lines, "lines"
+
+
+def case_ssh_changes(args, data_dir):
+    from gui import update_insecure_files_changes
+
+    root, files_text = hidden_text_widget()
+    files = generate_listing(args.lines, args.seed)
+    update_insecure_files_changes(files_text, files, [])
+    changed = files[::100]
+
+    def remove_and_add():
+        update_insecure_files_changes(files_text, [], changed)
+        update_insecure_files_changes(files_text, changed, [])
+
+    latencies = measure(remove_and_add, args.repeat)
+    root.destroy()
+    return latencies, 2 * len(changed), "lines"
+
+
+CASES = {
+    "scan": case_scan,
+    "scan_incremental": case_scan_incremental,
+    "ports": case_ports,
+    "logtail": case_logtail,
+    "log_view": case_log_view,
+    "ssh_texts": case_ssh_texts,
+    "ssh_changes": case_ssh_changes,
+}
+
+# Generated data each case needs: (file or directory in the data directory, size argument)
+CASE_DATA = {
+    "scan": ("tree", "files"),
+    "scan_incremental": ("tree", "files"),
+    "ports": ("proc", "sockets"),
+    "logtail": ("monitor.log", "log_mb"),
+    "log_view": ("monitor.log", "log_mb"),
+}
+
+
+class Skipped(Exception):
+    """Raised by a case that cannot run on this host, e.g. without a display."""
+
+
+def hidden_text_widget():
+    """
+    Create a withdrawn Tk root with a text widget, for the GUI cases.
+
+    Raises:
+        Skipped: If Tk is not available or there is no display.
+    """
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:
+        raise Skipped(f"no Tk display: {e}")
+    root.withdraw()
+    text = tk.Text(root)
+    text.pack()
+    return root, text
+
+
+def measure(run, repeat):
+    """
+    Call `run` once to warm up and then `repeat` times.
+
+    Returns:
+        list of float: The duration of every measured call in seconds.
+    """
+    run()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def percentile(values, q):
+    """Return the `q` percentile (0-100) of values, interpolated between the closest ranks."""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def peak_rss():
+    """Return the peak resident set size of this process in bytes."""
+    try:
+        import resource
+    except ImportError:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_case(args, data_dir):
+    """
+    Run one case in this process and summarize it.
+
+    Percentiles are computed exactly from the recorded durations, not from `stats`
+    histogram buckets, so small differences against a baseline stay visible.
+
+    Returns:
+        dict: throughput (units per second), unit, runs, mean/p50/p95/p99/max latency in
+        seconds and peak RSS in bytes, or {"skipped": reason}.
+    """
+    import config
+
+    config.load_config([])
+    try:
+        latencies, items, unit = CASES[args.run_case](args, data_dir)
+    except Skipped as e:
+        return {"skipped": str(e)}
+    return {
+        "throughput": items * len(latencies) / sum(latencies),
+        "unit": unit,
+        "runs": len(latencies),
+        "mean": sum(latencies) / len(latencies),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies),
+        "peak_rss": peak_rss(),
+    }
+
+
+def run_cases(args, data_dir):
+    """
+    Run every selected case in a fresh Python process, so the peak RSS of a case is its own
+    and no case warms the caches of the next one.
+
+    Returns:
+        dict: Result per case, see `run_case`.
+    """
+    sizes = [f"--{key}={getattr(args, key)}" for key in PARAMETERS]
+    results = {}
+    for case in args.cases:
+        print(f"Running {case}...", flush=True)
+        command = [sys.executable, os.path.abspath(__file__), *sizes, f"--data_dir={data_dir}", f"--run_case={case}"]
+        completed = subprocess.run(command, stdout=subprocess.PIPE, text=True)
+        if completed.returncode != 0:
+            results[case] = {"skipped": f"failed with exit status {completed.returncode}"}
+            continue
+        results[case] = json.loads(completed.stdout.strip().splitlines()[-1])
+    return results
+
+
+def format_results(results, baseline=None, tolerance=10.0):
+    """
+    Format results as a table, with the change against a baseline if there is one.
+
+    Args:
+        results (dict): Result per case.
+        baseline (dict, optional): Results of the baseline. Defaults to None.
+        tolerance (float, optional): Allowed regression in percent. Defaults to 10.
+
+    Returns:
+        tuple: (table text, list of regressions as "case metric" strings).
+    """
+    lines = [f"{'Case':<18} {'throughput':>14} {'unit/s':<8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'peak RSS MB':>12}"]
+    regressions = []
+    for case, r in results.items():
+        if "skipped" in r:
+            lines.append(f"{case:<18} skipped: {r['skipped']}")
+            continue
+        lines.append(f"{case:<18} {r['throughput']:>14.1f} {r['unit']:<8} " + " ".join(
+            f"{r[key] * 1000:>9.2f}" for key in ("p50", "p95", "p99", "max")) + f" {r['peak_rss'] / 1024 ** 2:>12.1f}")
+        base = (baseline or {}).get(case)
+        if not base or "skipped" in base:
+            continue
+        changes = []
+        for metric, higher_is_better in COMPARED.items():
+            if not base[metric]:
+                continue
+            change = (r[metric] - base[metric]) / base[metric] * 100
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > tolerance:
+                regressions.append(f"{case} {metric}")
+                flag = " REGRESSION"
+            changes.append(f"{metric} {change:+.1f}%{flag}")
+        lines.append(f"{'':<18} vs baseline: " + ", ".join(changes))
+    return "\n".join(lines), regressions
+
+
+def main(argv=None):
+    """
+    Run the benchmark suite, print the results and optionally save or compare them.
+
+    Returns:
+        int: Exit status, 1 if a metric regressed beyond the tolerance.
+    """
+    args = parse_arguments(argv)
+    if args.run_case:
+        print(json.dumps(run_case(args, args.data_dir)))
+        return 0
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="monitor-bench-")
+    os.makedirs(data_dir, exist_ok=True)
+    try:
+        prepare_data(args, data_dir)
+        results = run_cases(args, data_dir)
+    finally:
+        if args.data_dir is None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            saved = json.load(f)
+        baseline = saved["results"]
+        for key in PARAMETERS:
+            if saved["parameters"].get(key) != getattr(args, key):
+                print(f"Warning: the baseline was run with --{key} {saved['parameters'].get(key)}, not {getattr(args, key)}")
+    table, regressions = format_results(results, baseline, args.tolerance)
+    print(table)
+
+    if args.save:
+        parameters = {key: getattr(args, key) for key in PARAMETERS}
+        with open(args.save, "w") as f:
+            json.dump({"parameters": parameters, "python": platform.python_version(),
+                       "platform": platform.platform(), "results": results}, f, indent=2)
+        print(f"Saved the results to {args.save}")
+    if regressions:
+        print(f"Regressions beyond {args.tolerance:g}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
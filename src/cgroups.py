@@ -0,0 +1,283 @@
+import os
+import time
+from collections import namedtuple
+
+# Mountpoint of the cgroup v2 hierarchy
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+# Files read from every cgroup; missing ones (e.g. memory.max of the root cgroup, or a
+# controller that is not enabled) are left out
+CGROUP_FILES = ("cpu.stat", "memory.current", "memory.max", "io.stat", "cpu.pressure", "memory.pressure", "io.pressure")
+
+# Metrics of a cgroup that can have a threshold, see `exceeded`
+CGROUP_METRICS = ("cpu", "memory", "cpu_pressure", "memory_pressure", "io_pressure")
+
+# Resource usage of one cgroup. CPU is in percent of one CPU (200 is two busy CPUs), memory
+# in bytes with the limit None if there is none, I/O in bytes per second, pressure the
+# "some avg10" stall percentage. Rates are None on the first sample of a cgroup.
+CgroupUsage = namedtuple("CgroupUsage", ["path", "cpu", "memory", "memory_limit", "memory_percent", "read_bytes",
+                                         "write_bytes", "cpu_pressure", "memory_pressure", "io_pressure"])
+
+# Size of the buffer used to read a cgroup file; io.stat has one line per device
+READ_SIZE = 16384
+
+
+def is_cgroup2(root=CGROUP_ROOT):
+    """
+    Tell whether a directory is the root of a cgroup v2 hierarchy.
+
+    Args:
+        root (str, optional): The directory. Defaults to CGROUP_ROOT.
+
+    Returns:
+        bool: True if it has a `cgroup.controllers` file.
+    """
+    return os.path.isfile(os.path.join(root, "cgroup.controllers"))
+
+
+def parse_flat_keyed(text):
+    """
+    Parse a flat keyed cgroup file like cpu.stat ("KEY VALUE" per line).
+
+    Returns:
+        dict: Value per key, as int.
+    """
+    values = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(" ")
+        if value.isdigit():
+            values[key] = int(value)
+    return values
+
+
+def parse_io_stat(text):
+    """
+    Parse io.stat and add up the bytes read and written over all devices.
+
+    Returns:
+        tuple: (rbytes, wbytes).
+    """
+    read = written = 0
+    for line in text.splitlines():
+        for field in line.split()[1:]:
+            key, _, value = field.partition("=")
+            if key == "rbytes":
+                read += int(value)
+            elif key == "wbytes":
+                written += int(value)
+    return read, written
+
+
+def parse_pressure(text):
+    """
+    Parse a pressure (PSI) file and return the "some avg10" value.
+
+    Returns:
+        float: Percentage of the last 10 seconds in which some tasks stalled, or None.
+    """
+    for line in text.splitlines():
+        if line.startswith("some "):
+            for field in line.split()[1:]:
+                key, _, value = field.partition("=")
+                if key == "avg10":
+                    return float(value)
+    return None
+
+
+def checked(usage, threshold):
+    """
+    Return the metrics of a cgroup that have a threshold, with their values.
+
+    Args:
+        usage (CgroupUsage): The usage of the cgroup.
+        threshold (callable): Returns the threshold of a (path, metric), or None if it has none,
+            e.g. `config.cgroup_threshold`.
+
+    Returns:
+        list of tuple: (metric, value, threshold) per measured metric with a threshold.
+    """
+    result = []
+    for metric in CGROUP_METRICS:
+        value = usage.memory_percent if metric == "memory" else getattr(usage, metric)
+        limit = threshold(usage.path, metric)
+        if value is not None and limit is not None:
+            result.append((metric, value, limit))
+    return result
+
+
+def exceeded(usage, threshold):
+    """
+    Return the metrics of a cgroup that are above their threshold.
+
+    Args:
+        usage (CgroupUsage): The usage of the cgroup.
+        threshold (callable): Returns the threshold of a (path, metric), see `checked`.
+
+    Returns:
+        list of tuple: (metric, value, threshold) per metric above its threshold.
+    """
+    return [(metric, value, limit) for metric, value, limit in checked(usage, threshold) if value > limit]
+
+
+class CgroupFiles:
+    """
+    The open cgroup files of one cgroup.
+
+    The files stay open between samples and are read with `os.pread` at offset 0, which makes
+    the kernel render them again, so a sample costs one read system call per file and no
+    path lookups or open/close calls.
+
+    Args:
+        directory (str): The directory of the cgroup.
+    """
+
+    def __init__(self, directory):
+        self.fds = {}
+        for name in CGROUP_FILES:
+            try:
+                self.fds[name] = os.open(os.path.join(directory, name), os.O_RDONLY)
+            except OSError:
+                pass
+
+    def read(self, name):
+        """
+        Read a cgroup file.
+
+        Args:
+            name (str): The file name, one of CGROUP_FILES.
+
+        Returns:
+            str: The content, or None if the cgroup does not have the file.
+
+        Raises:
+            OSError: If the cgroup was removed.
+        """
+        fd = self.fds.get(name)
+        if fd is None:
+            return None
+        return os.pread(fd, READ_SIZE, 0).decode("ascii", errors="replace")
+
+    def close(self):
+        """Close all files."""
+        for fd in self.fds.values():
+            os.close(fd)
+        self.fds = {}
+
+
+class CgroupSampler:
+    """
+    Samples the CPU, memory, I/O and pressure of every cgroup of a cgroup v2 hierarchy.
+
+    The hierarchy is walked to find the cgroups only every `rescan_every` samples; in between,
+    the open files of the known cgroups are read with `pread` (see `CgroupFiles`), so hundreds
+    of containers can be sampled every second. A cgroup whose files fail to read was removed
+    and is dropped until the next walk. CPU and I/O rates are the change of the `cpu.stat`
+    and `io.stat` counters since the previous sample of the cgroup.
+
+    The root directory is a parameter, so the sampler also works on a fake hierarchy of plain
+    files, e.g. in a temporary directory.
+
+    Args:
+        root (str, optional): Root of the cgroup v2 hierarchy. Defaults to CGROUP_ROOT.
+        max_depth (int, optional): Deepest cgroup level sampled; 1 is the direct children of
+            the root. The root cgroup itself is not sampled, it is the whole host. Defaults to 4.
+        rescan_every (int, optional): Samples between two walks of the hierarchy. Defaults to 10.
+        clock (callable, optional): Returns the current monotonic time in seconds.
+            Defaults to time.monotonic.
+    """
+
+    def __init__(self, root=CGROUP_ROOT, max_depth=4, rescan_every=10, clock=time.monotonic):
+        self.root = root
+        self.max_depth = max_depth
+        self.rescan_every = rescan_every
+        self.clock = clock
+        self.cgroups = {}  # Path relative to the root -> CgroupFiles
+        self._counters = {}  # Path -> (time, usage_usec, rbytes, wbytes)
+        self._samples = 0
+
+    def discover(self):
+        """
+        Walk the hierarchy, open the files of new cgroups and close those of removed ones.
+
+        Returns:
+            list of str: The paths of the cgroups, relative to the root, e.g. "/system.slice".
+        """
+        found = set()
+        root_depth = self.root.rstrip(os.sep).count(os.sep)
+        for directory, subdirectories, files in os.walk(self.root):
+            depth = directory.rstrip(os.sep).count(os.sep) - root_depth
+            if depth >= self.max_depth:
+                subdirectories[:] = []
+            if depth == 0 or "cgroup.procs" not in files:
+                continue
+            path = "/" + os.path.relpath(directory, self.root).replace(os.sep, "/")
+            found.add(path)
+            if path not in self.cgroups:
+                self.cgroups[path] = CgroupFiles(directory)
+        for path in set(self.cgroups) - found:
+            self._drop(path)
+        return sorted(self.cgroups)
+
+    def sample(self):
+        """
+        Sample every cgroup.
+
+        Returns:
+            list of CgroupUsage: Usage per cgroup, in path order.
+        """
+        if self._samples % self.rescan_every == 0:
+            self.discover()
+        self._samples += 1
+        result = []
+        for path, files in sorted(self.cgroups.items()):
+            try:
+                result.append(self._sample_cgroup(path, files))
+            except OSError:
+                self._drop(path)
+        return result
+
+    def _sample_cgroup(self, path, files):
+        now = self.clock()
+        cpu_stat = files.read("cpu.stat")
+        usage_usec = parse_flat_keyed(cpu_stat).get("usage_usec") if cpu_stat is not None else None
+        io_stat = files.read("io.stat")
+        read, written = parse_io_stat(io_stat) if io_stat is not None else (None, None)
+
+        memory = files.read("memory.current")
+        memory = int(memory) if memory is not None and memory.strip().isdigit() else None
+        limit = files.read("memory.max")
+        limit = int(limit) if limit is not None and limit.strip().isdigit() else None
+        memory_percent = memory * 100 / limit if memory is not None and limit else None
+
+        pressure = {}
+        for resource in ("cpu", "memory", "io"):
+            text = files.read(f"{resource}.pressure")
+            pressure[resource] = parse_pressure(text) if text is not None else None
+
+        cpu = read_rate = write_rate = None
+        previous = self._counters.get(path)
+        if previous is not None and now > previous[0]:
+            elapsed = now - previous[0]
+            cpu = _rate(previous[1], usage_usec, elapsed / 100 * 1e6)
+            read_rate = _rate(previous[2], read, elapsed)
+            write_rate = _rate(previous[3], written, elapsed)
+        self._counters[path] = (now, usage_usec, read, written)
+
+        return CgroupUsage(path, cpu, memory, limit, memory_percent, read_rate, write_rate,
+                           pressure["cpu"], pressure["memory"], pressure["io"])
+
+    def _drop(self, path):
+        self.cgroups.pop(path).close()
+        self._counters.pop(path, None)
+
+    def close(self):
+        """Close the files of all cgroups."""
+        for path in list(self.cgroups):
+            self._drop(path)
+
+
+def _rate(previous, current, per):
+    # Change of a counter per unit; None if a value is missing or the counter went backwards
+    if previous is None or current is None or current < previous:
+        return None
+    return (current - previous) / per
@@ -0,0 +1,227 @@
+import queue
+import random
+import threading
+import time
+import stats
+
+# What a collector does when it finished too late for one or more of its ticks
+MISSED_TICK_POLICIES = ("skip", "catchup", "delay")
+
+# Scheduled time of the tick that the current sampler thread is running
+_tick = threading.local()
+
+
+def tick_time():
+    """
+    Return the scheduled time of the running collector tick, in seconds since the epoch.
+
+    Ticks are scheduled on a fixed grid, so the values are evenly spaced even when a
+    collector starts late or takes long. Collectors use it as the timestamp of their
+    samples. Outside of a collector it returns the current time.
+
+    Returns:
+        float: The scheduled time of the tick.
+    """
+    return getattr(_tick, "time", None) or time.time()
+
+
+class Reporter:
+    """
+    Receives the results of the collectors for display.
+
+    Collectors only talk to a reporter, never to widgets, so they run the same with or
+    without a GUI. This base class ignores everything and is used in headless mode;
+    `gui.GuiReporter` shows the results in the Tk window. All methods are called from
+    sampler threads.
+    """
+
+    def show_health(self, cpu_usage, memory_usage, disk_usage, sent_per_sec, recv_per_sec, alerting=()):
+        """Show the latest CPU, memory and disk usage (%) and network rates (MB/s), and the metrics with an active rule."""
+
+    def show_history(self, history):
+        """Show the recent samples of the health metrics (`history.MetricHistory`)."""
+
+    def show_ports_text(self, open_ports):
+        """Show the open ports as command output, used when no structured data is available."""
+
+    def show_port_changes(self, ports_added, ports_removed):
+        """Show opened and closed ports (formatted lines)."""
+
+    def show_insecure_file_changes(self, files_added, files_removed):
+        """Show files that became insecure or are no longer insecure."""
+
+    def show_interfaces(self, interfaces):
+        """Show the traffic per network interface (`network.InterfaceRate`, bytes/s)."""
+
+    def show_top_processes(self, processes):
+        """Show the top processes (`processes.ProcessSample`) by CPU, memory and disk I/O."""
+
+    def show_cgroups(self, cgroups):
+        """Show the resource usage per cgroup (`cgroups.CgroupUsage`)."""
+
+    def show_agent(self, status):
+        """Show the latest state (`monitor.AgentStatus`) of a remote agent."""
+
+    def show_disks(self, mounts, disk_io):
+        """Show the usage per mountpoint (`disks.MountUsage`) and throughput per disk (`disks.DiskIO`)."""
+
+
+class CollectorRuntime:
+    """
+    Runs collectors on background sampler threads and hands their results to the GUI thread.
+
+    Tkinter widgets may only be touched from the thread running the main loop, and any slow
+    work on that thread freezes the window. Collectors therefore run on their own threads and
+    never call into Tk; instead they `post` GUI updates to a thread-safe queue. The GUI thread
+    drains the queue with a short `after` poll, which only runs the posted updates.
+
+    Each collector runs at a fixed rate on a grid of ticks `interval` seconds apart, measured
+    with a monotonic clock from the time the runtime was started. The time a collector takes
+    does not shift later ticks, so samples are evenly spaced and do not drift. When a run
+    ends after the time of one or more of the following ticks, those ticks are late and the
+    collector's missed-tick policy decides what happens:
+
+    - "skip": only the most recent late tick is run, right away; the others are dropped.
+    - "catchup": all late ticks are run right away, up to `MAX_CATCHUP` of them, so no
+      sample is lost after a short stall.
+    - "delay": the grid is moved so the late tick runs now and the next ones follow at
+      full intervals from it.
+
+    The duration of every run is recorded in the `stats` histogram "collector.NAME", and
+    failed runs and late ticks in the counters "collector.NAME.errors" and
+    "collector.NAME.missed_ticks". A jitter of up to `jitter`
+    seconds can be added to every run, e.g. so that agents on many hosts do not all sample
+    at the same moment; it delays the run but not the grid, so the tick times stay evenly
+    spaced.
+
+    Without a root window (headless mode) there is no GUI thread: posted functions are
+    called right away and `wait` keeps the main thread alive.
+
+    Args:
+        root (tk.Tk, optional): The root Tkinter window. Defaults to None.
+        poll_interval (int, optional): Milliseconds between queue drains. Defaults to 100.
+    """
+
+    # Most missed ticks run back to back by the "catchup" policy, the rest are skipped
+    MAX_CATCHUP = 10
+
+    def __init__(self, root=None, poll_interval=100, clock=time.monotonic):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.queue = queue.Queue()
+        self.collectors = []
+        self._stop = threading.Event()
+        self._threads = []
+
+    def add(self, name, collect, interval, args=(), missed="skip", jitter=0.0):
+        """
+        Register a collector.
+
+        Args:
+            name (str): Name of the collector, used for the thread name.
+            collect (callable): Function that collects one sample and posts its results.
+            interval (float): Seconds between two ticks of the collector.
+            args (tuple, optional): Arguments passed to `collect`. Defaults to ().
+            missed (str, optional): Missed-tick policy, one of `MISSED_TICK_POLICIES`.
+                Defaults to "skip".
+            jitter (float, optional): Most seconds a run is delayed at random. Defaults to 0.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If the interval is not positive or the policy is unknown.
+        """
+        if interval <= 0:
+            raise ValueError(f"interval of collector {name} must be positive")
+        if missed not in MISSED_TICK_POLICIES:
+            raise ValueError(f"unknown missed-tick policy {missed!r} for collector {name}")
+        self.collectors.append((name, collect, interval, args, missed, jitter))
+
+    def post(self, func, *args):
+        """
+        Queue a function to be called on the GUI thread. Safe to call from any thread.
+
+        Args:
+            func (callable): Function to call, e.g. `update_labels`.
+            *args: Arguments for `func`.
+
+        Returns:
+            None
+        """
+        if self.root is None:
+            func(*args)
+            return
+        self.queue.put((func, args))
+
+    def start(self):
+        """Start one sampler thread per collector and, with a root window, the GUI queue poll."""
+        self._stop.clear()
+        start = self.clock()
+        for collector in self.collectors:
+            thread = threading.Thread(target=self._run, args=(start,) + collector, name=f"collector-{collector[0]}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.root is not None:
+            stats.register_gauge("gui.queue", self.queue.qsize)
+            self.root.after(0, self._drain)
+
+    def stop(self):
+        """Ask the sampler threads to stop after their current run."""
+        self._stop.set()
+
+    def wait(self):
+        """Block until `stop` is called. Used to keep a headless process running."""
+        while not self._stop.wait(1):
+            pass
+
+    def _run(self, start, name, collect, interval, args, missed, jitter):
+        # Wall-clock time of the monotonic clock's zero, to timestamp the ticks
+        wall_offset = time.time() - self.clock()
+        latency = stats.histogram(f"collector.{name}")
+        tick = 0
+        counted = 0  # Ticks up to this one have been checked for lateness
+        while not self._stop.is_set():
+            _tick.time = start + tick * interval + wall_offset
+            began = time.perf_counter()
+            try:
+                collect(*args)
+            except Exception as e:
+                stats.count(f"collector.{name}.errors")
+                print(f"Collector {collect.__name__} failed: {e}")
+            latency.record(time.perf_counter() - began)
+
+            tick += 1
+            now = self.clock()
+            due = int((now - start) / interval) + 1  # Ticks whose time has come
+            if due > tick:
+                stats.count(f"collector.{name}.missed_ticks", due - max(tick, counted))
+                counted = due
+                if missed == "delay":
+                    start = now - tick * interval
+                    counted = tick
+                elif missed == "skip":
+                    tick = due - 1
+                elif due - tick > self.MAX_CATCHUP:
+                    tick = due - self.MAX_CATCHUP
+            delay = start + tick * interval - self.clock()
+            if jitter:
+                delay += random.uniform(0, jitter)
+            self._stop.wait(max(0.0, delay))
+
+    def _drain(self):
+        began = time.perf_counter()
+        while True:
+            try:
+                func, args = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                func(*args)
+            except Exception as e:
+                stats.count("gui.errors")
+                print(f"GUI update {func.__name__} failed: {e}")
+        stats.histogram("gui.drain").record(time.perf_counter() - began)
+        if not self._stop.is_set():
+            self.root.after(self.poll_interval, self._drain)
@@ -1,7 +1,17 @@
-import argparse
+import os
 import platform
+from fnmatch import fnmatchcase
+from collector import MISSED_TICK_POLICIES
+from cgroups import CGROUP_METRICS, CGROUP_ROOT
+from anomaly import DETECTORS
 
-def parse_arguments():
+# Parsed command-line arguments, set by load_config()
+args = None
+
+# Collectors and their default interval in seconds
+COLLECTOR_INTERVALS = {"health": 1.0, "ports": 60.0, "files": 60.0, "processes": 5.0, "disks": 10.0, "cgroups": 5.0}
+
+def parse_arguments(argv=None):
     """
     Parse command-line arguments for the System Health and SSH Monitoring Tool.
 
@@ -9,34 +19,170 @@ def parse_arguments():
     related to system health monitoring and email notifications. It includes thresholds
     for CPU, memory, disk, and network usage, as well as email settings for sending alerts.
 
+    Args:
+        argv (list of str, optional): Arguments to parse. Defaults to sys.argv[1:].
+
     Returns:
         argparse.Namespace: Parsed command-line arguments.
 
     Command-line Arguments:
+        --headless (bool): Run the collectors, logging and alerting without the GUI. tkinter
+            is not imported in this mode. Default is off.
+        --stats (bool): Print the internal latency histograms, counters and queue depths on
+            exit and on SIGUSR1. Default is off.
+        --rules (str): Rules file with one alert rule per line, e.g. "High CPU: cpu > 90 for 5m
+            clear when < 80 for 1m" (see `rules.py` for the format). A rule logs and alerts
+            once when it fires and logs again when it clears, and colors the health labels
+            and agent rows red while it is active. Replaces the default rules, which fire once
+            when a sample crosses --cpu, --memory or --network (and --disk for the agents) and
+            clear when a sample drops back below it.
+            Default is none.
         --cpu (int): CPU usage warning threshold (%). Default is 80.
         --memory (int): Memory usage warning threshold (%). Default is 80.
-        --disk (int): Disk usage warning threshold (%). Default is 90.
-        --network (float): Network usage warning threshold (MB/s). Default is 100.0.
+        --disk (int): Disk usage warning threshold (%) of every mounted filesystem. Default is 90.
+        --disk_thresholds (list of str): Per-mountpoint disk usage thresholds as
+            MOUNTPOINT=PERCENT, e.g. "/data=95". Mountpoints not listed use --disk.
+        --network (float): Network usage warning threshold (MB/s) of all interfaces together.
+            Default is 100.0.
+        --interface_thresholds (list of str): Per-interface network usage thresholds as
+            INTERFACE=MBPS, e.g. "eth0=50". Only the listed interfaces are checked on their own.
+        --exclude_interfaces (list of str): Interface name patterns that are not monitored,
+            e.g. "lo" "veth*" "docker*". Default is "lo".
+        --anomaly (list of str): Detect values that are unusually high for their metric, also
+            below the thresholds, with the listed detectors: ewma (sudden changes against a
+            moving average), zscore (against the last --anomaly_window samples) and seasonal
+            (against the same hour of previous days, catches gradual leaks). Without a list,
+            all detectors run. Applies to the health metrics of this host and of the agents.
+            Disabled if not set.
+        --anomaly_threshold (float): z-score (standard deviations above the baseline) at which
+            a value is an anomaly. Default is 4.
+        --anomaly_window (int): Samples in the zscore window. Default is 300.
+        --anomaly_halflife (float): Half-life of the ewma baseline in samples. Default is 60.
         --insecure_dirs (list of str): Directories to scan for insecure files. Default is 
             "C:\\ProgramData" on Windows and "/etc" on other platforms.
+        --scan_workers (int): Worker threads for the insecure-file scan. Also accepted as
+            --scan-workers. Default is based on the number of CPUs.
+        --watch (bool): Watch the insecure directories with inotify and recheck only the
+            changed paths instead of rescanning every minute. Linux only; other platforms
+            fall back to rescanning. Default is off.
+        --history_size (int): Number of samples of each health metric kept in memory.
+            Default is 3600 (one hour at one sample per second).
+        --db_path (str): SQLite database file that stores the metric history with 1-minute and
+            1-hour rollups. Default is none, which disables the database.
+        --retention_raw (float): Hours of raw samples kept in the database. Default is 24.
+        --retention_1m (float): Days of 1-minute rollups kept in the database. Default is 7.
+        --retention_1h (float): Days of 1-hour rollups kept in the database. Default is 365.
+        --top_processes (int): Number of processes reported per ranking (CPU, memory, disk
+            I/O) in the Processes tab and in warnings. 0 disables process sampling. Default is 5.
+        --intervals (list of str): Collector intervals as COLLECTOR=SECONDS. The collectors
+            are health (CPU, memory, root disk and network, default 1), ports (default 60),
+            files (insecure files, default 60), processes (default 5), disks (default 10) and
+            cgroups (default 5).
+        --missed_ticks (list of str): Missed-tick policy per collector as COLLECTOR=POLICY, with
+            POLICY one of skip, catchup or delay. Default is skip.
+        --jitter (list of str): Most random delay per collector run as COLLECTOR=SECONDS.
+            Default is 0.
+        --cgroup_root (str): Root of the cgroup v2 hierarchy whose cgroups (containers,
+            services) are monitored. Default is "/sys/fs/cgroup"; cgroup monitoring is off if
+            it is not a cgroup v2 hierarchy.
+        --cgroup_depth (int): Deepest cgroup level monitored, 1 being the direct children of
+            the root. Default is 4, deep enough for Kubernetes containers.
+        --cgroup_thresholds (list of str): Per-cgroup thresholds as PATTERN:METRIC=VALUE, with
+            PATTERN matched against the cgroup path (e.g. "/system.slice/docker-*") and METRIC
+            one of cpu (% of one CPU), memory (% of the cgroup memory limit) and cpu_pressure,
+            memory_pressure, io_pressure (% stalled). The last matching entry wins. Cgroups
+            with a memory limit use --memory for memory by default.
+        --record (str): Write the collected samples, port changes and insecure file changes to
+            this recording file. Default is none.
+        --replay (str): Replay a recording through the threshold, logging and alert code
+            instead of measuring, then print a summary. Alerts are kept instead of sent, and
+            the logs go to replay_warnings.log and replay.log. Implies --headless.
+        --replay_speed (float): Replay speed: 1 is real time, 60 one recorded minute per
+            second, 0 as fast as possible. Default is 0.
+        --replay_quiet (bool): Do not write the replay logs, so a replay only exercises the
+            threshold and alert code, e.g. to measure their throughput. Default is off.
+        --replay_alerts (str): Write the alerts of a replay to this file, one per line with the
+            recorded time and subject, e.g. to compare the alerts of two versions.
+        --agent (str): Run as an agent that streams its samples and security changes to the
+            aggregator at HOST:PORT instead of showing them. Implies --headless.
+        --agent_name (str): Name of this agent at the aggregator. Default is the host name.
+        --agent_batch (float): Seconds between two batches sent by the agent. Default is 10.
+        --aggregate (str): Receive the data of agents on [HOST]:PORT, e.g. ":9200", and show,
+            store and alert on it together with the local data. Disabled if not set.
+        --agent_timeout (float): Seconds without data after which the aggregator drops the
+            connection of an agent and reports it disconnected, e.g. when its host died
+            without closing the connection. Should be a few times the --agent_batch of the
+            agents. Default is 60.
+        --metrics_port (int): Serve the latest metrics for Prometheus in the OpenMetrics format
+            at http://HOST:PORT/metrics. Disabled if not set.
+        --metrics_host (str): Address the metrics exporter listens on. Default is "0.0.0.0"
+            (all interfaces).
+        --log_lines (int): Maximum number of lines kept in each log view of the Logs tab.
+            Default is 1000.
         --email_from (str): Sender email address. Default is "your_email@example.com".
         --email_to (str): Recipient email address. Default is "admin@example.com".
         --smtp_server (str): SMTP server address. Default is "smtp.example.com".
         --smtp_port (int): SMTP server port. Default is 587.
         --smtp_username (str): SMTP username. Default is "your_email@example.com".
         --smtp_password (str): SMTP password. Default is "your_password".
+        --smtp_starttls / --no_smtp_starttls: Whether to upgrade the SMTP connection with
+            STARTTLS. Turn it off for local relays without STARTTLS, together with an empty
+            --smtp_username, since logging in needs it. Default is on.
+        --alert_window (float): Minutes during which repeated alerts of one type are collected
+            into one digest email instead of being sent. Default is 5.
+        --webhook_url (str): HTTP webhook that also receives every alert as a JSON POST request.
+            Default is none.
     """
     if platform.system() == "Windows":
         default_dir = "C:\\ProgramData"
     else:
         default_dir = "/etc"
 
+    import argparse
+
     parser = argparse.ArgumentParser(description="System Health and SSH Monitoring Tool")
+    parser.add_argument("--headless", action="store_true", help="Run the collectors, logging and alerting without the GUI")
+    parser.add_argument("--stats", action="store_true", help="Print internal latency and queue statistics on exit and on SIGUSR1")
+    parser.add_argument("--rules", type=str, default=None, help="Alert rules file, e.g. 'High CPU: cpu > 90 for 5m clear when < 80 for 1m' per line")
     parser.add_argument("--cpu", type=int, default=80, help="CPU usage warning threshold (%%)")
     parser.add_argument("--memory", type=int, default=80, help="Memory usage warning threshold (%%)")
     parser.add_argument("--disk", type=int, default=90, help="Disk usage warning threshold (%%)")
+    parser.add_argument("--disk_thresholds", nargs="*", type=parse_mount_threshold, default=[], metavar="MOUNTPOINT=PERCENT", help="Per-mountpoint disk usage warning thresholds, e.g. /data=95")
     parser.add_argument("--network", type=float, default=100.0, help="Network usage warning threshold (MB/s)")
+    parser.add_argument("--interface_thresholds", nargs="*", type=parse_threshold, default=[], metavar="INTERFACE=MBPS", help="Per-interface network usage warning thresholds, e.g. eth0=50")
+    parser.add_argument("--exclude_interfaces", nargs="*", default=["lo"], metavar="PATTERN", help="Interface name patterns that are not monitored, e.g. 'veth*'")
+    parser.add_argument("--anomaly", nargs="*", choices=DETECTORS, default=None, help=f"Detect unusually high values with these detectors (default: all of {', '.join(DETECTORS)})")
+    parser.add_argument("--anomaly_threshold", type=float, default=4.0, help="z-score at which a value is an anomaly")
+    parser.add_argument("--anomaly_window", type=int, default=300, help="Samples in the zscore anomaly window")
+    parser.add_argument("--anomaly_halflife", type=float, default=60.0, help="Half-life of the ewma anomaly baseline in samples")
     parser.add_argument("--insecure_dirs", nargs="*", default=[default_dir], help="Directories to scan for insecure files")
+    parser.add_argument("--scan_workers", "--scan-workers", type=int, default=None, help="Worker threads for the insecure-file scan (default: based on CPU count)")
+    parser.add_argument("--watch", action="store_true", help="Watch the insecure directories with inotify instead of rescanning them every minute (Linux only)")
+    parser.add_argument("--history_size", type=int, default=3600, help="Number of samples kept in memory per metric")
+    parser.add_argument("--db_path", type=str, default=None, help="SQLite database file for metric history (disabled if not set)")
+    parser.add_argument("--retention_raw", type=float, default=24, help="Hours of raw samples kept in the database")
+    parser.add_argument("--retention_1m", type=float, default=7, help="Days of 1-minute rollups kept in the database")
+    parser.add_argument("--retention_1h", type=float, default=365, help="Days of 1-hour rollups kept in the database")
+    parser.add_argument("--top_processes", type=int, default=5, help="Number of top processes by CPU, memory and disk I/O to report (0 disables process sampling)")
+    parser.add_argument("--intervals", nargs="*", type=parse_collector_interval, default=[], metavar="COLLECTOR=SECONDS", help=f"Collector intervals, collectors: {', '.join(COLLECTOR_INTERVALS)}")
+    parser.add_argument("--missed_ticks", nargs="*", type=parse_missed_tick_policy, default=[], metavar="COLLECTOR=POLICY", help=f"Missed-tick policy per collector: {', '.join(MISSED_TICK_POLICIES)} (default: skip)")
+    parser.add_argument("--jitter", nargs="*", type=parse_collector_interval, default=[], metavar="COLLECTOR=SECONDS", help="Most random delay per collector run")
+    parser.add_argument("--cgroup_root", type=str, default=CGROUP_ROOT, help="Root of the cgroup v2 hierarchy to monitor")
+    parser.add_argument("--cgroup_depth", type=int, default=4, help="Deepest cgroup level monitored")
+    parser.add_argument("--cgroup_thresholds", nargs="*", type=parse_cgroup_threshold, default=[], metavar="PATTERN:METRIC=VALUE", help=f"Per-cgroup thresholds, metrics: {', '.join(CGROUP_METRICS)}")
+    parser.add_argument("--record", type=str, default=None, help="Record the collected samples and changes to a file")
+    parser.add_argument("--replay", type=str, default=None, help="Replay a recording through the thresholds and alerts (implies --headless)")
+    parser.add_argument("--replay_speed", type=float, default=0.0, help="Replay speed, 1 is real time, 0 as fast as possible")
+    parser.add_argument("--replay_quiet", action="store_true", help="Do not write the replay logs")
+    parser.add_argument("--replay_alerts", type=str, default=None, help="Write the alerts of a replay to a file")
+    parser.add_argument("--agent", type=parse_address, default=None, metavar="HOST:PORT", help="Stream samples and security changes to the aggregator at HOST:PORT (implies --headless)")
+    parser.add_argument("--agent_name", type=str, default=None, help="Name of this agent at the aggregator (default: host name)")
+    parser.add_argument("--agent_batch", type=float, default=10.0, help="Seconds between two batches sent by the agent")
+    parser.add_argument("--aggregate", type=parse_address, default=None, metavar="[HOST]:PORT", help="Receive the data of agents on [HOST]:PORT (disabled if not set)")
+    parser.add_argument("--agent_timeout", type=float, default=60.0, help="Seconds without data after which an agent is considered disconnected")
+    parser.add_argument("--metrics_port", type=int, default=None, help="Port of the Prometheus/OpenMetrics exporter at /metrics (disabled if not set)")
+    parser.add_argument("--metrics_host", type=str, default="0.0.0.0", help="Address the metrics exporter listens on")
+    parser.add_argument("--log_lines", type=int, default=1000, help="Maximum number of lines kept in each log view of the Logs tab")
     
     # Email settings
     parser.add_argument("--email_from", type=str, default="your_email@example.com", help="Sender email address")
@@ -45,7 +191,197 @@ def parse_arguments():
     parser.add_argument("--smtp_port", type=int, default=587, help="SMTP server port")
     parser.add_argument("--smtp_username", type=str, default="your_email@example.com", help="SMTP username")
     parser.add_argument("--smtp_password", type=str, default="your_password", help="SMTP password")
+    parser.add_argument("--smtp_starttls", dest="smtp_starttls", action="store_true", default=True, help="Upgrade the SMTP connection with STARTTLS (default)")
+    parser.add_argument("--no_smtp_starttls", dest="smtp_starttls", action="store_false", help="Send over a plain SMTP connection, e.g. to a local relay")
+    parser.add_argument("--alert_window", type=float, default=5.0, help="Minutes during which repeated alerts of one type are collected into a digest")
+    parser.add_argument("--webhook_url", type=str, default=None, help="HTTP webhook that also receives alerts as JSON")
     
-    return parser.parse_args()
+    return parser.parse_args(argv)
+
+def parse_threshold(value):
+    """
+    Parse a threshold of the form NAME=VALUE, e.g. a per-interface threshold "eth0=50".
+
+    Args:
+        value (str): The threshold.
+
+    Returns:
+        tuple: (name, value).
+
+    Raises:
+        ValueError: If the value is not of the form NAME=VALUE.
+    """
+    name, separator, threshold = value.rpartition("=")
+    if not separator or not name:
+        raise ValueError(f"expected NAME=VALUE, got {value!r}")
+    return name, float(threshold)
+
+def parse_mount_threshold(value):
+    """
+    Parse a per-mountpoint disk threshold of the form MOUNTPOINT=PERCENT.
+
+    Args:
+        value (str): The threshold, e.g. "/var=80".
+
+    Returns:
+        tuple: (mountpoint, percent).
+
+    Raises:
+        ValueError: If the value is not of the form MOUNTPOINT=PERCENT.
+    """
+    mountpoint, percent = parse_threshold(value)
+    return os.path.normpath(mountpoint), percent
+
+def parse_cgroup_threshold(value):
+    """
+    Parse a per-cgroup threshold of the form PATTERN:METRIC=VALUE.
+
+    Args:
+        value (str): The threshold, e.g. "/system.slice/docker-*:cpu=150".
+
+    Returns:
+        tuple: (pattern, metric, value).
+
+    Raises:
+        ValueError: If the value is not of this form or the metric is unknown.
+    """
+    name, threshold = parse_threshold(value)
+    pattern, separator, metric = name.rpartition(":")
+    if not separator or not pattern:
+        raise ValueError(f"expected PATTERN:METRIC=VALUE, got {value!r}")
+    if metric not in CGROUP_METRICS:
+        raise ValueError(f"unknown cgroup metric {metric!r}")
+    return pattern, metric, threshold
+
+def parse_address(value):
+    """
+    Parse a network address of the form [HOST]:PORT.
+
+    Args:
+        value (str): The address, e.g. "monitor.example.com:9200" or ":9200" for all interfaces.
+
+    Returns:
+        tuple: (host, port), with host "0.0.0.0" if it is left out.
+
+    Raises:
+        ValueError: If the port is missing or not a number.
+    """
+    host, separator, port = value.rpartition(":")
+    if not separator:
+        raise ValueError(f"expected [HOST]:PORT, got {value!r}")
+    return host.strip("[]") or "0.0.0.0", int(port)
+
+def parse_collector_interval(value):
+    """
+    Parse a per-collector time of the form COLLECTOR=SECONDS.
+
+    Args:
+        value (str): The setting, e.g. "health=2".
+
+    Returns:
+        tuple: (collector, seconds).
+
+    Raises:
+        ValueError: If the collector is unknown or the seconds are negative.
+    """
+    collector, seconds = parse_threshold(value)
+    if collector not in COLLECTOR_INTERVALS:
+        raise ValueError(f"unknown collector {collector!r}")
+    if seconds < 0:
+        raise ValueError(f"negative time for collector {collector!r}")
+    return collector, seconds
 
-args = parse_arguments()
+def parse_missed_tick_policy(value):
+    """
+    Parse a per-collector missed-tick policy of the form COLLECTOR=POLICY.
+
+    Args:
+        value (str): The setting, e.g. "ports=catchup".
+
+    Returns:
+        tuple: (collector, policy).
+
+    Raises:
+        ValueError: If the collector or the policy is unknown.
+    """
+    collector, separator, policy = value.rpartition("=")
+    if not separator or collector not in COLLECTOR_INTERVALS:
+        raise ValueError(f"expected COLLECTOR=POLICY with a known collector, got {value!r}")
+    if policy not in MISSED_TICK_POLICIES:
+        raise ValueError(f"unknown missed-tick policy {policy!r}")
+    return collector, policy
+
+def collector_schedule(name):
+    """
+    Return how a collector is scheduled.
+
+    Args:
+        name (str): The collector, one of `COLLECTOR_INTERVALS`.
+
+    Returns:
+        tuple: (interval, missed-tick policy, jitter), as arguments for `CollectorRuntime.add`.
+    """
+    interval = dict(args.intervals).get(name, COLLECTOR_INTERVALS[name])
+    missed = dict(args.missed_ticks).get(name, "skip")
+    jitter = dict(args.jitter).get(name, 0.0)
+    return interval, missed, jitter
+
+def disk_threshold(mountpoint):
+    """
+    Return the disk usage warning threshold of a mountpoint.
+
+    Args:
+        mountpoint (str): The mountpoint, e.g. "/var".
+
+    Returns:
+        float: The threshold from --disk_thresholds, or --disk if the mountpoint is not listed.
+    """
+    return dict(args.disk_thresholds).get(mountpoint, args.disk)
+
+def interface_threshold(name):
+    """
+    Return the network usage warning threshold of an interface.
+
+    Args:
+        name (str): The interface name, e.g. "eth0".
+
+    Returns:
+        float: The threshold in MB/s from --interface_thresholds, or None if the interface is not listed.
+    """
+    return dict(args.interface_thresholds).get(name)
+
+def cgroup_threshold(path, metric):
+    """
+    Return the warning threshold of a metric of a cgroup.
+
+    Args:
+        path (str): The cgroup path, e.g. "/system.slice/docker-0123.scope".
+        metric (str): One of `cgroups.CGROUP_METRICS`.
+
+    Returns:
+        float: The threshold of the last matching --cgroup_thresholds entry, --memory for
+            memory, or None if the metric is not checked.
+    """
+    threshold = args.memory if metric == "memory" else None
+    for pattern, threshold_metric, value in args.cgroup_thresholds:
+        if threshold_metric == metric and fnmatchcase(path, pattern):
+            threshold = value
+    return threshold
+
+def load_config(argv=None):
+    """
+    Parse the command-line arguments and make them available as `config.args`.
+
+    Importing a module of the tool never parses arguments, so modules can be imported (e.g. by
+    tests or other tools) without side effects. The entry point calls this once at startup,
+    and other modules read `config.args` when they run.
+
+    Args:
+        argv (list of str, optional): Arguments to parse. Defaults to sys.argv[1:].
+
+    Returns:
+        argparse.Namespace: Parsed command-line arguments.
+    """
+    global args
+    args = parse_arguments(argv)
+    return args
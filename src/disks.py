@@ -0,0 +1,160 @@
+import select
+import time
+from collections import namedtuple
+
+import psutil
+
+# Usage of one mounted filesystem, percent and free bytes as reported by psutil.disk_usage
+MountUsage = namedtuple("MountUsage", ["mountpoint", "device", "fstype", "percent", "free"])
+
+# Throughput of one disk: bytes per second and operations per second
+DiskIO = namedtuple("DiskIO", ["device", "read_bytes", "write_bytes", "read_ops", "write_ops"])
+
+MOUNTINFO = "/proc/self/mountinfo"
+
+# Filesystems of images, e.g. snaps and CD images, that are read-only and always full
+IMAGE_FSTYPES = {"squashfs", "iso9660", "erofs", "cramfs"}
+
+
+class MountWatcher:
+    """
+    Tells whether the mount table changed since the previous check.
+
+    On Linux, the kernel flags `/proc/self/mountinfo` with POLLPRI whenever something is
+    mounted or unmounted, so a zero-timeout poll answers without reading or parsing the
+    table. Elsewhere there is no such signal, and a change is reported every
+    `fallback_every` checks instead.
+
+    Args:
+        fallback_every (int, optional): Checks between two reported changes where mountinfo
+            cannot be polled. Defaults to 60.
+    """
+
+    def __init__(self, fallback_every=60):
+        self.fallback_every = fallback_every
+        self._checks = 0
+        self._file = None
+        self._poll = None
+        try:
+            self._file = open(MOUNTINFO, "rb")
+            self._poll = select.poll()
+            self._poll.register(self._file.fileno(), select.POLLPRI)
+        except (OSError, AttributeError):
+            self.close()
+
+    def changed(self):
+        """
+        Check whether the mount table changed. The first check always reports a change.
+
+        Returns:
+            bool: True if the mount table changed since the previous check.
+        """
+        self._checks += 1
+        if self._checks == 1:
+            return True
+        if self._poll is None:
+            return self._checks % self.fallback_every == 1
+        return bool(self._poll.poll(0))
+
+    def close(self):
+        """Close the mountinfo file, if it is open."""
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._poll = None
+
+
+class DiskSampler:
+    """
+    Samples the usage of every mounted filesystem and the throughput of every disk.
+
+    The list of real (non-virtual) filesystems from `psutil.disk_partitions` is only read
+    again when `MountWatcher` reports that the mount table changed, so a sample is one
+    `statvfs` per mountpoint plus one read of the disk counters. Throughput is the change of
+    `psutil.disk_io_counters(perdisk=True)` since the previous sample; a disk whose counters
+    went backwards (it was reattached or the counters were reset) is reported as idle for
+    that sample.
+
+    Args:
+        clock (callable, optional): Returns the current monotonic time in seconds.
+            Defaults to time.monotonic.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.watcher = MountWatcher()
+        self.partitions = []
+        self._counters = {}
+        self._last_sample = None
+
+    def refresh_partitions(self):
+        """
+        Read the list of mounted real filesystems, one per mountpoint.
+
+        Read-only mounts and image filesystems (`IMAGE_FSTYPES`, e.g. the squashfs of snaps)
+        are skipped: nothing can fill them, and images are always 100% full, so they would
+        only be reported above every threshold.
+
+        Returns:
+            list: `psutil` partition records.
+        """
+        partitions = {}
+        for partition in psutil.disk_partitions(all=False):
+            if partition.fstype in IMAGE_FSTYPES or "ro" in partition.opts.split(","):
+                continue
+            partitions[partition.mountpoint] = partition
+        self.partitions = sorted(partitions.values(), key=lambda p: p.mountpoint)
+        return self.partitions
+
+    def usage(self):
+        """
+        Return the usage of every mounted filesystem.
+
+        Mountpoints that cannot be read (e.g. unmounted since the partition list was read)
+        are skipped.
+
+        Returns:
+            list of MountUsage: Usage per mountpoint, in mountpoint order.
+        """
+        if self.watcher.changed():
+            self.refresh_partitions()
+        result = []
+        for partition in self.partitions:
+            try:
+                usage = psutil.disk_usage(partition.mountpoint)
+            except OSError:
+                continue
+            result.append(MountUsage(partition.mountpoint, partition.device, partition.fstype, usage.percent, usage.free))
+        return result
+
+    def io_rates(self):
+        """
+        Return the throughput of every disk since the previous call.
+
+        The first call returns an empty list, since there is nothing to compare with.
+
+        Returns:
+            list of DiskIO: Throughput per disk, in device order.
+        """
+        now = self.clock()
+        counters = psutil.disk_io_counters(perdisk=True) or {}
+        elapsed = now - self._last_sample if self._last_sample is not None else None
+        result = []
+        if elapsed:
+            for device, current in sorted(counters.items()):
+                previous = self._counters.get(device)
+                if previous is None:
+                    continue
+                deltas = (current.read_bytes - previous.read_bytes, current.write_bytes - previous.write_bytes,
+                          current.read_count - previous.read_count, current.write_count - previous.write_count)
+                if min(deltas) < 0:
+                    deltas = (0, 0, 0, 0)
+                result.append(DiskIO(device, *(delta / elapsed for delta in deltas)))
+        self._counters = counters
+        self._last_sample = now
+        return result
+
+    def close(self):
+        """Stop watching the mount table."""
+        self.watcher.close()
+
@@ -0,0 +1,149 @@
+import threading
+
+# Prefix of all exported metric names
+PREFIX = "system_monitor_"
+
+# Exported metrics: name -> (help text, label name or None)
+METRICS = {
+    "cpu_usage_percent": ("CPU usage in percent.", None),
+    "memory_usage_percent": ("Memory usage in percent.", None),
+    "disk_usage_percent": ("Usage of the root filesystem in percent.", None),
+    "filesystem_usage_percent": ("Usage of a mounted filesystem in percent.", "mountpoint"),
+    "network_sent_bytes_per_second": ("Bytes sent per second over all monitored interfaces.", None),
+    "network_received_bytes_per_second": ("Bytes received per second over all monitored interfaces.", None),
+    "network_interface_sent_bytes_per_second": ("Bytes sent per second over a network interface.", "interface"),
+    "network_interface_received_bytes_per_second": ("Bytes received per second over a network interface.", "interface"),
+    "cgroup_cpu_usage_percent": ("CPU usage of a cgroup in percent of one CPU.", "cgroup"),
+    "cgroup_memory_usage_bytes": ("Memory used by a cgroup in bytes.", "cgroup"),
+    "open_ports": ("Number of listening sockets.", None),
+    "insecure_files": ("Number of world-readable files in the insecure directories.", None),
+}
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+class MetricsSnapshot:
+    """
+    The latest metric values, kept serialized in the OpenMetrics text format.
+
+    Collectors `update` the values they measured, which re-renders the whole exposition
+    once; a scrape only hands out the rendered bytes. Scrapes therefore cost the same however
+    often and from however many servers they come, and never read psutil or the filesystem.
+    Metrics that were never updated are left out.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+        self.payload = b"# EOF\n"
+
+    def update(self, **values):
+        """
+        Set metric values and re-render the exposition.
+
+        Args:
+            **values: Value per metric name of `METRICS`: a number, or for labelled metrics a
+                dict of label value -> number, which replaces all series of the metric.
+
+        Raises:
+            KeyError: If a metric name is unknown.
+        """
+        for name in values:
+            if name not in METRICS:
+                raise KeyError(f"unknown metric {name!r}")
+        with self._lock:
+            self._values.update(values)
+            self.payload = render(self._values)
+
+
+def render(values):
+    """
+    Render metric values in the OpenMetrics text format.
+
+    Args:
+        values (dict): Value per metric name, see `MetricsSnapshot.update`.
+
+    Returns:
+        bytes: The exposition, ending with "# EOF".
+    """
+    lines = []
+    for name, (help_text, label) in METRICS.items():
+        if name not in values:
+            continue
+        full_name = PREFIX + name
+        lines.append(f"# TYPE {full_name} gauge")
+        lines.append(f"# HELP {full_name} {help_text}")
+        value = values[name]
+        if label is None:
+            lines.append(f"{full_name} {_format_value(value)}")
+        else:
+            for label_value, series_value in sorted(value.items()):
+                lines.append(f'{full_name}{{{label}="{_escape(label_value)}"}} {_format_value(series_value)}')
+    lines.append("# EOF\n")
+    return "\n".join(lines).encode()
+
+
+def _escape(label_value):
+    return str(label_value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsExporter:
+    """
+    Serves a `MetricsSnapshot` over HTTP at /metrics for Prometheus.
+
+    It uses the standard library HTTP server on a daemon thread, one thread per request.
+    Requests for other paths get 404.
+
+    Args:
+        snapshot (MetricsSnapshot): The metrics to serve.
+        host (str): Address to listen on, e.g. "0.0.0.0" for all interfaces.
+        port (int): Port to listen on.
+    """
+
+    def __init__(self, snapshot, host, port):
+        self.snapshot = snapshot
+        self.host = host
+        self.port = port
+        self._server = None
+
+    def start(self):
+        """
+        Start serving.
+
+        Raises:
+            OSError: If the address cannot be bound.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        snapshot = self.snapshot
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                payload = snapshot.payload
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes are too frequent to print
+
+        self._server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="metrics-exporter", daemon=True).start()
+
+    def stop(self):
+        """Stop serving and close the socket."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
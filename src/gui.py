@@ -1,6 +1,13 @@
+import time
 import tkinter as tk
+from bisect import bisect_left
 from tkinter import scrolledtext, ttk
-from config import args
+import config
+import stats
+from logtail import LogTailer
+from collector import Reporter
+from ports import SOCKET_HEADER
+from cgroups import exceeded
 
 # Declare labels and text areas as global variables
 cpu_label = None
@@ -11,14 +18,57 @@ ssh_ports_text = None
 insecure_files_text = None
 warning_log_text = None
 info_log_text = None
+processes_tree = None
+mounts_tree = None
+disk_io_tree = None
+interfaces_tree = None
+diagnostics_text = None
+agents_tree = None
+cgroups_tree = None
+
+# Listings shown in the SSH monitoring text widgets, keyed by widget path
+listing_views = {}
+
+# Log tailers for the log text widgets, keyed by widget path
+log_tailers = {}
+
+# Columns of the process table: column id -> (title, width in pixels)
+PROCESS_COLUMNS = {"pid": ("PID", 70), "name": ("Name", 250), "cpu": ("CPU %", 80), "rss": ("RSS MB", 100), "io": ("I/O MB/s", 100)}
+
+# Columns of the mountpoint and disk throughput tables
+MOUNT_COLUMNS = {"mountpoint": ("Mountpoint", 200), "device": ("Device", 180), "fstype": ("Type", 70),
+                 "percent": ("Used %", 70), "free": ("Free GB", 80), "threshold": ("Threshold %", 90)}
+DISK_IO_COLUMNS = {"device": ("Disk", 150), "read": ("Read MB/s", 100), "write": ("Write MB/s", 100),
+                   "read_ops": ("Read IOPS", 90), "write_ops": ("Write IOPS", 90)}
+
+# Columns of the cgroup table
+CGROUP_COLUMNS = {"path": ("Cgroup", 300), "cpu": ("CPU %", 60), "memory": ("Memory MB", 80), "limit": ("Limit MB", 80),
+                  "memory_percent": ("Memory %", 70), "read": ("Read MB/s", 80), "write": ("Write MB/s", 80),
+                  "cpu_pressure": ("CPU PSI %", 70), "memory_pressure": ("Mem PSI %", 70), "io_pressure": ("I/O PSI %", 70)}
+
+# Columns of the remote agent table
+AGENT_COLUMNS = {"name": ("Agent", 140), "address": ("Address", 140), "status": ("Status", 90), "last_seen": ("Last Sample", 130),
+                 "cpu": ("CPU %", 60), "memory": ("Memory %", 70), "disk": ("Disk %", 60), "sent": ("Sent MB/s", 80),
+                 "recv": ("Recv MB/s", 80), "ports": ("Open Ports", 80), "files": ("Insecure Files", 90)}
+
+# Columns of the network interface table
+INTERFACE_COLUMNS = {"name": ("Interface", 200), "sent": ("Sent MB/s", 110), "recv": ("Recv MB/s", 110), "threshold": ("Threshold MB/s", 110)}
+
+# Samples of the health metrics shown in the history chart of the Monitoring tab
+HISTORY_SAMPLES = 300
+
+# Rows of the history chart: (title, metrics, colors); CPU, memory and disk are drawn on a
+# 0-100% scale, the network rates on the scale of their largest value
+HISTORY_ROWS = (("CPU", ("cpu",), ("blue",)), ("Memory", ("memory",), ("purple",)), ("Disk", ("disk",), ("brown",)),
+                ("Network", ("net_sent", "net_recv"), ("orange", "darkgreen")))
 
 
 def create_gui():
     """
     Create and configure the graphical user interface for the System Health and SSH Monitoring Tool.
 
-    This function initializes the main window and sets up a tabbed interface with two main tabs:
-    "Monitoring" and "SSH Monitoring". Within the "Monitoring" tab, it creates labeled frames
+    This function initializes the main window and sets up a tabbed interface with the tabs
+    "Monitoring", "Network", "Processes", "Disks", "Containers", "Agents", "Logs" and "Diagnostics". Within the "Monitoring" tab, it creates labeled frames
     for displaying system health indicators and SSH monitoring information.
 
     The GUI components include:
@@ -28,6 +78,7 @@ def create_gui():
         - A labeled frame for system health indicators.
         - A labeled frame for SSH monitoring.
         - Labels for displaying CPU usage and other system health metrics.
+        - A chart of the last HISTORY_SAMPLES samples of these metrics.
 
     Returns:
         None
@@ -63,6 +114,9 @@ def create_gui():
     network_label = tk.Label(system_frame, text="Network Usage: Calculating...", font=("Helvetica", 12))
     network_label.pack(anchor="w")
 
+    history_canvas = tk.Canvas(system_frame, height=120, bg="white", highlightthickness=0)
+    history_canvas.pack(fill="x", pady=5)
+
     ssh_ports_label = tk.Label(ssh_frame, text="Open Ports:", font=("Helvetica", 12))
     ssh_ports_label.pack(anchor="w")
 
@@ -75,6 +129,55 @@ def create_gui():
     insecure_files_text = scrolledtext.ScrolledText(ssh_frame, height=10)
     insecure_files_text.pack(fill="both", expand=True, pady=5)
 
+    # Network tab
+    network_tab = tk.Frame(notebook)
+    notebook.add(network_tab, text="Network")
+
+    interfaces_frame = tk.LabelFrame(network_tab, text="Network Interfaces", padx=10, pady=10)
+    interfaces_frame.pack(fill="both", expand="yes", padx=10, pady=5)
+    interfaces_tree = create_table(interfaces_frame, INTERFACE_COLUMNS, text_columns=("name",))
+    interfaces_tree.tag_configure("warning", foreground="red")
+
+    # Processes tab
+    processes_tab = tk.Frame(notebook)
+    notebook.add(processes_tab, text="Processes")
+
+    processes_frame = tk.LabelFrame(processes_tab, text="Top Processes by CPU, Memory and Disk I/O", padx=10, pady=10)
+    processes_frame.pack(fill="both", expand="yes", padx=10, pady=5)
+
+    processes_tree = create_table(processes_frame, PROCESS_COLUMNS, text_columns=("name",))
+
+    # Disks tab
+    disks_tab = tk.Frame(notebook)
+    notebook.add(disks_tab, text="Disks")
+
+    mounts_frame = tk.LabelFrame(disks_tab, text="Filesystem Usage", padx=10, pady=10)
+    mounts_frame.pack(fill="both", expand="yes", padx=10, pady=5)
+    mounts_tree = create_table(mounts_frame, MOUNT_COLUMNS, text_columns=("mountpoint", "device", "fstype"))
+    mounts_tree.tag_configure("warning", foreground="red")
+
+    disk_io_frame = tk.LabelFrame(disks_tab, text="Disk Throughput", padx=10, pady=10)
+    disk_io_frame.pack(fill="both", expand="yes", padx=10, pady=5)
+    disk_io_tree = create_table(disk_io_frame, DISK_IO_COLUMNS, text_columns=("device",))
+
+    # Containers tab
+    cgroups_tab = tk.Frame(notebook)
+    notebook.add(cgroups_tab, text="Containers")
+
+    cgroups_frame = tk.LabelFrame(cgroups_tab, text="Cgroups (containers and services)", padx=10, pady=10)
+    cgroups_frame.pack(fill="both", expand="yes", padx=10, pady=5)
+    cgroups_tree = create_table(cgroups_frame, CGROUP_COLUMNS, text_columns=("path",))
+    cgroups_tree.tag_configure("warning", foreground="red")
+
+    # Agents tab
+    agents_tab = tk.Frame(notebook)
+    notebook.add(agents_tab, text="Agents")
+
+    agents_frame = tk.LabelFrame(agents_tab, text="Remote Agents (--aggregate)", padx=10, pady=10)
+    agents_frame.pack(fill="both", expand="yes", padx=10, pady=5)
+    agents_tree = create_table(agents_frame, AGENT_COLUMNS, text_columns=("name", "address", "status", "last_seen"))
+    agents_tree.tag_configure("warning", foreground="red")
+
     # Logs tab
     logs_tab = tk.Frame(notebook)
     notebook.add(logs_tab, text="Logs")
@@ -92,8 +195,38 @@ def create_gui():
     info_log_text = scrolledtext.ScrolledText(info_log_frame, height=10)
     info_log_text.pack(fill="both", expand=True, pady=5)
 
+    # Diagnostics tab
+    diagnostics_tab = tk.Frame(notebook)
+    notebook.add(diagnostics_tab, text="Diagnostics")
+
+    diagnostics_frame = tk.LabelFrame(diagnostics_tab, text="Internal Latencies, Counters and Queue Depths", padx=10, pady=10)
+    diagnostics_frame.pack(fill="both", expand="yes", padx=10, pady=5)
+
+    diagnostics_text = scrolledtext.ScrolledText(diagnostics_frame, height=20, font=("Courier", 10))
+    diagnostics_text.pack(fill="both", expand=True, pady=5)
+
     # Return all necessary widgets
-    return root, cpu_label, memory_label, disk_label, network_label, ssh_ports_text, insecure_files_text, warning_log_text, info_log_text
+    return root, cpu_label, memory_label, disk_label, network_label, ssh_ports_text, insecure_files_text, warning_log_text, info_log_text, processes_tree, mounts_tree, disk_io_tree, interfaces_tree, diagnostics_text, agents_tree, cgroups_tree, history_canvas
+
+def create_table(parent, columns, text_columns=()):
+    """
+    Create a table (a `ttk.Treeview` without tree column) and pack it into a frame.
+
+    Args:
+        parent (tk.Widget): The frame that holds the table.
+        columns (dict): Column id -> (title, width in pixels), in display order.
+        text_columns (tuple of str, optional): Columns aligned left; the others hold numbers
+            and are aligned right. Defaults to ().
+
+    Returns:
+        ttk.Treeview: The table.
+    """
+    table = ttk.Treeview(parent, columns=tuple(columns), show="headings")
+    for column, (title, width) in columns.items():
+        table.heading(column, text=title)
+        table.column(column, width=width, anchor="w" if column in text_columns else "e")
+    table.pack(fill="both", expand=True, pady=5)
+    return table
 
 def start_gui(root):
     """
@@ -111,13 +244,14 @@ def start_gui(root):
     """
     root.mainloop()
 
-def update_labels(cpu_label, memory_label, disk_label, network_label, cpu_usage, memory_usage, disk_usage, sent_per_sec, recv_per_sec):
+def update_labels(cpu_label, memory_label, disk_label, network_label, cpu_usage, memory_usage, disk_usage, sent_per_sec, recv_per_sec, alerting=()):
     """
     Update the text and color of the system health indicator labels.
 
     This function updates the text of the provided labels to display the current CPU, memory,
-    disk, and network usage. It also changes the text color to red if the usage exceeds the
-    specified thresholds, otherwise it sets the color to green.
+    disk, and network usage. It also changes the text color to red while a rule of the metric
+    is active, otherwise it sets the color to green. The disk label is also red above the
+    disk threshold of the root filesystem, which the disks collector checks.
 
     Args:
         cpu_label (tk.Label): Label widget for displaying CPU usage.
@@ -129,31 +263,176 @@ def update_labels(cpu_label, memory_label, disk_label, network_label, cpu_usage,
         disk_usage (float): Current disk usage percentage.
         sent_per_sec (float): Current network sent rate in MB/s.
         recv_per_sec (float): Current network received rate in MB/s.
+        alerting (set of str, optional): Metrics with an active rule, see `monitor.check_rules`.
 
     Returns:
         None
     """
     cpu_label.config(text=f"CPU Usage: {cpu_usage:.2f}%")
-    cpu_label.config(fg="red" if cpu_usage > args.cpu else "green")
+    cpu_label.config(fg="red" if "cpu" in alerting else "green")
 
     memory_label.config(text=f"Memory Usage: {memory_usage:.2f}%")
-    memory_label.config(fg="red" if memory_usage > args.memory else "green")
+    memory_label.config(fg="red" if "memory" in alerting else "green")
 
     disk_label.config(text=f"Disk Usage: {disk_usage:.2f}%")
-    disk_label.config(fg="red" if disk_usage > args.disk else "green")
+    disk_label.config(fg="red" if "disk" in alerting or disk_usage > config.disk_threshold("/") else "green")
 
     network_label.config(text=f"Network Usage: Sent: {sent_per_sec:.2f} MB/s, Recv: {recv_per_sec:.2f} MB/s")
-    if sent_per_sec > args.network or recv_per_sec > args.network:
+    if "net_sent" in alerting or "net_recv" in alerting:
         network_label.config(fg="red")
     else:
         network_label.config(fg="green")
 
+def update_history_chart(history_canvas, values):
+    """
+    Draw the recent samples of the health metrics as one line chart per row of HISTORY_ROWS.
+
+    Args:
+        history_canvas (tk.Canvas): Canvas of the Monitoring tab.
+        values (dict): The recent values per metric, oldest first.
+
+    Returns:
+        None
+    """
+    history_canvas.delete("all")
+    width = history_canvas.winfo_width()
+    row_height = history_canvas.winfo_height() / len(HISTORY_ROWS)
+    left = 70
+    if width <= left + 1 or row_height < 4:
+        return
+    step = (width - left) / (HISTORY_SAMPLES - 1)
+
+    for row, (title, metrics, colors) in enumerate(HISTORY_ROWS):
+        top = row * row_height
+        series = [[v for v in values.get(metric, ()) if v == v] for metric in metrics]  # Drop NaN
+        scale = 100.0 if metrics[0] != "net_sent" else max([v for s in series for v in s] + [0.01])
+        unit = "%" if scale == 100.0 else " MB/s"
+        history_canvas.create_text(4, top + row_height / 2, anchor="w", text=title, font=("Helvetica", 9))
+        history_canvas.create_text(width - 4, top + 2, anchor="ne", text=f"{scale:.3g}{unit}", font=("Helvetica", 7), fill="gray")
+        history_canvas.create_line(left, top + row_height - 1, width, top + row_height - 1, fill="lightgray")
+        for points, color in zip(series, colors):
+            if len(points) < 2:
+                continue
+            # The newest sample is at the right edge
+            offset = left + (HISTORY_SAMPLES - len(points)) * step
+            coordinates = []
+            for i, value in enumerate(points):
+                coordinates.append(offset + i * step)
+                coordinates.append(top + row_height - 2 - min(value / scale, 1.0) * (row_height - 4))
+            history_canvas.create_line(*coordinates, fill=color)
+
+class ListingView:
+    """
+    A sorted listing shown in a Text widget, one item per line.
+
+    The view keeps the displayed lines in a sorted list, so the line number of an item is
+    found with a binary search and additions and removals are applied to the widget in place
+    instead of redrawing the whole listing. Lines added after the first update are
+    highlighted until the next update that adds lines.
+
+    Args:
+        text_widget (tk.Text): Text widget that shows the listing.
+        header (str, optional): Fixed first line, e.g. column titles. Defaults to None.
+        empty_text (str, optional): Text shown while the listing is empty. Defaults to None.
+    """
+
+    def __init__(self, text_widget, header=None, empty_text=None):
+        self.text_widget = text_widget
+        self.header = header
+        self.empty_text = empty_text
+        self.lines = []
+        self.initialized = False
+        text_widget.tag_configure("new", background="#fff3b0", foreground="red")
+        self._redraw()
+
+    def reset(self, lines, header=None):
+        """
+        Replace the whole listing.
+
+        Args:
+            lines (iterable of str): New lines.
+            header (str, optional): New fixed first line. Defaults to None.
+        """
+        self.header = header
+        self.lines = sorted(lines)
+        self.initialized = True
+        self._redraw()
+
+    def apply(self, added, removed):
+        """
+        Apply additions and removals to the listing.
+
+        Args:
+            added (iterable of str): Lines to add.
+            removed (iterable of str): Lines to remove.
+        """
+        widget = self.text_widget
+        was_empty = not self.lines
+        offset = 2 if self.header is not None else 1
+
+        for line in removed:
+            i = bisect_left(self.lines, line)
+            if i < len(self.lines) and self.lines[i] == line:
+                del self.lines[i]
+                widget.delete(f"{i + offset}.0", f"{i + offset + 1}.0")
+
+        added = list(added)
+        if was_empty and added:
+            widget.delete(1.0, tk.END)
+            if self.header is not None:
+                widget.insert(tk.END, f"{self.header}\n")
+        if added and self.initialized:
+            widget.tag_remove("new", 1.0, tk.END)
+        for line in added:
+            i = bisect_left(self.lines, line)
+            if i < len(self.lines) and self.lines[i] == line:
+                continue
+            self.lines.insert(i, line)
+            index = f"{i + offset}.0"
+            if self.initialized:
+                widget.insert(index, f"{line}\n", "new")
+            else:
+                widget.insert(index, f"{line}\n")
+
+        if not self.lines and not was_empty:
+            self._redraw()
+        self.initialized = True
+
+    def _redraw(self):
+        widget = self.text_widget
+        widget.delete(1.0, tk.END)
+        if self.header is not None:
+            widget.insert(tk.END, f"{self.header}\n")
+        if self.lines:
+            widget.insert(tk.END, "".join(f"{line}\n" for line in self.lines))
+        elif self.empty_text is not None:
+            widget.insert(tk.END, self.empty_text)
+
+def get_listing_view(text_widget, header=None, empty_text=None):
+    """
+    Return the `ListingView` for a text widget, creating it on first use.
+
+    Args:
+        text_widget (tk.Text): Text widget that shows the listing.
+        header (str, optional): Fixed first line for a new view. Defaults to None.
+        empty_text (str, optional): Text shown while a new view is empty. Defaults to None.
+
+    Returns:
+        ListingView: The view for the widget.
+    """
+    key = str(text_widget)
+    if key not in listing_views:
+        listing_views[key] = ListingView(text_widget, header, empty_text)
+    return listing_views[key]
+
 def update_ssh_texts(ssh_ports_text, insecure_files_text, open_ports, insecure_files):
     """
     Update the text widgets for SSH ports and insecure files.
 
     This function updates the provided text widgets to display the current open SSH ports
     and insecure files. It clears the existing content and inserts the new information.
+    It is used when the open ports are only available as command output; otherwise
+    `update_port_changes` and `update_insecure_files_changes` apply just the changes.
 
     Args:
         ssh_ports_text (tk.Text): Text widget for displaying open SSH ports.
@@ -161,31 +440,298 @@ def update_ssh_texts(ssh_ports_text, insecure_files_text, open_ports, insecure_f
         open_ports (str): String containing the list of open SSH ports.
         insecure_files (list of str): List of insecure file paths.
 
+    Returns:
+        None
+    """
+    update_ports_text(ssh_ports_text, open_ports)
+
+    view = get_listing_view(insecure_files_text, empty_text="No insecure files found.")
+    view.reset(insecure_files)
+
+def update_ports_text(ssh_ports_text, open_ports):
+    """
+    Replace the open ports text with command output.
+
+    Args:
+        ssh_ports_text (tk.Text): Text widget for displaying open SSH ports.
+        open_ports (str): String containing the list of open SSH ports.
+
     Returns:
         None
     """
     ssh_ports_text.delete(1.0, tk.END)
     ssh_ports_text.insert(tk.END, open_ports)
 
-    insecure_files_text.delete(1.0, tk.END)
-    if insecure_files:
-        for file in insecure_files:
-            insecure_files_text.insert(tk.END, f"{file}\n")
+def update_port_changes(ssh_ports_text, port_header, ports_added, ports_removed):
+    """
+    Apply changes to the open ports listing.
+
+    Only the lines that were added or removed are touched, and new lines are highlighted,
+    so the widget is not redrawn when nothing changed.
+
+    Args:
+        ssh_ports_text (tk.Text): Text widget for displaying open SSH ports.
+        port_header (str): Column titles shown above the open ports.
+        ports_added (list of str): Lines for ports that were opened.
+        ports_removed (list of str): Lines for ports that were closed.
+
+    Returns:
+        None
+    """
+    view = get_listing_view(ssh_ports_text, header=port_header)
+    if ports_added or ports_removed or not view.initialized:
+        view.apply(ports_added, ports_removed)
+
+def update_insecure_files_changes(insecure_files_text, files_added, files_removed):
+    """
+    Apply changes to the insecure files listing.
+
+    Only the lines that were added or removed are touched, and new lines are highlighted.
+
+    Args:
+        insecure_files_text (tk.Text): Text widget for displaying insecure files.
+        files_added (list of str): Files that became insecure.
+        files_removed (list of str): Files that are no longer insecure.
+
+    Returns:
+        None
+    """
+    view = get_listing_view(insecure_files_text, empty_text="No insecure files found.")
+    if files_added or files_removed or not view.initialized:
+        view.apply(files_added, files_removed)
+
+def update_process_table(processes_tree, processes):
+    """
+    Show the top processes in the process table.
+
+    Rows are kept per PID, so a process that stays in the top lists keeps its row and only
+    its values change; rows of processes that dropped out are deleted.
+
+    Args:
+        processes_tree (ttk.Treeview): Table of the Processes tab.
+        processes (list of ProcessSample): The top processes, in display order.
+
+    Returns:
+        None
+    """
+    update_table(processes_tree, {
+        str(p.pid): ((p.pid, p.name, f"{p.cpu:.1f}", f"{p.rss / (1024 * 1024):.1f}", f"{p.io_rate / (1024 * 1024):.2f}"), ())
+        for p in processes
+    })
+
+def update_interface_table(interfaces_tree, interfaces):
+    """
+    Show the traffic per network interface.
+
+    Interfaces above their own threshold (`--interface_thresholds`) are shown in red.
+
+    Args:
+        interfaces_tree (ttk.Treeview): Table of the Network tab.
+        interfaces (list of InterfaceRate): Traffic per interface in bytes per second.
+
+    Returns:
+        None
+    """
+    rows = {}
+    for interface in interfaces:
+        sent, recv = interface.sent / (1024 * 1024), interface.recv / (1024 * 1024)
+        threshold = config.interface_threshold(interface.name)
+        values = (interface.name, f"{sent:.2f}", f"{recv:.2f}", "" if threshold is None else f"{threshold:g}")
+        warning = threshold is not None and (sent > threshold or recv > threshold)
+        rows[interface.name] = (values, ("warning",) if warning else ())
+    update_table(interfaces_tree, rows)
+
+def update_cgroup_table(cgroups_tree, cgroups):
+    """
+    Show the resource usage per cgroup.
+
+    Cgroups with a metric above its threshold are shown in red.
+
+    Args:
+        cgroups_tree (ttk.Treeview): Table of the Containers tab.
+        cgroups (list of CgroupUsage): Usage per cgroup.
+
+    Returns:
+        None
+    """
+    def number(value, scale=1, digits=1):
+        return "" if value is None else f"{value / scale:.{digits}f}"
+
+    mb = 1024 * 1024
+    rows = {}
+    for c in cgroups:
+        values = (c.path, number(c.cpu), number(c.memory, mb, 0), number(c.memory_limit, mb, 0), number(c.memory_percent),
+                  number(c.read_bytes, mb, 2), number(c.write_bytes, mb, 2), number(c.cpu_pressure),
+                  number(c.memory_pressure), number(c.io_pressure))
+        rows[c.path] = (values, ("warning",) if exceeded(c, config.cgroup_threshold) else ())
+    update_table(cgroups_tree, rows)
+
+def update_agent_row(agents_tree, status):
+    """
+    Show the latest state of a remote agent in its row of the agent table.
+
+    Disconnected agents and agents with an active rule are shown in red.
+
+    Args:
+        agents_tree (ttk.Treeview): Table of the Agents tab.
+        status (AgentStatus): The state of the agent.
+
+    Returns:
+        None
+    """
+    def number(value, digits=1):
+        return "" if value is None else f"{value:.{digits}f}"
+
+    last_seen = "" if status.last_seen is None else time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(status.last_seen))
+    values = (status.name, status.address or "", "connected" if status.connected else "disconnected", last_seen,
+              number(status.cpu), number(status.memory), number(status.disk), number(status.net_sent, 2),
+              number(status.net_recv, 2), status.open_ports, status.insecure_files)
+    tags = ("warning",) if not status.connected or status.alerting else ()
+    if agents_tree.exists(status.name):
+        agents_tree.item(status.name, values=values, tags=tags)
     else:
-        insecure_files_text.insert(tk.END, "No insecure files found.")
+        agents_tree.insert("", tk.END, iid=status.name, values=values, tags=tags)
+
+def update_disk_tables(mounts_tree, disk_io_tree, mounts, disk_io):
+    """
+    Show the usage per mountpoint and the throughput per disk.
+
+    Filesystems above their disk usage threshold are shown in red.
+
+    Args:
+        mounts_tree (ttk.Treeview): Filesystem usage table of the Disks tab.
+        disk_io_tree (ttk.Treeview): Disk throughput table of the Disks tab.
+        mounts (list of MountUsage): Usage per mountpoint.
+        disk_io (list of DiskIO): Throughput per disk.
 
-def update_log_content(log_text_widget, log_file):
+    Returns:
+        None
     """
-    Update the content of a log text widget with the contents of a log file.
+    rows = {}
+    for m in mounts:
+        threshold = config.disk_threshold(m.mountpoint)
+        values = (m.mountpoint, m.device, m.fstype, f"{m.percent:.1f}", f"{m.free / 1024 ** 3:.1f}", f"{threshold:g}")
+        rows[m.mountpoint] = (values, ("warning",) if m.percent > threshold else ())
+    update_table(mounts_tree, rows)
+
+    mb = 1024 * 1024
+    update_table(disk_io_tree, {
+        d.device: ((d.device, f"{d.read_bytes / mb:.2f}", f"{d.write_bytes / mb:.2f}", f"{d.read_ops:.0f}", f"{d.write_ops:.0f}"), ())
+        for d in disk_io
+    })
+
+def update_table(table, rows):
+    """
+    Replace the rows of a table, keeping the rows whose id stays.
 
-    This function reads the specified log file and updates the provided text widget
-    with its contents. If the log file is not found, it displays an error message
-    in the text widget. The function also scrolls to the end of the log content
-    after updating.
+    A row that is still present keeps its item and only its values and tags change, so the
+    selection and scroll position survive the refresh. Rows that are gone are deleted.
+
+    Args:
+        table (ttk.Treeview): The table.
+        rows (dict): Row id -> (values, tags), in display order.
+
+    Returns:
+        None
+    """
+    for item in table.get_children():
+        if item not in rows:
+            table.delete(item)
+    for index, (item, (values, tags)) in enumerate(rows.items()):
+        if table.exists(item):
+            table.item(item, values=values, tags=tags)
+            table.move(item, "", index)
+        else:
+            table.insert("", index, iid=item, values=values, tags=tags)
+
+class GuiReporter(Reporter):
+    """
+    Shows the collector results in the Tk window.
+
+    The collectors call this reporter from their sampler threads, so every update is posted
+    through the collector runtime to run on the GUI thread.
+
+    Args:
+        runtime (CollectorRuntime): The runtime used to post GUI updates.
+        cpu_label (tk.Label): Label widget for displaying CPU usage.
+        memory_label (tk.Label): Label widget for displaying memory usage.
+        disk_label (tk.Label): Label widget for displaying disk usage.
+        network_label (tk.Label): Label widget for displaying network usage.
+        ssh_ports_text (tk.Text): Text widget for displaying open SSH ports.
+        insecure_files_text (tk.Text): Text widget for displaying insecure files.
+        processes_tree (ttk.Treeview): Table for displaying the top processes.
+        mounts_tree (ttk.Treeview): Table for displaying the usage per mountpoint.
+        disk_io_tree (ttk.Treeview): Table for displaying the throughput per disk.
+        interfaces_tree (ttk.Treeview): Table for displaying the traffic per network interface.
+        agents_tree (ttk.Treeview): Table for displaying the remote agents.
+        cgroups_tree (ttk.Treeview): Table for displaying the usage per cgroup.
+        history_canvas (tk.Canvas): Chart of the recent health samples.
+    """
+
+    def __init__(self, runtime, cpu_label, memory_label, disk_label, network_label, ssh_ports_text, insecure_files_text, processes_tree, mounts_tree, disk_io_tree, interfaces_tree, agents_tree, cgroups_tree, history_canvas):
+        self.runtime = runtime
+        self.cpu_label = cpu_label
+        self.memory_label = memory_label
+        self.disk_label = disk_label
+        self.network_label = network_label
+        self.ssh_ports_text = ssh_ports_text
+        self.insecure_files_text = insecure_files_text
+        self.processes_tree = processes_tree
+        self.mounts_tree = mounts_tree
+        self.disk_io_tree = disk_io_tree
+        self.interfaces_tree = interfaces_tree
+        self.agents_tree = agents_tree
+        self.cgroups_tree = cgroups_tree
+        self.history_canvas = history_canvas
+
+    def show_health(self, cpu_usage, memory_usage, disk_usage, sent_per_sec, recv_per_sec, alerting=()):
+        self.runtime.post(update_labels, self.cpu_label, self.memory_label, self.disk_label, self.network_label,
+                          cpu_usage, memory_usage, disk_usage, sent_per_sec, recv_per_sec, alerting)
+
+    def show_history(self, history):
+        # Copy the values on the sampler thread; the views of the history change with every sample
+        values = {name: history.values(name, HISTORY_SAMPLES) for name in history.metrics}
+        self.runtime.post(update_history_chart, self.history_canvas, values)
+
+    def show_ports_text(self, open_ports):
+        self.runtime.post(update_ports_text, self.ssh_ports_text, open_ports)
+
+    def show_port_changes(self, ports_added, ports_removed):
+        self.runtime.post(update_port_changes, self.ssh_ports_text, SOCKET_HEADER, ports_added, ports_removed)
+
+    def show_insecure_file_changes(self, files_added, files_removed):
+        self.runtime.post(update_insecure_files_changes, self.insecure_files_text, files_added, files_removed)
+
+    def show_interfaces(self, interfaces):
+        self.runtime.post(update_interface_table, self.interfaces_tree, interfaces)
+
+    def show_top_processes(self, processes):
+        self.runtime.post(update_process_table, self.processes_tree, processes)
+
+    def show_disks(self, mounts, disk_io):
+        self.runtime.post(update_disk_tables, self.mounts_tree, self.disk_io_tree, mounts, disk_io)
+
+    def show_cgroups(self, cgroups):
+        self.runtime.post(update_cgroup_table, self.cgroups_tree, cgroups)
+
+    def show_agent(self, status):
+        self.runtime.post(update_agent_row, self.agents_tree, status)
+
+def update_log_content(log_text_widget, log_file, interval=2000):
+    """
+    Append new lines of a log file to a log text widget and schedule the next refresh.
+
+    Only the bytes appended since the previous refresh are read, using a `LogTailer` per
+    widget, so the cost stays proportional to the new data however large the log grows.
+    Rotation and truncation of the log are detected by the tailer. The widget keeps at most
+    `--log_lines` lines, dropping the oldest ones. If the log file is not found, an error
+    message is displayed in the text widget. The function scrolls to the end of the log
+    content whenever new lines are added.
 
     Args:
         log_text_widget (tk.Text): Text widget for displaying log content.
         log_file (str): Path to the log file to be read.
+        interval (int, optional): Milliseconds until the next refresh. Defaults to 2000.
 
     Returns:
         None
@@ -194,13 +740,49 @@ def update_log_content(log_text_widget, log_file):
         print(f"Log text widget for {log_file} is None.")
         return
 
-    print(f"Reading log file: {log_file}")
+    key = str(log_text_widget)
+    if key not in log_tailers:
+        log_tailers[key] = LogTailer(log_file)
+        log_text_widget.delete(1.0, tk.END)
+    tailer = log_tailers[key]
 
     try:
-        with open(log_file, 'r') as file:
-            log_text_widget.delete(1.0, tk.END)
-            log_text_widget.insert(tk.END, file.read())
+        with stats.timed("logtail"):
+            text, reset = tailer.read()
+        if reset:
+            text = f"--- {log_file} was rotated or truncated ---\n" + text
+        if text:
+            if log_text_widget.get(1.0, "1.end").startswith("Log file "):
+                log_text_widget.delete(1.0, tk.END)
+            log_text_widget.insert(tk.END, text)
+            excess = int(log_text_widget.index("end-1c").split(".")[0]) - 1 - config.args.log_lines
+            if excess > 0:
+                log_text_widget.delete(1.0, f"{excess + 1}.0")
             log_text_widget.yview(tk.END)  # Scroll to the end of the log content
     except FileNotFoundError:
         log_text_widget.delete(1.0, tk.END)
         log_text_widget.insert(tk.END, f"Log file {log_file} not found.")
+        tailer.reset()
+
+    log_text_widget.after(interval, update_log_content, log_text_widget, log_file, interval)
+
+def update_diagnostics(diagnostics_text, interval=2000):
+    """
+    Show the internal statistics in the Diagnostics tab and schedule the next refresh.
+
+    The tab lists the latency histograms (count, mean, p50, p95, p99 and maximum) of the
+    collectors, file scans, log tailing, GUI updates and alert sending, the error and
+    missed-tick counters and the queue depths, see `stats`.
+
+    Args:
+        diagnostics_text (tk.Text): Text widget of the Diagnostics tab.
+        interval (int, optional): Milliseconds until the next refresh. Defaults to 2000.
+
+    Returns:
+        None
+    """
+    position = diagnostics_text.yview()[0]
+    diagnostics_text.delete(1.0, tk.END)
+    diagnostics_text.insert(tk.END, stats.format_stats())
+    diagnostics_text.yview_moveto(position)
+    diagnostics_text.after(interval, update_diagnostics, diagnostics_text, interval)
@@ -0,0 +1,144 @@
+from array import array
+
+# Metrics recorded by update_health_indicators
+METRICS = ("cpu", "memory", "disk", "net_sent", "net_recv")
+
+
+class RingBuffer:
+    """
+    Fixed-capacity ring buffer of numbers backed by a preallocated `array`.
+
+    Appending is O(1) and never allocates, so memory stays constant however long the tool
+    runs. Once full, each append overwrites the oldest value.
+
+    Args:
+        capacity (int): Number of values kept.
+        typecode (str, optional): `array` type code of the values. Defaults to "d" (float).
+    """
+
+    def __init__(self, capacity, typecode="d"):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self._data = array(typecode, [0]) * capacity
+        self._next = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, value):
+        """Append a value, overwriting the oldest one when the buffer is full."""
+        self._data[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+
+    def last(self):
+        """
+        Return the most recent value.
+
+        Raises:
+            IndexError: If the buffer is empty.
+        """
+        if not self._size:
+            raise IndexError("ring buffer is empty")
+        return self._data[self._next - 1]
+
+    def window(self, n=None):
+        """
+        Return the last `n` values as zero-copy views, oldest first.
+
+        The values may wrap around the end of the underlying array, so they are returned as
+        one or two memoryviews that are read in order. `numpy.frombuffer` accepts them
+        without copying as well. The views share memory with the buffer, so later appends
+        overwrite what they show.
+
+        Args:
+            n (int, optional): Number of values. Defaults to all stored values.
+
+        Returns:
+            tuple of memoryview: One or two views covering the values in chronological order.
+        """
+        n = self._size if n is None else max(0, min(n, self._size))
+        start = (self._next - n) % self.capacity
+        end = start + n
+        view = memoryview(self._data)
+        if end <= self.capacity:
+            return (view[start:end],)
+        return (view[start:], view[:end - self.capacity])
+
+    def values(self, n=None):
+        """
+        Return a copy of the last `n` values, oldest first.
+
+        Args:
+            n (int, optional): Number of values. Defaults to all stored values.
+
+        Returns:
+            list: The values.
+        """
+        result = []
+        for segment in self.window(n):
+            result.extend(segment.tolist())
+        return result
+
+
+class MetricHistory:
+    """
+    In-memory history of the health metrics, one `RingBuffer` per metric plus timestamps.
+
+    All buffers are appended together, so the same index refers to the same sample in each
+    of them. There is a single writer (the health collector); readers on other threads may
+    see the newest sample in some buffers before others.
+
+    Args:
+        capacity (int): Number of samples kept per metric.
+        metrics (tuple of str, optional): Metric names. Defaults to `METRICS`.
+    """
+
+    def __init__(self, capacity, metrics=METRICS):
+        self.capacity = capacity
+        self.timestamps = RingBuffer(capacity)
+        self.metrics = {name: RingBuffer(capacity) for name in metrics}
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def append(self, timestamp, **values):
+        """
+        Record one sample.
+
+        Args:
+            timestamp (float): Sample time in seconds since the epoch.
+            **values (float): Value per metric name. Metrics without a value are recorded as NaN.
+        """
+        self.timestamps.append(timestamp)
+        for name, buffer in self.metrics.items():
+            buffer.append(values.get(name, float("nan")))
+
+    def window(self, name, n=None):
+        """
+        Return the last `n` values of a metric as zero-copy views, see `RingBuffer.window`.
+
+        Args:
+            name (str): Metric name.
+            n (int, optional): Number of samples. Defaults to all stored samples.
+
+        Returns:
+            tuple of memoryview: One or two views covering the values in chronological order.
+        """
+        return self.metrics[name].window(n)
+
+    def values(self, name, n=None):
+        """
+        Return a copy of the last `n` values of a metric, oldest first, see `RingBuffer.values`.
+
+        Args:
+            name (str): Metric name.
+            n (int, optional): Number of samples. Defaults to all stored samples.
+
+        Returns:
+            list: The values.
+        """
+        return self.metrics[name].values(n)
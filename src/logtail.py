@@ -0,0 +1,73 @@
+import os
+
+
+class LogTailer:
+    """
+    Reads the lines appended to a log file since the previous read.
+
+    The tailer remembers the inode of the file and the offset it has read up to. If the
+    inode changes (the log was rotated and recreated) or the file becomes shorter than the
+    offset (it was truncated), reading starts again from the beginning of the new file.
+    Only complete lines are returned; a partially written last line is kept for the next
+    read.
+
+    Args:
+        path (str): Path of the log file.
+        max_bytes (int, optional): Most bytes returned by one read. When more was appended,
+            only the last `max_bytes` are read, since the display is capped anyway.
+            Defaults to 256 KiB.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.inode = None
+        self.offset = 0
+        self._partial = b""
+
+    def reset(self):
+        """Forget the file read so far, so the next read starts from the beginning of the log."""
+        self.inode = None
+        self.offset = 0
+        self._partial = b""
+
+    def read(self):
+        """
+        Read the complete lines appended since the previous read.
+
+        Returns:
+            tuple: (text, reset) where `text` is the new lines and `reset` is True if the file
+            was rotated or truncated since the previous read.
+
+        Raises:
+            FileNotFoundError: If the log file does not exist.
+        """
+        with open(self.path, "rb") as log_file:
+            file_stat = os.fstat(log_file.fileno())
+            reset = False
+            if self.inode is not None and (file_stat.st_ino != self.inode or file_stat.st_size < self.offset):
+                reset = True
+                self.offset = 0
+                self._partial = b""
+            self.inode = file_stat.st_ino
+
+            if file_stat.st_size == self.offset:
+                return "", reset
+
+            skip_partial = False
+            if file_stat.st_size - self.offset > self.max_bytes:
+                self.offset = file_stat.st_size - self.max_bytes
+                self._partial = b""
+                skip_partial = True
+
+            log_file.seek(self.offset)
+            data = log_file.read(file_stat.st_size - self.offset)
+
+        self.offset += len(data)
+        if skip_partial:
+            newline = data.find(b"\n")
+            data = data[newline + 1:] if newline >= 0 else b""
+        data = self._partial + data
+        end = data.rfind(b"\n") + 1
+        self._partial = data[end:]
+        return data[:end].decode("utf-8", errors="replace"), reset
@@ -1,9 +1,36 @@
 import os
-import threading
-from gui import create_gui, start_gui, update_log_content, update_labels, update_ssh_texts
-from monitor import update_health_indicators, update_ssh_info
+import config
+import monitor
+import stats
+from collector import CollectorRuntime, Reporter
+from monitor import update_health_indicators, update_open_ports, update_insecure_files, update_top_processes, update_disks, update_cgroups
 
-def start_monitoring(root, cpu_label, memory_label, disk_label, network_label, ssh_ports_text, insecure_files_text, warning_log_text, info_log_text):
+# Collector name -> function that collects one sample and reports it
+COLLECTORS = {
+    "health": update_health_indicators,
+    "ports": update_open_ports,
+    "files": update_insecure_files,
+    "processes": update_top_processes,
+    "disks": update_disks,
+    "cgroups": update_cgroups,
+}
+
+def add_collectors(runtime, reporter):
+    """
+    Register all collectors with the runtime, each with its own schedule from the configuration.
+
+    Args:
+        runtime (CollectorRuntime): The runtime that runs the collectors.
+        reporter (Reporter): Receives the results of the collectors.
+
+    Returns:
+        None
+    """
+    for name, collect in COLLECTORS.items():
+        interval, missed, jitter = config.collector_schedule(name)
+        runtime.add(name, collect, interval, args=(reporter,), missed=missed, jitter=jitter)
+
+def start_monitoring(root, cpu_label, memory_label, disk_label, network_label, ssh_ports_text, insecure_files_text, warning_log_text, info_log_text, processes_tree, mounts_tree, disk_io_tree, interfaces_tree, diagnostics_text, agents_tree, cgroups_tree, history_canvas):
     """
     Start monitoring system health indicators and SSH information, and update the GUI accordingly.
 
@@ -17,10 +44,23 @@ def start_monitoring(root, cpu_label, memory_label, disk_label, network_label, s
         insecure_files_text (tk.Text): Text widget to display insecure file information.
         warning_log_text (tk.Text): Text widget to display warning log content.
         info_log_text (tk.Text): Text widget to display info log content.
+        processes_tree (ttk.Treeview): Table to display the top processes.
+        mounts_tree (ttk.Treeview): Table to display the usage per mountpoint.
+        disk_io_tree (ttk.Treeview): Table to display the throughput per disk.
+        interfaces_tree (ttk.Treeview): Table to display the traffic per network interface.
+        diagnostics_text (tk.Text): Text widget to display the internal statistics.
+        agents_tree (ttk.Treeview): Table to display the remote agents.
+        cgroups_tree (ttk.Treeview): Table to display the usage per cgroup.
+        history_canvas (tk.Canvas): Canvas to chart the recent health samples.
 
-    This function sets up the paths for the log files, schedules periodic updates for the log content,
-    and starts background threads to monitor system health and SSH information.
+    This function initializes the monitoring state, sets up the paths for the log files, starts the
+    periodic refresh of the log content, and starts the collector runtime, which monitors system health and SSH information on background
+    sampler threads and passes the results to the GUI thread through a queue.
     """
+    from gui import GuiReporter, update_log_content, update_diagnostics
+
+    monitor.start()
+
     # Define the log file paths within the src directory
     log_dir = os.path.dirname(__file__)
     warning_log_file = os.path.join(log_dir, 'network_monitor_warnings.log')
@@ -29,15 +69,129 @@ def start_monitoring(root, cpu_label, memory_label, disk_label, network_label, s
     print(f"Reading from warning log file: {warning_log_file}")  # Debug print statement
     print(f"Reading from info log file: {info_log_file}")  # Debug print statement
 
-    # Update logs more frequently (e.g., every 2 seconds)
-    root.after(2000, update_log_content, warning_log_text, warning_log_file)
-    root.after(2000, update_log_content, info_log_text, info_log_file)
+    # Tail the logs right away and then every 2 seconds, update_log_content reschedules itself
+    root.after(0, update_log_content, warning_log_text, warning_log_file)
+    root.after(0, update_log_content, info_log_text, info_log_file)
+    root.after(0, update_diagnostics, diagnostics_text)
 
-    # Start the health monitoring and SSH info update in background threads
-    threading.Thread(target=update_health_indicators, args=(root, cpu_label, memory_label, disk_label, network_label)).start()
-    threading.Thread(target=update_ssh_info, args=(root, ssh_ports_text, insecure_files_text)).start()
+    # Start the health monitoring and SSH info update on background sampler threads
+    runtime = CollectorRuntime(root)
+    reporter = GuiReporter(runtime, cpu_label, memory_label, disk_label, network_label, ssh_ports_text, insecure_files_text, processes_tree, mounts_tree, disk_io_tree, interfaces_tree, agents_tree, cgroups_tree, history_canvas)
+    add_collectors(runtime, reporter)
+    runtime.start()
+    monitor.start_aggregator(reporter)
 
-if __name__ == "__main__":
-    root, cpu_label, memory_label, disk_label, network_label, ssh_ports_text, insecure_files_text, warning_log_text, info_log_text = create_gui()
-    root.after(3000, start_monitoring, root, cpu_label, memory_label, disk_label, network_label, ssh_ports_text, insecure_files_text, warning_log_text, info_log_text)  # Pass the widgets to start_monitoring
+def enable_stats_dump():
+    """
+    Print the internal statistics when the tool exits and, on POSIX systems, on SIGUSR1.
+
+    Used with `--stats`, e.g. `kill -USR1 <pid>` shows which part of the monitoring loop is
+    slow on a host without opening the Diagnostics tab.
+
+    Returns:
+        None
+    """
+    import atexit
+    import signal
+
+    atexit.register(lambda: print(stats.format_stats()))
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: print(stats.format_stats(), flush=True))
+
+def run_headless():
+    """
+    Run the collectors, logging and alerting without a GUI.
+
+    Nothing from tkinter is imported in this mode. The process runs until it is interrupted
+    or receives SIGTERM.
+    """
+    import signal
+
+    monitor.start()
+
+    runtime = CollectorRuntime()
+    reporter = Reporter()
+    add_collectors(runtime, reporter)
+    runtime.start()
+    monitor.start_aggregator(reporter)
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: runtime.stop())
+    print("Monitoring in headless mode, press Ctrl+C to stop.")
+    try:
+        runtime.wait()
+    except KeyboardInterrupt:
+        runtime.stop()
+
+def run_agent():
+    """
+    Run the collectors without a GUI and stream the results to an aggregator (`--agent`).
+
+    Health samples and the changes of the open ports and insecure files are sent in batches
+    every `--agent_batch` seconds; local logging and alerting keep working as in headless mode.
+    The process runs until it is interrupted or receives SIGTERM.
+    """
+    import signal
+    from agent import AgentClient, AgentReporter, default_agent_name
+
+    monitor.start()
+
+    host, port = config.args.agent
+    client = AgentClient((host, port), config.args.agent_name or default_agent_name(), config.args.agent_batch)
+    client.start()
+
+    runtime = CollectorRuntime()
+    reporter = AgentReporter(client)
+    add_collectors(runtime, reporter)
+    runtime.start()
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: runtime.stop())
+    print(f"Sending to aggregator {host}:{port} as {client.name}, press Ctrl+C to stop.")
+    try:
+        runtime.wait()
+    except KeyboardInterrupt:
+        runtime.stop()
+    client.stop()
+
+def run_replay():
+    """
+    Replay a recording (`--replay`) through the threshold, logging and alert code and print
+    how fast it went and which alerts it raised.
+    """
+    from datetime import datetime
+    from replay import replay
+
+    result = replay(config.args.replay, Reporter(), config.args.replay_speed, not config.args.replay_quiet)
+
+    seconds = result["seconds"]
+    print(f"Replayed {result['records']} records ({result['samples']} health samples, "
+          f"{result['recorded_seconds']:.0f} recorded seconds) in {seconds:.2f} s, "
+          f"{result['samples'] / seconds if seconds else 0:.0f} samples/s.")
+    print(f"{len(result['alerts'])} alerts were raised.")
+    if config.args.replay_alerts:
+        with open(config.args.replay_alerts, "w") as f:
+            for timestamp, subject, _ in result["alerts"]:
+                f.write(f"{datetime.fromtimestamp(timestamp).isoformat(sep=' ', timespec='seconds')}\t{subject}\n")
+        print(f"Wrote the alerts to {config.args.replay_alerts}")
+
+def run_gui():
+    """
+    Create the GUI and start monitoring as soon as the main loop runs.
+    """
+    from gui import create_gui, start_gui
+
+    root, cpu_label, memory_label, disk_label, network_label, ssh_ports_text, insecure_files_text, warning_log_text, info_log_text, processes_tree, mounts_tree, disk_io_tree, interfaces_tree, diagnostics_text, agents_tree, cgroups_tree, history_canvas = create_gui()
+    root.after(0, start_monitoring, root, cpu_label, memory_label, disk_label, network_label, ssh_ports_text, insecure_files_text, warning_log_text, info_log_text, processes_tree, mounts_tree, disk_io_tree, interfaces_tree, diagnostics_text, agents_tree, cgroups_tree, history_canvas)  # Pass the widgets to start_monitoring
     start_gui(root)
+
+if __name__ == "__main__":
+    config.load_config()
+    if config.args.stats:
+        enable_stats_dump()
+    if config.args.replay:
+        run_replay()
+    elif config.args.agent:
+        run_agent()
+    elif config.args.headless:
+        run_headless()
+    else:
+        run_gui()
@@ -1,32 +1,115 @@
 import subprocess
 import os
-import stat
 import platform
-import ctypes
 import time
+import threading
+import queue
+import atexit
 import logging
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from datetime import datetime, timedelta
-from config import args
-from gui import update_labels, update_ssh_texts
+import config
+import stats
+from collector import tick_time
+from history import MetricHistory
+from alerts import AlertDispatcher, AlertAggregator, SmtpSink, WebhookSink
+from ports import get_listening_sockets, format_sockets, format_socket, diff_snapshots, socket_key
+from scanner import InsecureFileScanner
+from processes import ProcessSampler, format_top_processes
+from disks import DiskSampler
+from cgroups import CgroupSampler, checked, is_cgroup2
+from network import InterfaceSampler
+from aggregator import AgentHandler
+from protocol import PORTS, FILES
+from rules import Condition, Rule, format_condition
+from collections import namedtuple
 import psutil
 
 
-# Initialize previous network counters
-prev_net_sent = psutil.net_io_counters().bytes_sent
-prev_net_recv = psutil.net_io_counters().bytes_recv
+# Traffic sampler of the network interfaces, created by start()
+interface_sampler = None
 
-# Initialize logging and email settings
-last_email_time = datetime.min
-email_cooldown = timedelta(minutes=5)
+# In-memory history of the health metrics, created by start()
+metric_history = None
+
+# Optional SQLite metric store, enabled with --db_path
+metric_store = None
+
+# Background alert dispatcher and per-type alert aggregation, created on the first alert
+alert_dispatcher = None
+alert_aggregator = None
+
+# Incremental insecure-file scanner and optional inotify watcher, created on the first SSH info update
+insecure_scanner = None
+insecure_watcher = None
+
+# Serializes the scans of the sampler thread and the rechecks of the watcher thread, which
+# both update the index of insecure_scanner
+insecure_scan_lock = threading.Lock()
+
+# Per-process sampler with the current top processes, created by start() unless --top_processes is 0
+process_sampler = None
+
+# Usage and throughput sampler of all mounted filesystems and disks, created by start()
+disk_sampler = None
+
+# Sampler of the cgroups (containers, services), created by start() on cgroup v2 hosts
+cgroup_sampler = None
+
+# Alert rules of the health and agent metrics, created by start()
+rule_engine = None
+
+# Anomaly detection of the health and agent metrics, created by start() with --anomaly
+anomaly_engine = None
+
+# Series whose latest evaluated samples were anomalous, see check_anomalies
+anomalous_series = set()
+
+# Latest metrics served to Prometheus, created by start() with --metrics_port
+metrics_snapshot = None
+metrics_exporter = None
+
+# Recorder of the collected samples and changes, created by start() with --record
+recorder = None
+
+# Aggregator receiving the data of remote agents, created by start_aggregator() with --aggregate
+aggregator = None
+
+# Latest state of one remote agent, as shown in the Agents tab; `alerting` holds the metrics
+# with an active rule
+AgentStatus = namedtuple("AgentStatus", ["name", "address", "connected", "last_seen", "cpu", "memory", "disk",
+                                         "net_sent", "net_recv", "open_ports", "insecure_files", "alerting"])
+
+# Process ranking added to the warnings of a local metric, see `with_top_processes`
+METRIC_RANKINGS = {"cpu": "cpu", "memory": "rss", "net_sent": "io", "net_recv": "io"}
+
+# Previous snapshot of the open ports, to detect opened and closed ports
+prev_open_ports = None
+prev_open_ports_text = None
 
 # Setup logging
 warning_logger = logging.getLogger('warning_logger')
 network_logger = logging.getLogger('network_logger')
 
-def setup_logger(name, log_file, level=logging.INFO):
+# Log files within the src directory, created by start()
+log_dir = os.path.dirname(__file__)
+warning_log_path = os.path.join(log_dir, 'network_monitor_warnings.log')
+info_log_path = os.path.join(log_dir, 'network_monitor.log')
+
+# Log files of a replay, created by start_replay()
+replay_warning_log_path = os.path.join(log_dir, 'replay_warnings.log')
+replay_info_log_path = os.path.join(log_dir, 'replay.log')
+
+class BufferedFileHandler(logging.FileHandler):
+    """
+    File handler that does not flush after every record.
+
+    The lines are written when the stream buffer is full and when the handler is closed at
+    exit. Used by replays, where flushing every line would be most of the time spent.
+    """
+
+    def flush(self):
+        pass
+
+def setup_logger(name, log_file, level=logging.INFO, handler_class=logging.FileHandler):
     """
     Sets up a logger with the specified name, log file, and logging level.
 
@@ -34,11 +117,12 @@ def setup_logger(name, log_file, level=logging.INFO):
         name (str): The name of the logger.
         log_file (str): The file path where the log messages will be written.
         level (int, optional): The logging level (e.g., logging.INFO, logging.DEBUG). Defaults to logging.INFO.
+        handler_class (type, optional): The file handler class. Defaults to logging.FileHandler.
 
     Returns:
         logging.Logger: The configured logger instance.
     """
-    handler = logging.FileHandler(log_file)
+    handler = handler_class(log_file)
     handler.setLevel(level)
     handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
     logger = logging.getLogger(name)
@@ -47,17 +131,210 @@ def setup_logger(name, log_file, level=logging.INFO):
     print(f"Logger {name} is set up to write to {log_file}.")  # Debug print statement
     return logger
 
-# Initialize loggers with paths within the src directory
-log_dir = os.path.dirname(__file__)
-warning_log_path = os.path.join(log_dir, 'network_monitor_warnings.log')
-info_log_path = os.path.join(log_dir, 'network_monitor.log')
+def start():
+    """
+    Initializes the monitoring state: log files, counters, metric history and storage.
+
+    Importing this module has no side effects; this function must be called once, after
+    `config.load_config()`, before the collectors run. Calling it again does nothing.
+
+    Returns:
+        None
+    """
+    global interface_sampler, metric_history, metric_store, process_sampler, disk_sampler, cgroup_sampler, metrics_snapshot, metrics_exporter, recorder, rule_engine, anomaly_engine
+    if metric_history is not None:
+        return
+    args = config.args
 
-setup_logger('warning_logger', warning_log_path, logging.WARNING)
-setup_logger('network_logger', info_log_path, logging.INFO)
+    setup_logger('warning_logger', warning_log_path, logging.WARNING)
+    setup_logger('network_logger', info_log_path, logging.INFO)
+
+    interface_sampler = InterfaceSampler(args.exclude_interfaces)
+    interface_sampler.sample()
+
+    # Start the CPU usage measurement, later calls report the usage since the previous call
+    psutil.cpu_percent(interval=None)
+
+    metric_history = MetricHistory(args.history_size)
+
+    if args.top_processes > 0:
+        process_sampler = ProcessSampler(args.top_processes)
+
+    disk_sampler = DiskSampler()
+
+    if is_cgroup2(args.cgroup_root):
+        cgroup_sampler = CgroupSampler(args.cgroup_root, args.cgroup_depth)
+    else:
+        print(f"No cgroup v2 hierarchy at {args.cgroup_root}, cgroups are not monitored.")
+
+    rule_engine = create_rule_engine()
+    anomaly_engine = create_anomaly_engine()
+
+    if args.metrics_port is not None:
+        from exporter import MetricsSnapshot, MetricsExporter
+        metrics_snapshot = MetricsSnapshot()
+        metrics_exporter = MetricsExporter(metrics_snapshot, args.metrics_host, args.metrics_port)
+        try:
+            metrics_exporter.start()
+            print(f"Serving metrics at http://{args.metrics_host}:{metrics_exporter.port}/metrics")
+        except OSError as e:
+            print(f"Cannot start the metrics exporter on {args.metrics_host}:{args.metrics_port}: {e}")
+            metrics_snapshot = metrics_exporter = None
+
+    if args.db_path:
+        from storage import MetricStore
+        metric_store = MetricStore(args.db_path, retention={
+            "samples": args.retention_raw * 3600,
+            "rollup_1m": args.retention_1m * 86400,
+            "rollup_1h": args.retention_1h * 86400,
+        })
+        atexit.register(metric_store.close)
+
+    if args.record:
+        from recording import Recorder
+        recorder = Recorder(args.record)
+        atexit.register(recorder.close)
+        print(f"Recording the collected samples to {args.record}")
+
+def start_replay(clock, send, write_logs=True):
+    """
+    Initializes the monitoring state for replaying a recording instead of measuring.
+
+    Nothing is measured, stored or served. The warnings and network logs are written to
+    replay_warnings.log and replay.log, timestamped with the replay clock and buffered, and alerts are
+    aggregated on the replay clock and passed to `send` right away instead of the alert
+    dispatcher, so a replay raises the same alerts however fast it runs.
+
+    Args:
+        clock (callable): Returns the time of the record being replayed.
+        send (callable): Called with (subject, body) for every alert and digest.
+        write_logs (bool, optional): Whether to write the replay logs; without them, the
+            replay only measures the threshold and alert code. Defaults to True.
+
+    Returns:
+        None
+    """
+    global metric_history, alert_aggregator, rule_engine, anomaly_engine
+    if not write_logs:
+        warning_logger.disabled = network_logger.disabled = True
+
+    def replay_time(record):
+        record.created = clock()
+        record.msecs = record.created % 1 * 1000
+        return True
+
+    for name, path, level in (('warning_logger', replay_warning_log_path, logging.WARNING),
+                              ('network_logger', replay_info_log_path, logging.INFO)) if write_logs else ():
+        for handler in setup_logger(name, path, level, BufferedFileHandler).handlers:
+            handler.addFilter(replay_time)
+
+    metric_history = MetricHistory(config.args.history_size)
+    alert_aggregator = AlertAggregator(send, window=config.args.alert_window * 60, clock=clock)
+    rule_engine = create_rule_engine()
+    anomaly_engine = create_anomaly_engine()
+
+
+def default_rules():
+    """
+    Builds the rules used without --rules from the --cpu, --memory, --disk and --network
+    thresholds.
+
+    They fire on the first sample above a threshold and clear on the first one below it. The
+    disk usage of this host is checked per filesystem by `update_disks` instead, so only the
+    agents get a disk rule.
+
+    Returns:
+        list of Rule: The rules, for this host and for every agent ("*:METRIC").
+    """
+    args = config.args
+    thresholds = (
+        ("CPU Usage Warning", "cpu", args.cpu),
+        ("Memory Usage Warning", "memory", args.memory),
+        ("Network Monitor Warning", "net_sent", args.network),
+        ("Network Monitor Warning", "net_recv", args.network),
+    )
+    rules = []
+    for name, metric, threshold in thresholds:
+        rules.append(Rule(name, metric, Condition(">", threshold, 0.0, 1.0), None))
+        rules.append(Rule(name, f"*:{metric}", Condition(">", threshold, 0.0, 1.0), None))
+    rules.append(Rule("Disk Usage Warning", "*:disk", Condition(">", config.disk_threshold("/"), 0.0, 1.0), None))
+    return rules
+
+def create_rule_engine():
+    """
+    Creates the rules engine with the rules of the --rules file, or the default rules.
+
+    Returns:
+        RuleEngine: The engine.
+
+    Raises:
+        SystemExit: If the rules file cannot be read or has an invalid rule.
+    """
+    from rules import RuleEngine, load_rules
+    if not config.args.rules:
+        return RuleEngine(default_rules())
+    try:
+        rules = load_rules(config.args.rules)
+    except (OSError, ValueError) as e:
+        print(f"Cannot load the rules: {e}")
+        raise SystemExit(1)
+    print(f"Loaded {len(rules)} rules from {config.args.rules}")
+    return RuleEngine(rules)
+
+def create_anomaly_engine():
+    """
+    Creates the anomaly engine configured by the --anomaly options.
+
+    Returns:
+        AnomalyEngine: The engine, or None if --anomaly is not set.
+    """
+    args = config.args
+    if args.anomaly is None:
+        return None
+    from anomaly import AnomalyEngine, DETECTORS
+    engine = AnomalyEngine(args.anomaly or DETECTORS, threshold=args.anomaly_threshold, window=args.anomaly_window,
+                           halflife=args.anomaly_halflife)
+    print(f"Anomaly detection: {', '.join(engine.detectors)} ({'NumPy' if engine.np is not None else 'pure Python'})")
+    return engine
+
+def publish_metrics(**values):
+    """
+    Publishes metric values to the Prometheus exporter, if it is enabled.
+
+    Args:
+        **values: Value per metric name, see `exporter.MetricsSnapshot.update`.
+
+    Returns:
+        None
+    """
+    if metrics_snapshot is not None:
+        metrics_snapshot.update(**values)
+
+def get_alert_dispatcher():
+    """
+    Returns the alert dispatcher, creating and starting it on first use.
+
+    Alerts always go to the configured SMTP server, and also to `--webhook_url` if set.
+
+    Returns:
+        AlertDispatcher: The running alert dispatcher.
+    """
+    global alert_dispatcher
+    if alert_dispatcher is None:
+        sinks = [SmtpSink(config.args.smtp_server, config.args.smtp_port, config.args.email_from, config.args.email_to,
+                          config.args.smtp_username, config.args.smtp_password, starttls=config.args.smtp_starttls)]
+        if config.args.webhook_url:
+            sinks.append(WebhookSink(config.args.webhook_url))
+        alert_dispatcher = AlertDispatcher(sinks)
+        alert_dispatcher.start()
+    return alert_dispatcher
 
 def send_email(subject, body):
     """
-    Sends an email with the specified subject and body, respecting a cooldown period between emails.
+    Queues an email with the specified subject and body.
+
+    The email is delivered by the background alert dispatcher, so this never waits for the
+    mail server. Alerts should go through `raise_alert`, which limits how often they are sent.
 
     Args:
         subject (str): The subject of the email.
@@ -66,38 +343,54 @@ def send_email(subject, body):
     Returns:
         None
     """
-    global last_email_time
-    current_time = datetime.now()
-    if current_time - last_email_time < email_cooldown:
-        print("Email not sent due to cooldown period.")
-        return
+    get_alert_dispatcher().submit(subject, body)
 
-    msg = MIMEMultipart()
-    msg['From'] = args.email_from
-    msg['To'] = args.email_to
-    msg['Subject'] = subject
-    msg.attach(MIMEText(body, 'plain'))
+def raise_alert(alert_type, message, value=None):
+    """
+    Raises an alert, coalescing repeated alerts of the same type into digests.
 
-    try:
-        with smtplib.SMTP(args.smtp_server, args.smtp_port) as server:
-            server.starttls()
-            server.login(args.smtp_username, args.smtp_password)
-            server.sendmail(args.email_from, args.email_to, msg.as_string())
-            last_email_time = current_time
-            print("Warning email sent successfully.")
-    except Exception as e:
-        print(f"Failed to send email: {e}")
+    The first alert of a type is emailed right away. Alerts of the same type during the next
+    `--alert_window` minutes are summarized (count, first and last seen, peak value) and sent
+    as one digest when the window ends.
+
+    Args:
+        alert_type (str): Alert type, used as the email subject.
+        message (str): Description of the alert.
+        value (float, optional): Measured value, whose peak is reported in digests. Defaults to None.
+
+    Returns:
+        None
+    """
+    global alert_aggregator
+    if alert_aggregator is None:
+        alert_aggregator = AlertAggregator(send_email, window=config.args.alert_window * 60)
+    alert_aggregator.add(alert_type, message, value)
+
+def flush_alerts():
+    """
+    Sends the digests of alert windows that have ended.
+
+    Returns:
+        None
+    """
+    if alert_aggregator is not None:
+        alert_aggregator.flush()
 
 def get_open_ports():
     """
     Retrieves a list of open ports on the system.
 
-    On Windows, it uses the `netstat` command to get the list of open ports.
-    On Unix-like systems, it uses the `ss` command.
+    On Linux, the listening sockets are read directly from the /proc/net socket tables.
+    Elsewhere, or if the tables cannot be read, it falls back to the `netstat` command on
+    Windows and the `ss` command on other Unix-like systems.
 
     Returns:
         str: A string containing the list of open ports or an error message if the command fails.
     """
+    sockets = get_listening_sockets()
+    if sockets is not None:
+        return format_sockets(sockets)
+
     try:
         if platform.system() == "Windows":
             result = subprocess.check_output(["netstat", "-an"], text=True)
@@ -107,129 +400,628 @@ def get_open_ports():
     except Exception as e:
         return f"Error retrieving open ports: {e}"
 
-def is_world_readable(filepath):
-    """Check if a file is world-readable on Unix-like systems."""
-    mode = os.stat(filepath).st_mode
-    return mode & stat.S_IROTH
+def update_health_indicators(reporter):
+    """
+    Updates the health indicators for CPU, memory, disk, and network usage.
 
-def check_windows_permissions(filepath):
-    """Check if a file is readable by everyone on Windows using ctypes."""
-    try:
-        sd = ctypes.windll.advapi32.GetFileSecurityW(
-            ctypes.c_wchar_p(filepath),
-            7,  # DACL_SECURITY_INFORMATION
-            None,
-            0,
-            ctypes.byref(ctypes.c_ulong(0)),
+    It runs on a sampler thread of the collector runtime every second and passes the results
+    to the reporter, so slow collection never blocks the window. The samples are checked against
+    the rules (`check_rules`); a rule that fires is logged as a warning and raised as an alert,
+    together with the processes using the most of that resource. The network usage is the
+    total of the interfaces that are not excluded with `--exclude_interfaces`; interfaces with
+    their own threshold in `--interface_thresholds` are also checked on their own.
+
+    Args:
+        reporter (Reporter): Receives the results, e.g. a `gui.GuiReporter`.
+
+    Returns:
+        None
+    """
+    start_time = time.time()
+    timestamp = tick_time()
+
+    # CPU usage since the previous sample, without blocking. start() primes the counters just
+    # before the first sample, so that one is measured over a short interval instead.
+    cpu_usage = psutil.cpu_percent(interval=None if len(metric_history) else 0.1)
+    memory_info = psutil.virtual_memory()
+    disk_info = psutil.disk_usage("/")
+    interfaces = interface_sampler.sample()
+
+    # Network usage of all interfaces that are not excluded, in MB/s
+    sent_per_sec = sum(interface.sent for interface in interfaces) / (1024 * 1024)
+    recv_per_sec = sum(interface.recv for interface in interfaces) / (1024 * 1024)
+
+    if recorder is not None:
+        recorder.health(timestamp, cpu_usage, memory_info.percent, disk_info.percent, sent_per_sec, recv_per_sec, interfaces)
+    check_health(reporter, timestamp, cpu_usage, memory_info.percent, disk_info.percent, sent_per_sec, recv_per_sec, interfaces)
+
+    # Check if execution time is too slow
+    execution_time = time.time() - start_time
+    if execution_time > 2:  # 2 seconds
+        warning_message = f"Script execution is too slow! Execution time: {execution_time:.2f} seconds"
+        warning_logger.warning(warning_message)
+        raise_alert("Performance Warning", warning_message, execution_time)
+
+def check_health(reporter, timestamp, cpu_usage, memory_usage, disk_usage, sent_per_sec, recv_per_sec, interfaces):
+    """
+    Stores, reports and logs one health sample and checks it against the rules and thresholds.
+
+    `update_health_indicators` calls it with the measured values and the replay with
+    recorded ones, so both go through the same threshold, logging and alert code.
+
+    Args:
+        reporter (Reporter): Receives the results, e.g. a `gui.GuiReporter`.
+        timestamp (float): Time of the sample, in seconds since the epoch.
+        cpu_usage (float): CPU usage (%).
+        memory_usage (float): Memory usage (%).
+        disk_usage (float): Disk usage of the root filesystem (%).
+        sent_per_sec (float): Sent over all monitored interfaces (MB/s).
+        recv_per_sec (float): Received over all monitored interfaces (MB/s).
+        interfaces (list of InterfaceRate): Traffic per interface (bytes/s).
+
+    Returns:
+        None
+    """
+    sample = {"cpu": cpu_usage, "memory": memory_usage, "disk": disk_usage,
+              "net_sent": sent_per_sec, "net_recv": recv_per_sec}
+    metric_history.append(timestamp, **sample)
+    if metric_store is not None:
+        metric_store.add(timestamp, sample)
+
+    alerting = check_rules(timestamp, sample)
+
+    # Report the results for display
+    reporter.show_health(cpu_usage, memory_usage, disk_usage, sent_per_sec, recv_per_sec, alerting)
+    reporter.show_history(metric_history)
+    reporter.show_interfaces(interfaces)
+    if metrics_snapshot is not None:
+        publish_metrics(
+            cpu_usage_percent=cpu_usage,
+            memory_usage_percent=memory_usage,
+            disk_usage_percent=disk_usage,
+            network_sent_bytes_per_second=sum(interface.sent for interface in interfaces),
+            network_received_bytes_per_second=sum(interface.recv for interface in interfaces),
+            network_interface_sent_bytes_per_second={interface.name: interface.sent for interface in interfaces},
+            network_interface_received_bytes_per_second={interface.name: interface.recv for interface in interfaces},
         )
-        return sd == 0
-    except Exception:
-        return False
 
-def check_insecure_files(directories):
+    # Log network usage
+    network_logger.info("Sent: %.2f MB/s, Recv: %.2f MB/s", sent_per_sec, recv_per_sec)
+
+    for interface in interfaces:
+        threshold = config.interface_threshold(interface.name)
+        if threshold is None:
+            continue
+        sent, recv = interface.sent / (1024 * 1024), interface.recv / (1024 * 1024)
+        check_threshold(f"Network Monitor Warning ({interface.name})", f"interface {interface.name}", timestamp,
+                        max(sent, recv), threshold,
+                        f"High network usage detected on {interface.name}! "
+                        f"Sent: {sent:.2f} MB/s, Recv: {recv:.2f} MB/s, threshold: {threshold:g} MB/s")
+
+    if anomaly_engine is not None:
+        for name, value in sample.items():
+            anomaly_engine.observe(name, value)
+        check_anomalies(timestamp)
+
+    # Send digests of alerts that were held back
+    flush_alerts()
+
+def check_rules(timestamp, values, agent=None):
     """
-    Checks for insecure files in the given directories.
+    Passes a sample to the rules engine, and logs and alerts the rules that fire or clear.
 
-    On Windows, it checks if the files have insecure permissions using `check_windows_permissions`.
-    On Unix-like systems, it checks if the files are world-readable using `is_world_readable`.
+    A rule that fires logs a warning and raises an alert once; it is logged again when it
+    clears, so a sustained condition no longer logs and alerts on every sample.
 
     Args:
-        directories (list): A list of directory paths to check for insecure files.
+        timestamp (float): Time of the sample, in seconds since the epoch.
+        values (dict): Value per metric, e.g. {"cpu": 12.5, ...}.
+        agent (str, optional): Name of the agent that took the sample; its series are named
+            "AGENT:METRIC". Defaults to this host.
 
     Returns:
-        list: A list of file paths that are considered insecure.
+        set of str: The metrics with an active rule, e.g. to show them in red.
     """
-    insecure_files = []
-    is_windows = platform.system() == "Windows"
+    prefix = "" if agent is None else f"{agent}:"
+    alerting = set()
+    for metric, value in values.items():
+        series = prefix + metric
+        for event in rule_engine.observe(series, timestamp, value):
+            rule = event.rule
+            alert_type = rule.name if series == rule.metric else f"{rule.name} ({series})"
+            if event.active:
+                warning_message = f"{rule.name}: {series} {format_condition(rule.condition)}! Value: {value:.2f}"
+                if agent is None and metric in METRIC_RANKINGS:
+                    warning_message = with_top_processes(warning_message, METRIC_RANKINGS[metric])
+                warning_logger.warning(warning_message)
+                raise_alert(alert_type, warning_message, value)
+            else:
+                warning_logger.warning(f"{rule.name}: {series} cleared. Value: {value:.2f}")
+        if rule_engine.active(series):
+            alerting.add(metric)
+    return alerting
+
+def check_threshold(alert_type, series, timestamp, value, threshold, warning_message):
+    """
+    Checks a value against a threshold of its own, e.g. of a mountpoint, through the rules engine.
+
+    The threshold is evaluated as a generated rule "`alert_type`: `series` > `threshold`", so
+    like the default rules it logs and alerts once when the value crosses the threshold, and
+    logs again when the value drops back below it.
+
+    Args:
+        alert_type (str): Name of the rule and type of its alert, e.g. "Disk Usage Warning (/data)".
+        series (str): Name of the checked series, e.g. "mount /data".
+        timestamp (float): Time of the value, in seconds since the epoch.
+        value (float): The value.
+        threshold (float): The threshold.
+        warning_message (str): Logged and sent when the rule fires.
 
-    for directory in directories:
-        for root, dirs, files in os.walk(directory):
-            for name in files:
-                full_path = os.path.join(root, name)
-                try:
-                    if is_windows:
-                        if check_windows_permissions(full_path):
-                            insecure_files.append(full_path)
-                    else:
-                        if is_world_readable(full_path):
-                            insecure_files.append(full_path)
-                except (OSError, PermissionError) as e:
-                    print(f"Error checking permissions for {full_path}: {e}")
-    return insecure_files
+    Returns:
+        None
+    """
+    rule = Rule(alert_type, series, Condition(">", threshold, 0.0, 1.0), None)
+    event = rule_engine.observe_rule(rule, series, timestamp, value)
+    if event is None:
+        return
+    if event.active:
+        warning_logger.warning(warning_message)
+        raise_alert(alert_type, warning_message, value)
+    else:
+        warning_logger.warning(f"{alert_type}: {series} cleared. Value: {value:.2f}")
 
-def update_health_indicators(root, cpu_label, memory_label, disk_label, network_label):
+def check_anomalies(timestamp):
     """
-    Updates the health indicators for CPU, memory, disk, and network usage.
+    Evaluates the samples observed by the anomaly engine since the last call, and logs and
+    alerts the series that become anomalous.
+
+    The samples of this host and of the agents are evaluated together, once per health
+    sample, so the engine updates all series in one batch. Like the rules, only changes are
+    logged: a series logs a warning and raises an alert, listing every detector that found
+    its value anomalous, when its samples become anomalous, and logs again when a batch of
+    its samples has no anomaly. Repeated alerts of a series that becomes anomalous again
+    and again are coalesced by the alert aggregation.
 
     Args:
-        root (tk.Tk): The root Tkinter window.
-        cpu_label (tk.Label): The label widget to display CPU usage.
-        memory_label (tk.Label): The label widget to display memory usage.
-        disk_label (tk.Label): The label widget to display disk usage.
-        network_label (tk.Label): The label widget to display network usage.
+        timestamp (float): Time of the samples, in seconds since the epoch.
 
     Returns:
         None
     """
-    global prev_net_sent, prev_net_recv
+    with stats.timed("anomaly.evaluate"):
+        anomalies = anomaly_engine.evaluate(timestamp)
+    by_series = {}
+    for anomaly in anomalies:
+        by_series.setdefault(anomaly.series, []).append(anomaly)
+    for series, found in by_series.items():
+        if series in anomalous_series:
+            continue
+        anomalous_series.add(series)
+        details = ", ".join(f"{a.detector} baseline {a.baseline:.2f}, z-score {a.score:.1f}" for a in found)
+        warning_message = f"Anomaly detected in {series}! Value: {found[0].value:.2f} ({details})"
+        warning_logger.warning(warning_message)
+        raise_alert(f"Anomaly Warning ({series})", warning_message, max(a.score for a in found))
+    for series in anomaly_engine.evaluated:
+        if series in anomalous_series and series not in by_series:
+            anomalous_series.discard(series)
+            warning_logger.warning(f"Anomaly in {series} ended.")
 
-    start_time = time.time()
+def with_top_processes(message, ranking):
+    """
+    Appends the current top processes of a ranking to a warning message.
 
-    # CPU Usage
-    cpu_usage = psutil.cpu_percent(interval=1)
-    memory_info = psutil.virtual_memory()
-    disk_info = psutil.disk_usage("/")
-    net_info = psutil.net_io_counters()
+    Args:
+        message (str): The warning message.
+        ranking (str): "cpu", "rss" or "io".
 
-    net_sent = net_info.bytes_sent
-    net_recv = net_info.bytes_recv
-    sent_per_sec = (net_sent - prev_net_sent) / (1024 * 1024)
-    recv_per_sec = (net_recv - prev_net_recv) / (1024 * 1024)
+    Returns:
+        str: The message, followed by the top processes if they are sampled.
+    """
+    if process_sampler is None:
+        return message
+    titles = {"cpu": "Top processes by CPU", "rss": "Top processes by memory (RSS)", "io": "Top processes by disk I/O"}
+    table = format_top_processes(getattr(process_sampler, f"top_{ranking}"), titles[ranking])
+    return f"{message}\n{table}" if table else message
 
-    prev_net_sent = net_sent
-    prev_net_recv = net_recv
+def update_top_processes(reporter):
+    """
+    Samples the processes and reports the top processes by CPU, memory and disk I/O.
 
-    # Schedule UI updates on the main thread
-    root.after(0, update_labels, cpu_label, memory_label, disk_label, network_label, cpu_usage, memory_info.percent, disk_info.percent, sent_per_sec, recv_per_sec)
+    It runs on a sampler thread of the collector runtime, every 5 seconds by default.
+    The latest top processes are also added to the CPU, memory and network warnings.
 
-    # Log network usage
-    network_logger.info(f"Sent: {sent_per_sec:.2f} MB/s, Recv: {recv_per_sec:.2f} MB/s")
+    Args:
+        reporter (Reporter): Receives the results, e.g. a `gui.GuiReporter`.
 
-    if sent_per_sec > args.network or recv_per_sec > args.network:
-        warning_message = f"High network usage detected! Sent: {sent_per_sec:.2f} MB/s, Recv: {recv_per_sec:.2f} MB/s"
-        warning_logger.warning(warning_message)
-        send_email("Network Monitor Warning", warning_message)
+    Returns:
+        None
+    """
+    if process_sampler is None:
+        return
+    process_sampler.sample()
+    reporter.show_top_processes(process_sampler.top())
 
-    # Check if execution time is too slow
-    execution_time = time.time() - start_time
-    if execution_time > 2:  # 2 seconds
-        warning_message = f"Script execution is too slow! Execution time: {execution_time:.2f} seconds"
-        warning_logger.warning(warning_message)
-        send_email("Performance Warning", warning_message)
+def update_disks(reporter):
+    """
+    Checks the usage of every mounted filesystem and measures the disk throughput.
+
+    Each mountpoint is compared with its own threshold (`--disk_thresholds`, or `--disk`);
+    a filesystem that goes above it is logged as a warning and raised as an alert once, one
+    alert type per mountpoint, and logged again when it drops back (see `check_threshold`).
+    It runs on a sampler thread of the collector runtime, every 10 seconds by
+    default.
+
+    Args:
+        reporter (Reporter): Receives the results, e.g. a `gui.GuiReporter`.
+
+    Returns:
+        None
+    """
+    mounts = disk_sampler.usage()
+    disk_io = disk_sampler.io_rates()
+    reporter.show_disks(mounts, disk_io)
+    publish_metrics(filesystem_usage_percent={mount.mountpoint: mount.percent for mount in mounts})
 
-    # Schedule next update
-    root.after(1000, update_health_indicators, root, cpu_label, memory_label, disk_label, network_label)
+    timestamp = tick_time()
+    for mount in mounts:
+        threshold = config.disk_threshold(mount.mountpoint)
+        check_threshold(f"Disk Usage Warning ({mount.mountpoint})", f"mount {mount.mountpoint}", timestamp,
+                        mount.percent, threshold,
+                        f"High disk usage detected on {mount.mountpoint} ({mount.device})! "
+                        f"Disk: {mount.percent:.1f}%, threshold: {threshold:g}%")
 
-def update_ssh_info(root, ssh_ports_text, insecure_files_text):
+def update_cgroups(reporter):
     """
-    Updates the SSH information displayed in the UI.
+    Measures the CPU, memory, I/O and pressure of every cgroup, e.g. of every container.
 
-    This function retrieves the list of open SSH ports and insecure files, then updates the corresponding
-    text widgets in the UI. It schedules itself to run every 60 seconds.
+    Each cgroup is compared with its thresholds (`--cgroup_thresholds`, and `--memory` for
+    cgroups with a memory limit); a metric that goes above its threshold is logged as a
+    warning and raised as an alert once, one alert type per cgroup and metric, and logged
+    again when it drops back (see `check_threshold`). It runs on a sampler thread of the collector
+    runtime, every 5 seconds by default. Nothing is done on hosts without cgroup v2.
 
     Args:
-        root (tk.Tk): The root Tkinter window.
-        ssh_ports_text (tk.Text): The text widget to display open SSH ports.
-        insecure_files_text (tk.Text): The text widget to display insecure files.
+        reporter (Reporter): Receives the results, e.g. a `gui.GuiReporter`.
 
     Returns:
         None
     """
-    open_ports = get_open_ports()
-    insecure_files = check_insecure_files(args.insecure_dirs)
+    if cgroup_sampler is None:
+        return
+    cgroups = cgroup_sampler.sample()
+    reporter.show_cgroups(cgroups)
+    publish_metrics(
+        cgroup_cpu_usage_percent={c.path: c.cpu for c in cgroups if c.cpu is not None},
+        cgroup_memory_usage_bytes={c.path: c.memory for c in cgroups if c.memory is not None},
+    )
+
+    timestamp = tick_time()
+    for usage in cgroups:
+        for metric, value, threshold in checked(usage, config.cgroup_threshold):
+            check_threshold(f"Cgroup {metric} Warning ({usage.path})", f"cgroup {usage.path} {metric}", timestamp,
+                            value, threshold,
+                            f"High {metric.replace('_', ' ')} detected in cgroup {usage.path}! "
+                            f"Value: {value:.1f}%, threshold: {threshold:g}%")
+
+def update_insecure_files(reporter):
+    """
+    Updates the insecure files information.
+
+    This function rescans the insecure directories with the incremental `InsecureFileScanner`
+    and passes the files that became insecure or stopped being insecure to the reporter.
+    It runs on a sampler thread of the collector runtime, every 60 seconds by default. With
+    `--watch`, the directories are only scanned once and the inotify watcher thread keeps the
+    insecure files up to date in between.
+
+    Args:
+        reporter (Reporter): Receives the results, e.g. a `gui.GuiReporter`.
+
+    Returns:
+        None
+    """
+    global insecure_scanner, insecure_watcher
+    with insecure_scan_lock:
+        first_update = insecure_scanner is None
+        if first_update:
+            insecure_scanner = InsecureFileScanner(config.args.insecure_dirs, workers=config.args.scan_workers)
+            if config.args.watch:
+                # The watcher thread waits for the lock, so it only rechecks after this scan
+                insecure_watcher = start_insecure_file_watch(reporter)
+            with stats.timed("scan.full"):
+                files_added, files_removed = insecure_scanner.scan()
+        elif insecure_watcher is None:
+            with stats.timed("scan.incremental"):
+                files_added, files_removed = insecure_scanner.scan()
+        else:
+            return
+
+        if recorder is not None and (files_added or files_removed or first_update):
+            recorder.files(tick_time(), files_added, files_removed, first_update)
+        report_insecure_file_changes(reporter, files_added, files_removed, len(insecure_scanner.insecure), first_update)
+
+def report_insecure_file_changes(reporter, files_added, files_removed, insecure_files, initial=False):
+    """
+    Reports the files that became insecure or are no longer insecure, if there are any.
+
+    Args:
+        reporter (Reporter): Receives the changes, e.g. a `gui.GuiReporter`.
+        files_added (list of str): Files that became insecure.
+        files_removed (list of str): Files that are no longer insecure.
+        insecure_files (int): Number of insecure files after the changes.
+        initial (bool, optional): Whether this is the result of the first scan, which is
+            reported even if it is empty. Defaults to False.
+
+    Returns:
+        None
+    """
+    if files_added or files_removed or initial:
+        reporter.show_insecure_file_changes(files_added, files_removed)
+        publish_metrics(insecure_files=insecure_files)
+
+def update_open_ports(reporter):
+    """
+    Updates the open ports information.
+
+    This function retrieves the list of open ports and compares it with the previous cycle:
+    opened and closed ports are logged as warnings, and only the lines that changed are passed
+    to the reporter. It runs on a sampler thread of the collector runtime, every 60 seconds by
+    default.
+
+    Args:
+        reporter (Reporter): Receives the results, e.g. a `gui.GuiReporter`.
+
+    Returns:
+        None
+    """
+    global prev_open_ports, prev_open_ports_text
+    sockets = get_listening_sockets()
+    if sockets is None:
+        # Only command output is available, so redraw the ports when it changes
+        open_ports = get_open_ports()
+        if open_ports != prev_open_ports_text:
+            reporter.show_ports_text(open_ports)
+        prev_open_ports_text = open_ports
+        return
+
+    initial = prev_open_ports is None
+    prev_open_ports, opened, closed = diff_snapshots(prev_open_ports, sockets, key=socket_key)
+    if recorder is not None and (opened or closed or initial):
+        recorder.ports(tick_time(), opened, closed, initial)
+    report_port_changes(reporter, opened, closed, len(prev_open_ports), initial)
+
+def report_port_changes(reporter, opened, closed, open_ports, initial=False):
+    """
+    Logs opened and closed ports and reports only what changed.
+
+    Args:
+        reporter (Reporter): Receives the changes, e.g. a `gui.GuiReporter`.
+        opened (list of Socket): Sockets that started listening since the previous cycle.
+        closed (list of Socket): Sockets that stopped listening since the previous cycle.
+        open_ports (int): Number of listening sockets after the changes.
+        initial (bool, optional): Whether `opened` is the first snapshot, which is reported
+            but not logged. Defaults to False.
+
+    Returns:
+        None
+    """
+    if not initial:
+        log_port_changes(opened, closed)
+    if opened or closed or initial:
+        reporter.show_port_changes([format_socket(sock) for sock in opened], [format_socket(sock) for sock in closed])
+        publish_metrics(open_ports=open_ports)
+
+def log_port_changes(opened, closed):
+    """
+    Log opened and closed ports to the warning log.
+
+    Args:
+        opened (list of Socket): Sockets that started listening since the previous cycle.
+        closed (list of Socket): Sockets that stopped listening since the previous cycle.
+
+    Returns:
+        None
+    """
+    for sock in opened:
+        warning_logger.warning(f"Port opened: {sock.proto} {sock.address}:{sock.port}")
+    for sock in closed:
+        warning_logger.warning(f"Port closed: {sock.proto} {sock.address}:{sock.port}")
+
+def start_insecure_file_watch(reporter):
+    """
+    Start watching the insecure directories with inotify in a background thread.
+
+    The watcher is created before the initial scan so that no change is missed in between.
+    If inotify is not available (e.g. on Windows), the periodic rescans are used instead.
+
+    Args:
+        reporter (Reporter): Receives the insecure file changes.
+
+    Returns:
+        InotifyWatcher: The started watcher, or None if watching is not possible.
+    """
+    try:
+        from watcher import InotifyWatcher
+        watcher = InotifyWatcher(config.args.insecure_dirs)
+    except (OSError, AttributeError) as e:
+        warning_logger.warning(f"Cannot watch insecure directories, falling back to periodic scans: {e}")
+        return None
+
+    threading.Thread(target=watch_insecure_files, args=(reporter, watcher), daemon=True).start()
+    return watcher
+
+def watch_insecure_files(reporter, watcher):
+    """
+    Recheck the paths reported by the inotify watcher and report the insecure file changes.
+
+    Only the touched paths are rechecked. When the kernel event queue overflows, events have
+    been lost, so the watches are refreshed and a full rescan is done instead. If the watcher
+    fails, it is closed and `update_insecure_files` goes back to periodic scans. The scanner
+    is only used under `insecure_scan_lock`, so the events that arrive during the initial
+    scan are rechecked after it.
+
+    Args:
+        reporter (Reporter): Receives the insecure file changes.
+        watcher (InotifyWatcher): The watcher created by `start_insecure_file_watch`.
+
+    Returns:
+        None
+    """
+    global insecure_watcher
+    try:
+        while True:
+            paths, overflow = watcher.read_events()
+            with insecure_scan_lock:
+                if overflow:
+                    warning_logger.warning("Insecure-file watcher lost events, running a full rescan.")
+                    stats.count("scan.watch_overflows")
+                    for directory in config.args.insecure_dirs:
+                        watcher.add_tree(directory)
+                    with stats.timed("scan.full"):
+                        added, removed = insecure_scanner.scan(full=True)
+                else:
+                    with stats.timed("scan.recheck"):
+                        added, removed = insecure_scanner.recheck(paths)
+
+                if recorder is not None and (added or removed):
+                    recorder.files(time.time(), added, removed)
+                report_insecure_file_changes(reporter, added, removed, len(insecure_scanner.insecure))
+    except OSError as e:
+        warning_logger.warning(f"Insecure-file watcher stopped, falling back to periodic scans: {e}")
+        insecure_watcher = None
+        watcher.close()
+
+def start_aggregator(reporter):
+    """
+    Start receiving samples and security changes from remote agents, if `--aggregate` is set.
+
+    Args:
+        reporter (Reporter): Receives the state of the agents for display.
+
+    Returns:
+        None
+    """
+    global aggregator
+    if config.args.aggregate is None or aggregator is not None:
+        return
+    from aggregator import Aggregator
+    host, port = config.args.aggregate
+    aggregator = Aggregator(host, port, MonitorAgentHandler(reporter), timeout=config.args.agent_timeout)
+    try:
+        aggregator.start()
+        print(f"Receiving agent data on {host or '*'}:{aggregator.port}")
+    except OSError as e:
+        print(f"Cannot start the aggregator on {host}:{port}: {e}")
+        aggregator = None
+
+class MonitorAgentHandler(AgentHandler):
+    """
+    Feeds the data of remote agents into the same store, logs, alerts and display as local data.
+
+    Samples are written to the metric store under "AGENT:METRIC" names (e.g. "web1:cpu") and
+    passed to the rules engine and the anomaly engine under the same names, in the order they
+    were taken. Opened and closed ports and insecure file changes are written to the warnings log;
+    the first state an agent sends, and the full state it resends when it reconnects, only log
+    what changed. An agent that disconnects raises an alert.
+
+    The handler runs on the aggregator's event loop, so it does not write to the metric store
+    itself: the samples go through a bounded queue to a writer thread, and are dropped when
+    the queue is full.
+
+    Args:
+        reporter (Reporter): Receives the state of every agent, see `Reporter.show_agent`.
+        queue_size (int, optional): Most sample batches waiting to be stored. Defaults to 1000.
+    """
+
+    def __init__(self, reporter, queue_size=1000):
+        self.reporter = reporter
+        self.store_queue = queue.Queue(maxsize=queue_size)
+        self._store_thread = None
+        self.agents = {}  # name -> AgentStatus
+        self.state = {}  # (name, kind) -> set of lines
+        self.partial = {}  # (name, kind) -> Delta received so far of a change that spans several frames
+
+    def agent_connected(self, name, address):
+        network_logger.info(f"Agent {name} connected from {address[0]}:{address[1]}")
+        status = self.agents.get(name) or AgentStatus(name, None, True, None, None, None, None, None, None, 0, 0, ())
+        self._show(status._replace(address=f"{address[0]}:{address[1]}", connected=True))
+
+    def agent_samples(self, name, samples):
+        if not samples:
+            return
+        if metric_store is not None:
+            self._store(name, samples)
+        if anomaly_engine is not None:
+            # Evaluated with the next local health sample, together with the other agents
+            for sample in samples:
+                for metric in ("cpu", "memory", "disk", "net_sent", "net_recv"):
+                    anomaly_engine.observe(f"{name}:{metric}", getattr(sample, metric))
+        # Every sample of the batch goes through the rules, so a short spike between two batches is not missed
+        for sample in samples:
+            alerting = check_rules(sample.timestamp, {metric: getattr(sample, metric) for metric in
+                                                      ("cpu", "memory", "disk", "net_sent", "net_recv")}, agent=name)
+        latest = samples[-1]
+        self._show(self.agents[name]._replace(last_seen=latest.timestamp, cpu=latest.cpu, memory=latest.memory,
+                                              disk=latest.disk, net_sent=latest.net_sent, net_recv=latest.net_recv,
+                                              alerting=tuple(sorted(alerting))))
+        flush_alerts()
+
+    def agent_delta(self, name, delta):
+        # Collect the frames of a long change and apply it once, when its last frame arrived
+        key = (name, delta.kind)
+        partial = self.partial.pop(key, None)
+        if partial is not None:
+            delta = delta._replace(added=partial.added + delta.added, removed=partial.removed + delta.removed)
+        if delta.more:
+            self.partial[key] = delta
+            return
+
+        initial = key not in self.state
+        lines = self.state.setdefault(key, set())
+        what = "Port" if delta.kind == PORTS else "Insecure file"
+        if delta.reset:
+            added, removed = set(delta.added) - lines, lines - set(delta.added)
+            lines.clear()
+        else:
+            added, removed = delta.added, delta.removed
+        lines.difference_update(delta.removed)
+        lines.update(delta.added)
+        if initial:
+            # The first state of an agent is not a change
+            added = removed = ()
+        for line in added:
+            warning_logger.warning(f"{what} {'opened' if delta.kind == PORTS else 'found'} on agent {name}: {line.strip()}")
+        for line in removed:
+            warning_logger.warning(f"{what} {'closed' if delta.kind == PORTS else 'fixed'} on agent {name}: {line.strip()}")
+        count = "open_ports" if delta.kind == PORTS else "insecure_files"
+        self._show(self.agents[name]._replace(**{count: len(lines)}))
+
+    def agent_disconnected(self, name):
+        warning_message = f"Agent {name} disconnected."
+        warning_logger.warning(warning_message)
+        raise_alert(f"Agent Disconnected ({name})", warning_message)
+        for kind in (PORTS, FILES):
+            self.partial.pop((name, kind), None)
+        self._show(self.agents[name]._replace(connected=False))
+
+    def _store(self, name, samples):
+        if self._store_thread is None:
+            self._store_thread = threading.Thread(target=self._write_samples, name="agent-store", daemon=True)
+            self._store_thread.start()
+            stats.register_gauge("aggregator.store_queue", self.store_queue.qsize)
+        try:
+            self.store_queue.put_nowait((name, samples))
+        except queue.Full:
+            stats.count("aggregator.store_dropped")
 
-    # Schedule UI updates on the main thread
-    root.after(0, update_ssh_texts, ssh_ports_text, insecure_files_text, open_ports, insecure_files)
+    def _write_samples(self):
+        # Writer thread: the SQLite transactions and rollups of the agent samples run here
+        while True:
+            name, samples = self.store_queue.get()
+            with stats.timed("aggregator.store"):
+                for sample in samples:
+                    metric_store.add(sample.timestamp, {f"{name}:{metric}": getattr(sample, metric)
+                                                        for metric in ("cpu", "memory", "disk", "net_sent", "net_recv")})
 
-    # Schedule next update every 60 seconds
-    root.after(60000, update_ssh_info, root, ssh_ports_text, insecure_files_text)
\ No newline at end of file
+    def _show(self, status):
+        self.agents[status.name] = status
+        self.reporter.show_agent(status)
@@ -0,0 +1,95 @@
+import time
+from collections import namedtuple
+from fnmatch import fnmatchcase
+
+import psutil
+
+# Traffic of one network interface in bytes per second
+InterfaceRate = namedtuple("InterfaceRate", ["name", "sent", "recv"])
+
+# Counters that wrap are 32 bits wide (e.g. on 32-bit kernels and some drivers)
+WRAP_32 = 2 ** 32
+
+
+def counter_delta(previous, current):
+    """
+    Return how much a byte counter grew, allowing for 32-bit wraps.
+
+    A counter that went backwards from the upper half of the 32-bit range is taken to have
+    wrapped around. Any other decrease means the counter was reset (e.g. the driver was
+    reloaded or the interface was recreated under the same name), and the growth since the
+    previous sample is unknown.
+
+    Args:
+        previous (int): Counter value at the previous sample.
+        current (int): Counter value now.
+
+    Returns:
+        int: The growth of the counter, or None if it was reset.
+    """
+    if current >= previous:
+        return current - previous
+    if WRAP_32 // 2 <= previous < WRAP_32:
+        return current + WRAP_32 - previous
+    return None
+
+
+class InterfaceSampler:
+    """
+    Measures the traffic of every network interface.
+
+    Rates are divided by the real time between two samples, measured with a monotonic clock,
+    so a late sample does not show up as a spike. Interfaces that appear are reported from
+    their second sample on, interfaces that disappear are forgotten, and a counter that was
+    reset is reported as idle for one sample instead of as a negative or huge rate. The raw
+    counters are read with psutil's own wrap correction turned off, since it would take a
+    reset for a wrap.
+
+    Args:
+        exclude (list of str, optional): Interface name patterns (fnmatch) to ignore, e.g.
+            ["lo", "veth*"]. Defaults to ().
+        clock (callable, optional): Returns the current monotonic time in seconds.
+            Defaults to time.monotonic.
+    """
+
+    def __init__(self, exclude=(), clock=time.monotonic):
+        self.exclude = list(exclude)
+        self.clock = clock
+        self.resets = 0
+        self._counters = {}  # name -> (bytes_sent, bytes_recv) at the previous sample
+        self._last_sample = None
+
+    def is_excluded(self, name):
+        """Return True if the interface matches one of the exclude patterns."""
+        return any(fnmatchcase(name, pattern) for pattern in self.exclude)
+
+    def sample(self):
+        """
+        Measure the traffic of every interface that is not excluded since the previous sample.
+
+        The first call returns an empty list, since there is nothing to compare with.
+
+        Returns:
+            list of InterfaceRate: Rates per interface in bytes per second, in name order.
+        """
+        now = self.clock()
+        elapsed = now - self._last_sample if self._last_sample is not None else None
+        self._last_sample = now
+
+        counters = {}
+        rates = []
+        for name, io in sorted(psutil.net_io_counters(pernic=True, nowrap=False).items()):
+            if self.is_excluded(name):
+                continue
+            counters[name] = (io.bytes_sent, io.bytes_recv)
+            previous = self._counters.get(name)
+            if previous is None or not elapsed:
+                continue
+            sent = counter_delta(previous[0], io.bytes_sent)
+            recv = counter_delta(previous[1], io.bytes_recv)
+            if sent is None or recv is None:
+                self.resets += 1
+                sent = recv = 0
+            rates.append(InterfaceRate(name, sent / elapsed, recv / elapsed))
+        self._counters = counters
+        return rates
@@ -0,0 +1,173 @@
+import os
+import socket
+from collections import namedtuple
+from functools import lru_cache
+
+Socket = namedtuple("Socket", ["proto", "address", "port", "state", "inode"])
+Socket.__doc__ = """
+A socket from the kernel socket tables.
+
+Fields:
+    proto (str): "tcp", "tcp6", "udp" or "udp6".
+    address (str): Local IP address.
+    port (int): Local port.
+    state (str): Socket state using the `ss` names, e.g. "LISTEN" or "UNCONN".
+    inode (int): Socket inode, which can be matched against /proc/<pid>/fd links. It changes
+        when a service restarts, so it is not part of `socket_key` or the formatted line.
+"""
+
+PROTOCOLS = ("tcp", "tcp6", "udp", "udp6")
+
+# Socket states from include/net/tcp_states.h, named like `ss` does
+TCP_STATES = {
+    "01": "ESTAB",
+    "02": "SYN-SENT",
+    "03": "SYN-RECV",
+    "04": "FIN-WAIT-1",
+    "05": "FIN-WAIT-2",
+    "06": "TIME-WAIT",
+    "07": "UNCONN",
+    "08": "CLOSE-WAIT",
+    "09": "LAST-ACK",
+    "0A": "LISTEN",
+    "0B": "CLOSING",
+    "0C": "NEW-SYN-RECV",
+}
+
+# States that `ss -l` reports as listening: listening TCP and unconnected UDP sockets
+LISTENING_STATES = {"tcp": "0A", "tcp6": "0A", "udp": "07", "udp6": "07"}
+
+
+@lru_cache(maxsize=4096)
+def decode_address(hex_address):
+    """
+    Decode an address from /proc/net/{tcp,udp}[6] into its textual form.
+
+    The kernel prints the address as 32-bit words in host byte order, which is little-endian
+    on the platforms this tool runs on.
+
+    Args:
+        hex_address (str): Hexadecimal address, 8 digits for IPv4 and 32 for IPv6.
+
+    Returns:
+        str: The IP address, e.g. "127.0.0.1" or "::1".
+    """
+    raw = bytes.fromhex(hex_address)
+    packed = b"".join(raw[i:i + 4][::-1] for i in range(0, len(raw), 4))
+    family = socket.AF_INET if len(packed) == 4 else socket.AF_INET6
+    return socket.inet_ntop(family, packed)
+
+def read_socket_table(proto, states=None, proc_root="/proc"):
+    """
+    Parse one kernel socket table into `Socket` records.
+
+    Args:
+        proto (str): One of `PROTOCOLS`.
+        states (set of str, optional): Hexadecimal state codes to keep, e.g. {"0A"}. Lines with
+            other states are skipped before their addresses are decoded. Defaults to all states.
+        proc_root (str, optional): Mount point of procfs. Defaults to "/proc".
+
+    Returns:
+        list of Socket: The sockets in the table.
+
+    Raises:
+        OSError: If the table cannot be read.
+    """
+    with open(os.path.join(proc_root, "net", proto), "rb") as table:
+        lines = table.read().splitlines()[1:]
+
+    wanted = None if states is None else {state.encode() for state in states}
+    sockets = []
+    for line in lines:
+        fields = line.split()
+        if wanted is not None and fields[3] not in wanted:
+            continue
+        state = fields[3].decode()
+        address, port = fields[1].decode().split(":")
+        sockets.append(Socket(
+            proto,
+            decode_address(address),
+            int(port, 16),
+            TCP_STATES.get(state, state),
+            int(fields[9]),
+        ))
+    return sockets
+
+def get_listening_sockets(proc_root="/proc"):
+    """
+    Collect the listening sockets, the same set `ss -tuln` shows.
+
+    Args:
+        proc_root (str, optional): Mount point of procfs. Defaults to "/proc".
+
+    Returns:
+        list of Socket: Sorted listening sockets, or None if the socket tables are not
+        available (e.g. on Windows), in which case callers fall back to `ss`/`netstat`.
+    """
+    sockets = []
+    available = False
+    for proto in PROTOCOLS:
+        try:
+            sockets.extend(read_socket_table(proto, {LISTENING_STATES[proto]}, proc_root))
+            available = True
+        except OSError:
+            # IPv6 tables are missing when IPv6 is disabled
+            continue
+    if not available:
+        return None
+    sockets.sort()
+    return sockets
+
+SOCKET_HEADER = f"{'Netid':<6} {'State':<8} Local Address:Port"
+
+def socket_key(sock):
+    """Return what identifies a listening socket across restarts: (proto, address, port, state)."""
+    return sock.proto, sock.address, sock.port, sock.state
+
+def format_socket(sock):
+    """
+    Format one socket as a line of the open ports listing.
+
+    Args:
+        sock (Socket): Socket to format.
+
+    Returns:
+        str: The formatted line, aligned with `SOCKET_HEADER`.
+    """
+    address = f"[{sock.address}]" if ":" in sock.address else sock.address
+    return f"{sock.proto:<6} {sock.state:<8} {address}:{sock.port}"
+
+def format_sockets(sockets):
+    """
+    Format sockets as a table for display, similar to the `ss -tuln` output.
+
+    Args:
+        sockets (list of Socket): Sockets to format.
+
+    Returns:
+        str: One header line followed by one line per socket.
+    """
+    return "\n".join([SOCKET_HEADER] + [format_socket(sock) for sock in sockets])
+
+def diff_snapshots(previous, current, key=None):
+    """
+    Compare two snapshots of a collection, such as the listening sockets of two cycles.
+
+    Args:
+        previous (dict): The previous snapshot, or None if there is none yet.
+        current (iterable): The new snapshot.
+        key (callable, optional): Returns what identifies an item, e.g. `socket_key`, so
+            items that only differ otherwise (e.g. in the socket inode) are the same.
+            Defaults to the item itself.
+
+    Returns:
+        tuple: (snapshot, added, removed) where `snapshot` maps the key of every item of
+        `current` to the item, to be passed back as `previous` next time, and
+        `added`/`removed` are sorted lists of the items whose key appeared or disappeared.
+        Without a previous snapshot, every item is added.
+    """
+    snapshot = {item if key is None else key(item): item for item in current}
+    if previous is None:
+        return snapshot, sorted(snapshot.values()), []
+    return (snapshot, sorted(snapshot[k] for k in snapshot.keys() - previous.keys()),
+            sorted(previous[k] for k in previous.keys() - snapshot.keys()))
@@ -0,0 +1,122 @@
+import heapq
+import time
+from collections import namedtuple
+
+import psutil
+
+# Attributes read for every process in one pass
+PROCESS_ATTRS = ["pid", "name", "cpu_percent", "memory_info", "io_counters"]
+
+# One process in a top-N list: CPU in %, RSS in bytes and disk I/O in bytes per second
+ProcessSample = namedtuple("ProcessSample", ["pid", "name", "cpu", "rss", "io_rate"])
+
+# Column titles and format of a process line
+PROCESS_HEADER = f"{'PID':>7}  {'Name':<20} {'CPU %':>6} {'RSS MB':>9} {'I/O MB/s':>9}"
+
+
+class ProcessSampler:
+    """
+    Samples the resource usage of all processes and keeps the top N by CPU, RSS and I/O.
+
+    `psutil.Process.cpu_percent` and the I/O rate are measured between two samples, so they
+    need the same process handle on every tick. The handles are kept in a cache keyed by
+    PID together with the previous I/O counters; `psutil.process_iter` hands back the cached
+    handle of a process that is still running instead of creating a new one, and PIDs that
+    are not seen again are evicted. All attributes are read in one pass with an explicit
+    attribute list, so psutil only reads the files it needs for each process. Processes
+    that cannot be read report their values as 0.
+
+    Args:
+        top_n (int, optional): Number of processes kept per ranking. Defaults to 5.
+        clock (callable, optional): Returns the current monotonic time in seconds.
+            Defaults to time.monotonic.
+    """
+
+    def __init__(self, top_n=5, clock=time.monotonic):
+        self.top_n = top_n
+        self.clock = clock
+        self._processes = {}  # pid -> (psutil.Process, I/O bytes at the previous sample)
+        self._last_sample = None
+        self.top_cpu = []
+        self.top_rss = []
+        self.top_io = []
+
+    def __len__(self):
+        return len(self._processes)
+
+    def sample(self):
+        """
+        Sample every process and update the top-N lists.
+
+        The first sample of a process has a CPU usage and I/O rate of 0, since there is no
+        previous sample to compare with.
+
+        Returns:
+            tuple: (top_cpu, top_rss, top_io), each a list of `ProcessSample`, highest first.
+            `top_io` only lists processes that did any disk I/O.
+        """
+        now = self.clock()
+        elapsed = now - self._last_sample if self._last_sample is not None else None
+        self._last_sample = now
+
+        processes = {}
+        samples = []
+        for process in psutil.process_iter(PROCESS_ATTRS, ad_value=None):
+            info = process.info
+            io = info["io_counters"]
+            io_bytes = io.read_bytes + io.write_bytes if io is not None else None
+            cached = self._processes.get(info["pid"])
+            io_rate = 0.0
+            if cached is not None and cached[0] is process and elapsed and io_bytes is not None and cached[1] is not None:
+                io_rate = max(0, io_bytes - cached[1]) / elapsed
+            processes[info["pid"]] = (process, io_bytes)
+
+            memory = info["memory_info"]
+            samples.append(ProcessSample(info["pid"], info["name"] or "?", info["cpu_percent"] or 0.0,
+                                         memory.rss if memory is not None else 0, io_rate))
+        self._processes = processes
+
+        self.top_cpu = heapq.nlargest(self.top_n, samples, key=lambda s: s.cpu)
+        self.top_rss = heapq.nlargest(self.top_n, samples, key=lambda s: s.rss)
+        self.top_io = heapq.nlargest(self.top_n, [s for s in samples if s.io_rate > 0], key=lambda s: s.io_rate)
+        return self.top_cpu, self.top_rss, self.top_io
+
+    def top(self):
+        """
+        Return the processes of all three top-N lists, each once, by CPU usage.
+
+        Returns:
+            list of ProcessSample: The processes, highest CPU usage first.
+        """
+        merged = {s.pid: s for s in self.top_cpu + self.top_rss + self.top_io}
+        return sorted(merged.values(), key=lambda s: s.cpu, reverse=True)
+
+
+def format_process(sample):
+    """
+    Format a process as one line of the process table, aligned with `PROCESS_HEADER`.
+
+    Args:
+        sample (ProcessSample): The process.
+
+    Returns:
+        str: The formatted line.
+    """
+    return (f"{sample.pid:>7}  {sample.name[:20]:<20} {sample.cpu:>6.1f} "
+            f"{sample.rss / (1024 * 1024):>9.1f} {sample.io_rate / (1024 * 1024):>9.2f}")
+
+
+def format_top_processes(samples, title="Top processes"):
+    """
+    Format a list of processes as a small table for warnings and alert emails.
+
+    Args:
+        samples (list of ProcessSample): The processes.
+        title (str, optional): First line of the table. Defaults to "Top processes".
+
+    Returns:
+        str: The table, or an empty string if there are no processes.
+    """
+    if not samples:
+        return ""
+    return "\n".join([f"{title}:", PROCESS_HEADER] + [format_process(s) for s in samples])
@@ -0,0 +1,192 @@
+import struct
+from collections import namedtuple
+
+# Wire format of the agent protocol, version 2.
+#
+# Every message is a frame: a header with the payload length (uint16) and the message type
+# (uint8), followed by the payload. All integers are big-endian.
+#
+#   HELLO    version (uint8), agent name (UTF-8, rest of the payload)
+#   SAMPLES  base time (float64, seconds since the epoch), sample count (uint8), then per
+#            sample: time offset from the base (uint16, 10 ms units), CPU, memory and disk
+#            usage (uint16 each, 0.01% units), network sent and received (float32 each, MB/s)
+#   DELTA    kind (uint8, PORTS or FILES), flags (uint8, RESET and MORE), added count
+#            (uint16), removed count (uint16), then every added and removed line as a length
+#            (uint16) and UTF-8 bytes. A change too long for one frame is split over several
+#            frames, all but the last with MORE; the receiver applies it once the last frame
+#            arrived. With RESET (on every frame of the change), the added lines of all its
+#            frames replace everything known before.
+#
+# A sample takes 16 bytes, so a batch of ten one-second samples is 172 bytes with header.
+
+VERSION = 2
+
+HEADER = struct.Struct("!HB")
+MAX_PAYLOAD = 0xFFFF
+
+HELLO = 1
+SAMPLES = 2
+DELTA = 3
+
+PORTS = 0
+FILES = 1
+RESET = 1
+MORE = 2
+
+_BATCH = struct.Struct("!dB")
+_SAMPLE = struct.Struct("!HHHHff")
+_DELTA = struct.Struct("!BBHH")
+_LENGTH = struct.Struct("!H")
+
+# Most samples per SAMPLES frame, and largest time offset from the base in seconds
+MAX_BATCH = 255
+MAX_OFFSET = 0xFFFF / 100
+
+# One health sample of an agent, with the same metrics as history.METRICS
+AgentSample = namedtuple("AgentSample", ["timestamp", "cpu", "memory", "disk", "net_sent", "net_recv"])
+
+Hello = namedtuple("Hello", ["version", "name"])
+# A change of the open ports or insecure files; `more` is set if further frames of the same
+# change follow
+Delta = namedtuple("Delta", ["kind", "reset", "added", "removed", "more"])
+
+
+class ProtocolError(ValueError):
+    """Raised when a frame cannot be decoded."""
+
+
+def frame(message_type, payload):
+    """
+    Build a frame from a message type and payload.
+
+    Args:
+        message_type (int): HELLO, SAMPLES or DELTA.
+        payload (bytes): The encoded message.
+
+    Returns:
+        bytes: The frame.
+
+    Raises:
+        ValueError: If the payload is too large for one frame.
+    """
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"payload of {len(payload)} bytes does not fit in a frame")
+    return HEADER.pack(len(payload), message_type) + payload
+
+
+def encode_hello(name):
+    """Return a HELLO frame for an agent name."""
+    return frame(HELLO, bytes([VERSION]) + name.encode("utf-8")[:MAX_PAYLOAD - 1])
+
+
+def encode_samples(samples):
+    """
+    Encode samples as SAMPLES frames.
+
+    Samples are split over as many frames as needed to respect the sample count and time
+    offset limits of one frame.
+
+    Args:
+        samples (list of AgentSample): Samples in time order.
+
+    Returns:
+        bytes: The frames.
+    """
+    frames = []
+    i = 0
+    while i < len(samples):
+        base = samples[i].timestamp
+        batch = []
+        while i < len(samples) and len(batch) < MAX_BATCH and samples[i].timestamp - base <= MAX_OFFSET:
+            s = samples[i]
+            batch.append(_SAMPLE.pack(
+                int(round((s.timestamp - base) * 100)), _percent(s.cpu), _percent(s.memory), _percent(s.disk),
+                s.net_sent, s.net_recv))
+            i += 1
+        frames.append(frame(SAMPLES, _BATCH.pack(base, len(batch)) + b"".join(batch)))
+    return b"".join(frames)
+
+
+def encode_delta(kind, added, removed, reset=False):
+    """
+    Encode a change of the open ports or insecure files as DELTA frames.
+
+    Long changes are split over several frames; all but the last carry MORE, and all of them
+    carry RESET if it is set.
+
+    Args:
+        kind (int): PORTS or FILES.
+        added (list of str): Lines that appeared.
+        removed (list of str): Lines that disappeared.
+        reset (bool, optional): Whether `added` is the complete set. Defaults to False.
+
+    Returns:
+        bytes: The frames.
+    """
+    items = [(True, line.encode("utf-8")[:MAX_PAYLOAD - 16]) for line in added]
+    items += [(False, line.encode("utf-8")[:MAX_PAYLOAD - 16]) for line in removed]
+    frames = []
+    start = 0
+    while start < len(items) or not frames:
+        size = _DELTA.size
+        end = start
+        while end < len(items) and size + _LENGTH.size + len(items[end][1]) <= MAX_PAYLOAD:
+            size += _LENGTH.size + len(items[end][1])
+            end += 1
+        chunk = items[start:end]
+        new = [line for is_added, line in chunk if is_added]
+        gone = [line for is_added, line in chunk if not is_added]
+        flags = (RESET if reset else 0) | (MORE if end < len(items) else 0)
+        payload = [_DELTA.pack(kind, flags, len(new), len(gone))]
+        for line in new + gone:
+            payload.append(_LENGTH.pack(len(line)) + line)
+        frames.append(frame(DELTA, b"".join(payload)))
+        start = end
+    return b"".join(frames)
+
+
+def decode(message_type, payload):
+    """
+    Decode the payload of a frame.
+
+    Args:
+        message_type (int): The message type from the frame header.
+        payload (bytes): The payload.
+
+    Returns:
+        Hello, list of AgentSample or Delta, depending on the message type.
+
+    Raises:
+        ProtocolError: If the message type is unknown or the payload is malformed.
+    """
+    try:
+        if message_type == HELLO:
+            return Hello(payload[0], payload[1:].decode("utf-8", errors="replace"))
+        if message_type == SAMPLES:
+            base, count = _BATCH.unpack_from(payload)
+            if len(payload) != _BATCH.size + count * _SAMPLE.size:
+                raise ProtocolError("SAMPLES payload has the wrong length")
+            samples = []
+            for offset, cpu, memory, disk, sent, recv in _SAMPLE.iter_unpack(payload[_BATCH.size:]):
+                samples.append(AgentSample(base + offset / 100, cpu / 100, memory / 100, disk / 100, sent, recv))
+            return samples
+        if message_type == DELTA:
+            kind, flags, n_added, n_removed = _DELTA.unpack_from(payload)
+            lines = []
+            position = _DELTA.size
+            for _ in range(n_added + n_removed):
+                (length,) = _LENGTH.unpack_from(payload, position)
+                position += _LENGTH.size
+                line = payload[position:position + length]
+                if len(line) != length:
+                    raise ProtocolError("DELTA line is truncated")
+                lines.append(line.decode("utf-8", errors="replace"))
+                position += length
+            return Delta(kind, bool(flags & RESET), lines[:n_added], lines[n_added:], bool(flags & MORE))
+    except (IndexError, struct.error) as e:
+        raise ProtocolError(f"malformed message of type {message_type}: {e}")
+    raise ProtocolError(f"unknown message type {message_type}")
+
+
+def _percent(value):
+    return max(0, min(0xFFFF, int(round(value * 100))))
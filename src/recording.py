@@ -0,0 +1,167 @@
+import json
+import struct
+import threading
+from collections import namedtuple
+
+from network import InterfaceRate
+from ports import Socket
+
+# File format of a recording, version 1.
+#
+# The file starts with MAGIC, followed by records. Every record is a header with the record
+# type (uint8) and the payload length (uint32), followed by the payload. All integers and
+# floats are big-endian.
+#
+#   HEALTH      time (float64, seconds since the epoch), CPU, memory and disk usage (float32
+#               each, %), network sent and received (float32 each, MB/s), then sent and
+#               received (float32 each, bytes/s) per interface of the last INTERFACES record
+#   INTERFACES  JSON list of the interface names used by the following HEALTH records
+#   PORTS       JSON {"time", "initial", "opened", "closed"}, sockets as [proto, address,
+#               port, state, inode]; "initial" marks the first snapshot of a run
+#   FILES       JSON {"time", "initial", "added", "removed"} with file paths
+#
+# A health sample takes 33 bytes plus 8 per interface; ports and files are only recorded
+# when they change.
+
+MAGIC = b"SMREC\x01"
+
+HEALTH = 1
+INTERFACES = 2
+PORTS = 3
+FILES = 4
+
+_RECORD = struct.Struct("!BI")
+_HEALTH = struct.Struct("!d5f")
+_INTERFACE = struct.Struct("!ff")
+
+HealthRecord = namedtuple("HealthRecord", ["timestamp", "cpu", "memory", "disk", "net_sent", "net_recv", "interfaces"])
+PortsRecord = namedtuple("PortsRecord", ["timestamp", "initial", "opened", "closed"])
+FilesRecord = namedtuple("FilesRecord", ["timestamp", "initial", "added", "removed"])
+
+
+class Recorder:
+    """
+    Writes the collected samples, port changes and insecure file changes to a recording.
+
+    Collectors call it from their sampler threads, so writes are serialized with a lock. The
+    file is buffered and flushed by `close`, which `monitor.start` registers to run at exit;
+    a crash loses at most the last buffer.
+
+    Args:
+        path (str): The recording file, overwritten if it exists.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "wb", buffering=64 * 1024)
+        self._file.write(MAGIC)
+        self._interfaces = None
+        self._lock = threading.Lock()
+
+    def health(self, timestamp, cpu, memory, disk, net_sent, net_recv, interfaces):
+        """
+        Record one health sample.
+
+        Args:
+            timestamp (float): Time of the sample, in seconds since the epoch.
+            cpu (float): CPU usage (%).
+            memory (float): Memory usage (%).
+            disk (float): Disk usage of the root filesystem (%).
+            net_sent (float): Sent over all monitored interfaces (MB/s).
+            net_recv (float): Received over all monitored interfaces (MB/s).
+            interfaces (list of InterfaceRate): Traffic per interface (bytes/s).
+        """
+        names = [interface.name for interface in interfaces]
+        payload = _HEALTH.pack(timestamp, cpu, memory, disk, net_sent, net_recv) + b"".join(
+            _INTERFACE.pack(interface.sent, interface.recv) for interface in interfaces)
+        with self._lock:
+            if names != self._interfaces:
+                self._write(INTERFACES, json.dumps(names).encode())
+                self._interfaces = names
+            self._write(HEALTH, payload)
+
+    def ports(self, timestamp, opened, closed, initial=False):
+        """
+        Record opened and closed ports.
+
+        Args:
+            timestamp (float): Time of the change, in seconds since the epoch.
+            opened (list of Socket): Sockets that started listening.
+            closed (list of Socket): Sockets that stopped listening.
+            initial (bool, optional): Whether `opened` is the first snapshot. Defaults to False.
+        """
+        payload = {"time": timestamp, "initial": initial, "opened": opened, "closed": closed}
+        with self._lock:
+            self._write(PORTS, json.dumps(payload).encode())
+
+    def files(self, timestamp, added, removed, initial=False):
+        """
+        Record insecure file changes.
+
+        Args:
+            timestamp (float): Time of the change, in seconds since the epoch.
+            added (list of str): Files that became insecure.
+            removed (list of str): Files that are no longer insecure.
+            initial (bool, optional): Whether `added` is the result of the first scan.
+                Defaults to False.
+        """
+        payload = {"time": timestamp, "initial": initial, "added": added, "removed": removed}
+        with self._lock:
+            self._write(FILES, json.dumps(payload).encode())
+
+    def close(self):
+        """Flush and close the recording."""
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def _write(self, record_type, payload):
+        if not self._file.closed:
+            self._file.write(_RECORD.pack(record_type, len(payload)) + payload)
+
+
+def read_recording(path):
+    """
+    Read the records of a recording in the order they were written.
+
+    The whole file is read at once and decoded with `struct.unpack_from`, so replaying is not
+    slowed down by file reads. A record cut off at the end, e.g. by a crash, is ignored.
+
+    Args:
+        path (str): The recording file.
+
+    Yields:
+        HealthRecord, PortsRecord or FilesRecord: The records.
+
+    Raises:
+        ValueError: If the file is not a recording or a record type is unknown.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a recording")
+
+    names = []
+    position = len(MAGIC)
+    while position + _RECORD.size <= len(data):
+        record_type, length = _RECORD.unpack_from(data, position)
+        position += _RECORD.size
+        if position + length > len(data):
+            break
+        if record_type == HEALTH:
+            timestamp, cpu, memory, disk, net_sent, net_recv = _HEALTH.unpack_from(data, position)
+            rates = _INTERFACE.iter_unpack(data[position + _HEALTH.size:position + length])
+            interfaces = [InterfaceRate(name, sent, recv) for name, (sent, recv) in zip(names, rates)]
+            yield HealthRecord(timestamp, cpu, memory, disk, net_sent, net_recv, interfaces)
+        elif record_type == INTERFACES:
+            names = json.loads(data[position:position + length])
+        elif record_type == PORTS:
+            record = json.loads(data[position:position + length])
+            yield PortsRecord(record["time"], record["initial"], [Socket(*sock) for sock in record["opened"]],
+                              [Socket(*sock) for sock in record["closed"]])
+        elif record_type == FILES:
+            record = json.loads(data[position:position + length])
+            yield FilesRecord(record["time"], record["initial"], record["added"], record["removed"])
+        else:
+            raise ValueError(f"unknown record type {record_type} in {path}")
+        position += length
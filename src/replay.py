@@ -0,0 +1,88 @@
+import time
+
+import monitor
+import stats
+from alerts import StubSink
+from recording import HealthRecord, PortsRecord, read_recording
+
+
+class ReplayClock:
+    """
+    Clock that shows the time of the record being replayed.
+
+    Alert windows, digests and log timestamps use it during a replay, so they follow the
+    recorded time instead of the time the replay runs.
+    """
+
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+def replay(path, reporter, speed=0.0, write_logs=True, sleep=time.sleep):
+    """
+    Feed a recording through the same threshold, logging and alert code as live samples.
+
+    Health samples go through `monitor.check_health`, port and insecure file changes through
+    `monitor.report_port_changes` and `monitor.report_insecure_file_changes`. Alerts are
+    collected by a `StubSink` instead of being sent.
+
+    Args:
+        path (str): The recording, written with --record.
+        reporter (Reporter): Receives the results, e.g. the headless `Reporter`.
+        speed (float, optional): Recorded seconds replayed per second; 0 replays as fast as
+            possible. Defaults to 0.
+        write_logs (bool, optional): Whether to write the replay logs. Defaults to True.
+        sleep (callable, optional): Used to wait between records at a given speed.
+            Defaults to time.sleep.
+
+    Returns:
+        dict: records, samples, seconds (wall-clock time of the replay), recorded_seconds
+        and alerts, a list of (recorded time, subject, body).
+    """
+    clock = ReplayClock()
+    sink = StubSink(clock)
+    monitor.start_replay(clock, sink.send, write_logs)
+
+    open_ports = set()
+    insecure_files = set()
+    records = samples = 0
+    first = None
+    started = time.perf_counter()
+    with stats.timed("replay"):
+        for record in read_recording(path):
+            clock.time = record.timestamp
+            if first is None:
+                first = record.timestamp
+            if speed:
+                delay = started + (record.timestamp - first) / speed - time.perf_counter()
+                if delay > 0:
+                    sleep(delay)
+
+            records += 1
+            if isinstance(record, HealthRecord):
+                samples += 1
+                monitor.check_health(reporter, *record)
+            elif isinstance(record, PortsRecord):
+                if record.initial:
+                    open_ports.clear()
+                open_ports.difference_update(record.closed)
+                open_ports.update(record.opened)
+                monitor.report_port_changes(reporter, record.opened, record.closed, len(open_ports), record.initial)
+            else:
+                if record.initial:
+                    insecure_files.clear()
+                insecure_files.difference_update(record.removed)
+                insecure_files.update(record.added)
+                monitor.report_insecure_file_changes(reporter, record.added, record.removed, len(insecure_files),
+                                                     record.initial)
+
+    return {
+        "records": records,
+        "samples": samples,
+        "seconds": time.perf_counter() - started,
+        "recorded_seconds": clock.time - first if first is not None else 0.0,
+        "alerts": sink.alerts,
+    }
@@ -0,0 +1,340 @@
+import operator
+import re
+import threading
+from collections import namedtuple
+from fnmatch import fnmatchcase
+
+# Rules file format, one rule per line; empty lines and lines starting with # are ignored:
+#
+#   NAME: METRIC OP VALUE [for [PERCENT% of] DURATION] [clear when OP VALUE [for [PERCENT% of] DURATION]]
+#
+# e.g.
+#
+#   High CPU: cpu > 90 for 5m clear when < 80 for 1m
+#   Busy agents: *:cpu > 75 for 80% of 10m
+#   Traffic: net_recv >= 50
+#
+# METRIC is matched against the series names as a shell-style pattern: "cpu", "memory",
+# "disk", "net_sent" and "net_recv" of this host and "AGENT:METRIC" of the agents. OP is one
+# of >, >=, < and <=. DURATION is a number of seconds with an optional unit (s, m, h, d).
+#
+# A rule fires when its condition held for DURATION: for the PERCENT (default 100%) of the
+# samples of the last DURATION, or for the latest sample without "for". It clears when the
+# "clear when" condition held for its duration, or without one, as soon as the condition no
+# longer holds.
+
+OPERATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# Buckets of a sliding window, see WindowCounter
+BUCKETS = 60
+
+_CONDITION = r"(?P<{0}op>>=|<=|>|<)\s*(?P<{0}value>[-+]?\d+(?:\.\d+)?)" \
+             r"(?:\s+for\s+(?:(?P<{0}percent>\d+(?:\.\d+)?)%\s+of\s+)?(?P<{0}duration>\d+(?:\.\d+)?[smhd]?))?"
+_RULE = re.compile(r"(?P<name>[^:#]+?)\s*:\s+(?P<metric>\S+?)\s*" + _CONDITION.format("")
+                   + r"(?:\s+clear\s+when\s+" + _CONDITION.format("clear_") + r")?\s*$")
+
+# A condition on the samples of a series: OP VALUE held for `fraction` of `duration` seconds
+Condition = namedtuple("Condition", ["op", "value", "duration", "fraction"])
+
+# A rule; `clear` is None if the rule clears as soon as `condition` no longer holds
+Rule = namedtuple("Rule", ["name", "metric", "condition", "clear"])
+
+# A rule that fired (active) or cleared (not active) for a series on a sample
+RuleEvent = namedtuple("RuleEvent", ["rule", "series", "active", "value", "timestamp"])
+
+
+def parse_duration(text):
+    """
+    Parse a duration like "90", "30s", "5m", "1.5h" or "1d".
+
+    Returns:
+        float: The duration in seconds.
+    """
+    unit = text[-1] if text[-1] in DURATION_UNITS else "s"
+    return float(text.rstrip("".join(DURATION_UNITS))) * DURATION_UNITS[unit]
+
+
+def format_condition(condition):
+    """
+    Format a condition the way it is written in a rules file, e.g. "> 90 for 5m".
+
+    Args:
+        condition (Condition): The condition.
+
+    Returns:
+        str: The condition without the metric.
+    """
+    text = f"{condition.op} {condition.value:g}"
+    if condition.duration:
+        duration = condition.duration
+        unit = next((unit for unit in ("d", "h", "m") if duration % DURATION_UNITS[unit] == 0), "s")
+        percent = f"{condition.fraction * 100:g}% of " if condition.fraction < 1 else ""
+        text += f" for {percent}{duration / DURATION_UNITS[unit]:g}{unit}"
+    return text
+
+
+def parse_rule(line):
+    """
+    Parse one rule, see the rules file format at the top of this module.
+
+    Args:
+        line (str): The rule, e.g. "High CPU: cpu > 90 for 5m clear when < 80 for 1m".
+
+    Returns:
+        Rule: The rule.
+
+    Raises:
+        ValueError: If the line is not a valid rule.
+    """
+    match = _RULE.match(line.strip())
+    if match is None:
+        raise ValueError(f"expected 'NAME: METRIC OP VALUE [for DURATION] [clear when OP VALUE [for DURATION]]', got {line.strip()!r}")
+    return Rule(match["name"], match["metric"], _condition(match, ""),
+                _condition(match, "clear_") if match["clear_op"] else None)
+
+
+def _condition(match, prefix):
+    percent = match[prefix + "percent"]
+    duration = match[prefix + "duration"]
+    if percent is not None and not 0 < float(percent) <= 100:
+        raise ValueError(f"percentage {percent}% is not between 0 and 100")
+    return Condition(match[prefix + "op"], float(match[prefix + "value"]),
+                     parse_duration(duration) if duration else 0.0,
+                     float(percent) / 100 if percent is not None else 1.0)
+
+
+def load_rules(path):
+    """
+    Read a rules file.
+
+    Args:
+        path (str): The rules file.
+
+    Returns:
+        list of Rule: The rules, in file order.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If a line is not a valid rule, with the file name and line number.
+    """
+    rules = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            try:
+                rules.append(parse_rule(line))
+            except ValueError as e:
+                raise ValueError(f"{path}:{number}: {e}") from None
+    return rules
+
+
+class WindowCounter:
+    """
+    Counts the samples of a series, and those that met a condition, over a sliding window.
+
+    The window is split into BUCKETS buckets of counts. A sample only adds to the bucket of
+    its time, and moving to a new bucket subtracts the counts of the buckets that left the
+    window from the running totals, so adding a sample and checking the window take
+    constant time however many samples the window holds. The window moves a bucket at a
+    time, so it is accurate to a BUCKETS-th of its duration.
+
+    Args:
+        condition (Condition): The condition counted.
+    """
+
+    __slots__ = ("test", "value", "duration", "fraction", "width", "hits", "counts", "total_hits", "total",
+                 "bucket", "start", "last_hit")
+
+    def __init__(self, condition):
+        self.test = OPERATORS[condition.op]
+        self.value = condition.value
+        self.duration = condition.duration
+        self.fraction = condition.fraction
+        self.width = condition.duration / BUCKETS
+        self.hits = [0] * BUCKETS if condition.duration else None
+        self.counts = [0] * BUCKETS if condition.duration else None
+        self.total_hits = self.total = 0
+        self.bucket = None
+        self.start = None
+        self.last_hit = False
+
+    def reset(self):
+        """Forget all samples, so the condition only holds again once a whole window was observed."""
+        if self.hits is not None:
+            self.hits = [0] * BUCKETS
+            self.counts = [0] * BUCKETS
+        self.total_hits = self.total = 0
+        self.bucket = None
+        self.start = None
+        self.last_hit = False
+
+    def add(self, timestamp, value):
+        """Count a sample taken at `timestamp` (seconds)."""
+        hit = self.test(value, self.value)
+        self.last_hit = hit
+        if self.hits is None:
+            return
+        if self.start is None:
+            self.start = timestamp
+        bucket = int(timestamp // self.width)
+        if self.bucket is None:
+            self.bucket = bucket
+        elif bucket - self.bucket >= BUCKETS:
+            # No samples for a whole window: start over, so the window is filled again first
+            self.reset()
+            self.last_hit = hit
+            self.start = timestamp
+            self.bucket = bucket
+        elif bucket > self.bucket:
+            # Empty the buckets that left the window
+            for step in range(1, bucket - self.bucket + 1):
+                slot = (self.bucket + step) % BUCKETS
+                self.total_hits -= self.hits[slot]
+                self.total -= self.counts[slot]
+                self.hits[slot] = self.counts[slot] = 0
+            self.bucket = bucket
+        # A sample older than the current bucket (the clock went back) counts in the current one
+        slot = self.bucket % BUCKETS
+        self.counts[slot] += 1
+        self.total += 1
+        if hit:
+            self.hits[slot] += 1
+            self.total_hits += 1
+
+    def held(self, timestamp):
+        """
+        Tell whether the condition held at `timestamp` (seconds).
+
+        Returns:
+            bool: Whether the samples of the window met the condition in the required
+                fraction, once the series has been observed for the whole window; without a
+                duration, whether the latest sample met it.
+        """
+        if self.hits is None:
+            return self.last_hit
+        return (timestamp - self.start >= self.duration and self.total > 0
+                and self.total_hits >= self.fraction * self.total)
+
+
+class RuleState:
+    """The state of one rule for one series: its window counters and whether it is active."""
+
+    __slots__ = ("rule", "condition", "clear", "active")
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.condition = WindowCounter(rule.condition)
+        self.clear = WindowCounter(rule.clear) if rule.clear is not None else None
+        self.active = False
+
+
+class RuleEngine:
+    """
+    Evaluates rules on the samples of many series, one sample at a time.
+
+    Every series gets its own state for each rule whose metric pattern matches its name;
+    the matching is done once, on the first sample of the series. A sample updates the
+    window counters of these rules in constant time each (see `WindowCounter`), so the cost
+    per sample does not depend on the durations of the rules, and thousands of rules over
+    the series of many hosts stay cheap.
+
+    Only changes are reported: a rule fires once when its condition starts to hold and
+    clears once when its clear condition holds, instead of on every sample in between. The
+    window of the clear condition starts over when a rule fires and that of the condition
+    when it clears, so each has to hold for its own samples after the change; otherwise a
+    rule that holds for a fraction of its window would fire again right after clearing.
+
+    Besides its `rules`, the engine evaluates rules generated by the caller for one series,
+    e.g. the threshold of a mountpoint, with `observe_rule`, so these change state the same
+    way.
+
+    `observe` and `observe_rule` may be called from several threads, but the samples of one
+    series must come from one thread.
+
+    Args:
+        rules (list of Rule): The rules.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self._states = {}  # Series -> list of RuleState
+        self._generated = {}  # (series, rule) -> RuleState of the rules passed to observe_rule
+        self._lock = threading.Lock()
+
+    def observe(self, series, timestamp, value):
+        """
+        Evaluate the rules of a series on a new sample.
+
+        Args:
+            series (str): Name of the series, e.g. "cpu" or "web1:cpu".
+            timestamp (float): Time of the sample, in seconds since the epoch.
+            value (float): The sample.
+
+        Returns:
+            list of RuleEvent: The rules that fired or cleared on this sample.
+        """
+        states = self._states.get(series)
+        if states is None:
+            with self._lock:
+                states = self._states.setdefault(series, [RuleState(rule) for rule in self.rules
+                                                          if fnmatchcase(series, rule.metric)])
+        events = []
+        for state in states:
+            event = self._step(state, series, timestamp, value)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def observe_rule(self, rule, series, timestamp, value):
+        """
+        Evaluate a rule that is not one of `rules` on a new sample of a series.
+
+        The state is kept per series and rule, so a rule generated again with the same
+        condition on every sample continues where it left off.
+
+        Args:
+            rule (Rule): The rule; its metric pattern is not used.
+            series (str): Name of the series, e.g. "mount /data".
+            timestamp (float): Time of the sample, in seconds since the epoch.
+            value (float): The sample.
+
+        Returns:
+            RuleEvent: The event if the rule fired or cleared on this sample, otherwise None.
+        """
+        key = (series, rule)
+        state = self._generated.get(key)
+        if state is None:
+            with self._lock:
+                state = self._generated.setdefault(key, RuleState(rule))
+        return self._step(state, series, timestamp, value)
+
+    def _step(self, state, series, timestamp, value):
+        state.condition.add(timestamp, value)
+        if state.clear is not None:
+            state.clear.add(timestamp, value)
+        if not state.active:
+            if state.condition.held(timestamp):
+                state.active = True
+                if state.clear is not None:
+                    state.clear.reset()
+                return RuleEvent(state.rule, series, True, value, timestamp)
+        elif state.clear.held(timestamp) if state.clear is not None else not state.condition.held(timestamp):
+            state.active = False
+            state.condition.reset()
+            return RuleEvent(state.rule, series, False, value, timestamp)
+        return None
+
+    def active(self, series):
+        """
+        Tell whether a rule is active (fired and not cleared) for a series.
+
+        Args:
+            series (str): Name of the series.
+
+        Returns:
+            bool: True if at least one rule is active.
+        """
+        return any(state.active for state in self._states.get(series, ()))
@@ -0,0 +1,298 @@
+import os
+import stat
+import platform
+
+
+def is_world_readable(filepath):
+    """Check if a file is world-readable on Unix-like systems."""
+    mode = os.stat(filepath).st_mode
+    return mode & stat.S_IROTH
+
+def check_windows_permissions(filepath):
+    """Check if a file is readable by everyone on Windows using ctypes."""
+    import ctypes  # Only needed on Windows, so not imported at startup elsewhere
+    try:
+        sd = ctypes.windll.advapi32.GetFileSecurityW(
+            ctypes.c_wchar_p(filepath),
+            7,  # DACL_SECURITY_INFORMATION
+            None,
+            0,
+            ctypes.byref(ctypes.c_ulong(0)),
+        )
+        return sd == 0
+    except Exception:
+        return False
+
+def check_insecure_files(directories, workers=None):
+    """
+    Checks for insecure files in the given directories.
+
+    On Windows, it checks if the files have insecure permissions using `check_windows_permissions`.
+    On Unix-like systems, it checks if the files are world-readable. The directories and their
+    subtrees are split across a pool of worker threads, see `InsecureFileScanner`.
+
+    Args:
+        directories (list): A list of directory paths to check for insecure files.
+        workers (int, optional): Number of worker threads. Defaults to `default_scan_workers()`.
+
+    Returns:
+        list: A sorted list of file paths that are considered insecure.
+    """
+    added, _ = InsecureFileScanner(directories, workers=workers).scan()
+    return added
+
+def default_scan_workers():
+    """Return the default number of scan worker threads for this host."""
+    return min(32, (os.cpu_count() or 1) + 4)
+
+def is_insecure(filepath, file_stat, is_windows):
+    """
+    Decide whether a file is insecure from an already collected stat result.
+
+    Args:
+        filepath (str): Path of the file.
+        file_stat (os.stat_result): Stat result for the file.
+        is_windows (bool): Whether the Windows ACL check should be used.
+
+    Returns:
+        bool: True if the file is considered insecure.
+    """
+    if is_windows:
+        return check_windows_permissions(filepath)
+    return bool(file_stat.st_mode & stat.S_IROTH)
+
+
+def _is_under(path, directory):
+    return path == directory or path.startswith(directory.rstrip(os.sep) + os.sep)
+
+
+class InsecureFileScanner:
+    """
+    Incremental, parallel scanner for insecure files.
+
+    The scanner keeps an index of (inode, mtime, mode) for every file and the mtime and
+    listing of every directory it has visited. A directory whose mtime is unchanged since
+    the previous scan is not listed again, and only its subdirectories are checked. Changing
+    a file's mode does not touch the mtime of the directory holding it, so each scan also
+    stats a rotating 1/`full_rescan_every` of the known files of unchanged directories.
+    Every `full_rescan_every` scans all directories are listed again and every file is
+    rechecked, which also picks up Windows ACL changes that do not show in the stat result.
+
+    A mode change is therefore found within `full_rescan_every` scans, while a scan between
+    the full rescans costs one stat per directory plus 1/`full_rescan_every` of a stat per
+    file; stat'ing every known file on every scan would find it on the next scan, but cost
+    about as much metadata I/O as a full rescan.
+
+    Every directory is visited as a separate task, so both the configured directories and
+    large subtrees are spread over a pool of `workers` threads. Workers only read the index;
+    their results are merged into it on the calling thread.
+
+    Args:
+        directories (list of str): Directories to scan.
+        full_rescan_every (int, optional): Number of scans between full rescans. Defaults to 10.
+        workers (int, optional): Number of worker threads. Defaults to `default_scan_workers()`.
+    """
+
+    def __init__(self, directories, full_rescan_every=10, workers=None):
+        self.directories = list(directories)
+        self.full_rescan_every = max(1, full_rescan_every)
+        self.workers = max(1, workers or default_scan_workers())
+        self.is_windows = platform.system() == "Windows"
+        self.insecure = set()
+        self._files = {}  # path -> (inode, mtime_ns, mode, insecure)
+        self._dirs = {}  # path -> (mtime_ns, file paths, subdirectory paths)
+        self._scans = 0
+        self._sorted = []
+
+    def scan(self, full=False):
+        """
+        Scan the configured directories and update the index.
+
+        Args:
+            full (bool, optional): Force a full rescan. Defaults to False.
+
+        Returns:
+            tuple: (added, removed) sorted lists of insecure file paths that appeared or
+            disappeared since the previous scan. The first scan reports every insecure file
+            as added.
+        """
+        full = full or self._scans % self.full_rescan_every == 0
+        self._scans += 1
+        added, removed = self._walk(self.directories, full)
+        return self._apply(added, removed)
+
+    def recheck(self, paths):
+        """
+        Recheck only the given paths, e.g. the ones reported by a file system watcher.
+
+        A path that is a directory has its whole subtree rescanned; a path that no longer
+        exists is dropped from the index together with everything below it.
+
+        Args:
+            paths (iterable of str): Files or directories that were created, changed or removed.
+
+        Returns:
+            tuple: (added, removed) sorted lists of insecure file paths, as for `scan`.
+        """
+        added = []
+        removed = []
+        for path in sorted(set(paths)):
+            self._dirs.pop(os.path.dirname(path), None)
+            try:
+                file_stat = os.stat(path)
+            except OSError:
+                file_stat = None
+
+            if file_stat is None:
+                self._forget(path, removed)
+            elif stat.S_ISDIR(file_stat.st_mode):
+                if not os.path.islink(path):
+                    subtree_added, subtree_removed = self._walk([path], True, subtree=path)
+                    added.extend(subtree_added)
+                    removed.extend(subtree_removed)
+            else:
+                key = (file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_mode)
+                self._record(path, key + (is_insecure(path, file_stat, self.is_windows),), added, removed)
+        return self._apply(added, removed)
+
+    def insecure_files(self):
+        """
+        Return the current insecure files.
+
+        Returns:
+            list of str: Sorted insecure file paths. The list is only rebuilt when a scan
+            reported changes, so callers must not modify it.
+        """
+        return self._sorted
+
+    def _walk(self, roots, full, subtree=None):
+        seen_files = set()
+        seen_dirs = set()
+        added = []
+        removed = []
+
+        def merge(path, result):
+            if result is None:
+                return []
+            dir_mtime, files, subdirs, changed = result
+            self._dirs[path] = (dir_mtime, files, subdirs)
+            seen_files.update(files)
+            for file_path, entry in changed:
+                self._record(file_path, entry, added, removed)
+            return [d for d in subdirs if d not in seen_dirs]
+
+        pending = list(dict.fromkeys(roots))
+        seen_dirs.update(pending)
+        if self.workers == 1:
+            while pending:
+                path = pending.pop()
+                subdirs = merge(path, self._visit(path, full))
+                seen_dirs.update(subdirs)
+                pending.extend(subdirs)
+        else:
+            from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                running = {executor.submit(self._visit, path, full): path for path in pending}
+                while running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        subdirs = merge(running.pop(future), future.result())
+                        seen_dirs.update(subdirs)
+                        for path in subdirs:
+                            running[executor.submit(self._visit, path, full)] = path
+
+        stale_dirs = self._dirs.keys() - seen_dirs
+        stale_files = self._files.keys() - seen_files
+        if subtree is not None:
+            stale_dirs = [p for p in stale_dirs if _is_under(p, subtree)]
+            stale_files = [p for p in stale_files if _is_under(p, subtree)]
+        for path in stale_dirs:
+            del self._dirs[path]
+        for path in stale_files:
+            if self._files.pop(path)[3]:
+                removed.append(path)
+        return added, removed
+
+    def _record(self, path, entry, added, removed):
+        previous = self._files.get(path)
+        self._files[path] = entry
+        was_insecure = previous is not None and previous[3]
+        if entry[3] and not was_insecure:
+            added.append(path)
+        elif was_insecure and not entry[3]:
+            removed.append(path)
+
+    def _forget(self, path, removed):
+        entry = self._files.pop(path, None)
+        if entry is not None and entry[3]:
+            removed.append(path)
+        for dir_path in [p for p in self._dirs if _is_under(p, path)]:
+            del self._dirs[dir_path]
+        for file_path in [p for p in self._files if _is_under(p, path)]:
+            if self._files.pop(file_path)[3]:
+                removed.append(file_path)
+
+    def _apply(self, added, removed):
+        self.insecure.difference_update(removed)
+        self.insecure.update(added)
+        if added or removed:
+            self._sorted = sorted(self.insecure)
+        return sorted(added), sorted(removed)
+
+    def _visit(self, path, full):
+        # Runs on a worker thread: must not modify the index.
+        try:
+            dir_mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+        cached = self._dirs.get(path)
+        if cached is not None and cached[0] == dir_mtime and not full:
+            changed = self._restat(cached[1][self._scans % self.full_rescan_every::self.full_rescan_every])
+            if changed is not None:
+                return cached + (changed,)
+
+        files = []
+        subdirs = []
+        changed = []
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError as e:
+            print(f"Error scanning directory {path}: {e}")
+            return dir_mtime, (), (), ()
+
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        subdirs.append(entry.path)
+                    continue
+                file_stat = entry.stat()
+            except OSError as e:
+                print(f"Error checking permissions for {entry.path}: {e}")
+                continue
+
+            files.append(entry.path)
+            key = (file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_mode)
+            previous = self._files.get(entry.path)
+            if previous is not None and previous[:3] == key and not full:
+                continue
+            changed.append((entry.path, key + (is_insecure(entry.path, file_stat, self.is_windows),)))
+
+        return dir_mtime, tuple(files), tuple(subdirs), changed
+
+    def _restat(self, paths):
+        # Runs on a worker thread: stat the share of the known files of an unchanged directory
+        # due in this scan and return those whose inode, mtime or mode changed, or None if
+        # one is gone and the directory has to be listed again.
+        changed = []
+        for file_path in paths:
+            try:
+                file_stat = os.stat(file_path)
+            except OSError:
+                return None
+            key = (file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_mode)
+            if self._files.get(file_path, (None,))[:3] != key:
+                changed.append((file_path, key + (is_insecure(file_path, file_stat, self.is_windows),)))
+        return changed
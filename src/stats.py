@@ -0,0 +1,181 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds of the latency buckets in seconds: 4 per doubling from 10 µs to about 170 s
+BUCKET_BOUNDS = tuple(1e-5 * 2 ** (i / 4) for i in range(97))
+
+# Registered histograms, counters and gauges, by name
+histograms = {}
+counters = {}
+gauges = {}
+
+_lock = threading.Lock()
+
+
+class LatencyHistogram:
+    """
+    Histogram of durations with fixed, logarithmically spaced buckets.
+
+    Recording is a binary search over `BUCKET_BOUNDS` and an increment, so it is cheap enough
+    to wrap every collector run and alert. Quantiles are read from the buckets and are
+    accurate to about 19% (one bucket), which is enough to tell which part of the loop is
+    slow.
+    """
+
+    __slots__ = ("buckets", "count", "total", "max", "_lock")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        """Record one duration in seconds."""
+        index = bisect_left(BUCKET_BOUNDS, seconds)
+        with self._lock:
+            self.buckets[index] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantile(self, q):
+        """
+        Return the upper bound of the bucket holding the `q` quantile, at most the maximum.
+
+        Args:
+            q (float): The quantile, e.g. 0.95.
+
+        Returns:
+            float: The quantile in seconds, or 0 if nothing was recorded.
+        """
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = q * self.count
+            seen = 0
+            for index, count in enumerate(self.buckets):
+                seen += count
+                if seen >= rank and count:
+                    return min(BUCKET_BOUNDS[index], self.max) if index < len(BUCKET_BOUNDS) else self.max
+            return self.max
+
+    def summary(self):
+        """
+        Return the count, mean, p50, p95, p99 and maximum of the recorded durations.
+
+        Returns:
+            dict: The summary, durations in seconds.
+        """
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+def histogram(name):
+    """
+    Return the latency histogram with the given name, creating it on first use.
+
+    Args:
+        name (str): Name of the histogram, e.g. "collector.health".
+
+    Returns:
+        LatencyHistogram: The histogram.
+    """
+    try:
+        return histograms[name]
+    except KeyError:
+        with _lock:
+            return histograms.setdefault(name, LatencyHistogram())
+
+
+@contextmanager
+def timed(name):
+    """
+    Record the duration of a `with` block in the named histogram, also if the block raises.
+
+    Args:
+        name (str): Name of the histogram.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram(name).record(time.perf_counter() - start)
+
+
+def count(name, n=1):
+    """
+    Add to the named counter.
+
+    Args:
+        name (str): Name of the counter, e.g. "collector.health.errors".
+        n (int, optional): Amount to add. Defaults to 1.
+    """
+    with _lock:
+        counters[name] = counters.get(name, 0) + n
+
+
+def register_gauge(name, read):
+    """
+    Register a gauge, a value that is read when the stats are shown, e.g. a queue depth.
+
+    Args:
+        name (str): Name of the gauge, e.g. "alerts.queue".
+        read (callable): Returns the current value.
+    """
+    gauges[name] = read
+
+
+def snapshot():
+    """
+    Return the current statistics.
+
+    Returns:
+        dict: {"histograms": {name: summary}, "counters": {name: value}, "gauges": {name: value}}.
+    """
+    gauge_values = {}
+    for name, read in list(gauges.items()):
+        try:
+            gauge_values[name] = read()
+        except Exception as e:
+            gauge_values[name] = f"error: {e}"
+    with _lock:
+        counter_values = dict(counters)
+    return {
+        "histograms": {name: h.summary() for name, h in sorted(list(histograms.items()))},
+        "counters": dict(sorted(counter_values.items())),
+        "gauges": dict(sorted(gauge_values.items())),
+    }
+
+
+def format_stats(stats=None):
+    """
+    Format the statistics as a text table, latencies in milliseconds.
+
+    Args:
+        stats (dict, optional): Statistics from `snapshot`. Defaults to the current ones.
+
+    Returns:
+        str: The table.
+    """
+    stats = stats or snapshot()
+    lines = [f"{'Latency (ms)':<32} {'count':>8} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}"]
+    for name, h in stats["histograms"].items():
+        lines.append(f"{name:<32} {h['count']:>8} " + " ".join(
+            f"{h[key] * 1000:>9.2f}" for key in ("mean", "p50", "p95", "p99", "max")))
+    for title, values in (("Counter", stats["counters"]), ("Gauge", stats["gauges"])):
+        if values:
+            lines.append("")
+            lines.append(f"{title:<32} {'value':>8}")
+            lines.extend(f"{name:<32} {value:>8}" for name, value in values.items())
+    return "\n".join(lines)
@@ -0,0 +1,143 @@
+import sqlite3
+import threading
+import time
+
+# Rollup tiers: table name -> bucket length in seconds
+ROLLUPS = (("rollup_1m", 60), ("rollup_1h", 3600))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    metric TEXT NOT NULL,
+    ts REAL NOT NULL,
+    value REAL,
+    PRIMARY KEY (metric, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS samples_ts ON samples (ts, metric, value);
+CREATE TABLE IF NOT EXISTS rollup_1m (
+    metric TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    min REAL, avg REAL, max REAL, count INTEGER,
+    PRIMARY KEY (metric, bucket)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rollup_1m_bucket ON rollup_1m (bucket, metric, min, avg, max, count);
+CREATE TABLE IF NOT EXISTS rollup_1h (
+    metric TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    min REAL, avg REAL, max REAL, count INTEGER,
+    PRIMARY KEY (metric, bucket)
+) WITHOUT ROWID;
+"""
+
+
+class MetricStore:
+    """
+    Durable metric storage in a local SQLite database.
+
+    Samples are buffered in memory and written in one transaction per `batch_size` samples.
+    After each write, the 1-minute buckets touched by the batch are recomputed from the raw
+    samples, and the 1-hour buckets from the 1-minute buckets, so each rollup stores the
+    min, avg, max and count of its bucket. Every tier has its own retention, so raw
+    per-second data is only kept for a short time while long queries read the small rollup
+    tables. The database uses WAL mode, so reads do not block the writer.
+
+    The store can be used from several threads; access to the connection is serialized.
+
+    Args:
+        path (str): Database file path.
+        batch_size (int, optional): Samples buffered before they are written. Defaults to 60.
+        retention (dict, optional): Seconds of data kept per table ("samples", "rollup_1m",
+            "rollup_1h"). Defaults to 1 day, 7 days and 365 days.
+    """
+
+    def __init__(self, path, batch_size=60, retention=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.retention = {"samples": 86400, "rollup_1m": 7 * 86400, "rollup_1h": 365 * 86400}
+        self.retention.update(retention or {})
+        self._pending = []
+        self._last_prune = 0.0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def add(self, timestamp, values):
+        """
+        Buffer one sample and write the buffer when it is full.
+
+        Args:
+            timestamp (float): Sample time in seconds since the epoch.
+            values (dict): Value per metric name.
+        """
+        with self._lock:
+            self._pending.extend((name, timestamp, value) for name, value in values.items())
+            if len(self._pending) >= self.batch_size * max(1, len(values)):
+                self._flush()
+
+    def flush(self):
+        """Write the buffered samples and update the rollups."""
+        with self._lock:
+            self._flush()
+
+    def query(self, metric, start, end, resolution=None):
+        """
+        Return the history of a metric between two times.
+
+        Args:
+            metric (str): Metric name, e.g. "cpu".
+            start (float): Start time in seconds since the epoch.
+            end (float): End time in seconds since the epoch.
+            resolution (str, optional): "raw", "1m" or "1h". Defaults to the finest tier that
+                keeps the query small: raw up to 1 hour, 1-minute buckets up to 2 days and
+                1-hour buckets beyond that.
+
+        Returns:
+            list of tuple: (time, min, avg, max) rows in time order. For raw samples, min, avg
+            and max are the sample value.
+        """
+        if resolution is None:
+            span = end - start
+            resolution = "raw" if span <= 3600 else "1m" if span <= 2 * 86400 else "1h"
+        with self._lock:
+            self._flush()
+            if resolution == "raw":
+                rows = self._db.execute(
+                    "SELECT ts, value, value, value FROM samples WHERE metric = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+                    (metric, start, end))
+            else:
+                rows = self._db.execute(
+                    f"SELECT bucket, min, avg, max FROM rollup_{resolution} WHERE metric = ? AND bucket BETWEEN ? AND ? ORDER BY bucket",
+                    (metric, start, end))
+            return rows.fetchall()
+
+    def close(self):
+        """Write the buffered samples and close the database."""
+        with self._lock:
+            self._flush()
+            self._db.close()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        pending = self._pending
+        self._pending = []
+        first = min(row[1] for row in pending)
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO samples (metric, ts, value) VALUES (?, ?, ?)", pending)
+            self._db.execute(
+                "INSERT OR REPLACE INTO rollup_1m "
+                "SELECT metric, CAST(ts / 60 AS INTEGER) * 60 AS b, MIN(value), AVG(value), MAX(value), COUNT(value) "
+                "FROM samples WHERE ts >= ? GROUP BY b, metric",
+                (first - first % 60,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO rollup_1h "
+                "SELECT metric, bucket / 3600 * 3600 AS b, MIN(min), SUM(avg * count) / SUM(count), MAX(max), SUM(count) "
+                "FROM rollup_1m WHERE bucket >= ? GROUP BY b, metric",
+                (int(first - first % 3600),))
+            now = time.time()
+            if now - self._last_prune >= 3600:
+                self._last_prune = now
+                self._db.execute("DELETE FROM samples WHERE ts < ?", (now - self.retention["samples"],))
+                for table, _ in ROLLUPS:
+                    self._db.execute(f"DELETE FROM {table} WHERE bucket < ?", (now - self.retention[table],))
@@ -0,0 +1,175 @@
+import os
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+# inotify event masks, see inotify(7)
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = IN_ATTRIB | IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_ONLYDIR
+
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class InotifyWatcher:
+    """
+    Watches directory trees for file creation, permission changes, moves and deletions.
+
+    inotify watches a single directory per watch descriptor, so every subdirectory gets its
+    own watch. New subdirectories are watched as soon as their creation is reported. The
+    kernel API is reached through ctypes, so no extra package or service is needed; it is
+    only available on Linux.
+
+    Args:
+        directories (list of str): Directory trees to watch.
+
+    Raises:
+        OSError: If inotify is unavailable or the watch limit
+            (/proc/sys/fs/inotify/max_user_watches) is reached.
+    """
+
+    def __init__(self, directories):
+        self.directories = list(directories)
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 failed: {os.strerror(err)}")
+        self._paths = {}  # watch descriptor -> directory path
+        self._wds = {}  # directory path -> watch descriptor
+        try:
+            for directory in self.directories:
+                self.add_tree(directory)
+        except OSError:
+            self.close()
+            raise
+
+    def add_tree(self, path):
+        """
+        Add watches for a directory and every directory below it.
+
+        Args:
+            path (str): Root of the directory tree.
+
+        Raises:
+            OSError: If the inotify watch limit is reached.
+        """
+        pending = [path]
+        while pending:
+            directory = pending.pop()
+            if not self._add_watch(directory):
+                continue
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+            except OSError:
+                continue
+
+    def remove_tree(self, path):
+        """
+        Remove the watches for a directory and every directory below it.
+
+        Args:
+            path (str): Root of the directory tree.
+        """
+        prefix = path.rstrip(os.sep) + os.sep
+        for directory in [d for d in self._wds if d == path or d.startswith(prefix)]:
+            wd = self._wds.pop(directory)
+            self._paths.pop(wd, None)
+            self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, timeout=None, settle=0.1):
+        """
+        Wait for events and return the paths they touched.
+
+        After the first event arrives, the watcher waits `settle` seconds so that bursts of
+        events (package upgrades, editors writing temp files) are handled as one batch.
+
+        Args:
+            timeout (float, optional): Seconds to wait for the first event. None waits forever.
+            settle (float, optional): Seconds to collect further events. Defaults to 0.1.
+
+        Returns:
+            tuple: (paths, overflow) where `paths` is a set of touched file and directory paths
+            and `overflow` is True if the kernel event queue overflowed and events were lost.
+
+        Raises:
+            OSError: If new directories cannot be watched because the watch limit is reached.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set(), False
+        if settle:
+            select.select([], [], [], settle)
+
+        paths = set()
+        overflow = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            overflow |= self._parse(data, paths)
+        return paths, overflow
+
+    def close(self):
+        """Close the inotify file descriptor and drop all watches."""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+        self._paths.clear()
+        self._wds.clear()
+
+    def _add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise OSError(err, f"inotify watch limit reached while watching {path}")
+            return False
+        self._paths[wd] = path
+        self._wds[path] = wd
+        return True
+
+    def _parse(self, data, paths):
+        overflow = False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            directory = self._paths.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                del self._paths[wd]
+                if self._wds.get(directory) == wd:
+                    del self._wds[directory]
+                continue
+
+            path = os.path.join(directory, os.fsdecode(name)) if name else directory
+            paths.add(path)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add_tree(path)
+                elif mask & IN_MOVED_FROM:
+                    self.remove_tree(path)
+        return overflow
@@ -0,0 +1,64 @@
+import socket
+import threading
+import time
+
+from aggregator import Aggregator, AgentHandler
+from protocol import encode_hello
+
+
+class Events(AgentHandler):
+    def __init__(self):
+        self.events = []
+        self.changed = threading.Event()
+
+    def agent_connected(self, name, address):
+        self.events.append(("connected", name))
+        self.changed.set()
+
+    def agent_disconnected(self, name):
+        self.events.append(("disconnected", name))
+        self.changed.set()
+
+
+def wait_for(handler, count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while len(handler.events) < count and time.monotonic() < deadline:
+        handler.changed.wait(0.05)
+        handler.changed.clear()
+    return handler.events
+
+
+def connect(aggregator, name):
+    sock = socket.create_connection(("127.0.0.1", aggregator.port))
+    sock.sendall(encode_hello(name))
+    return sock
+
+
+def test_silent_agent_is_disconnected_after_the_timeout():
+    handler = Events()
+    aggregator = Aggregator("127.0.0.1", 0, handler, timeout=0.3)
+    aggregator.start()
+    try:
+        sock = connect(aggregator, "web1")
+        assert wait_for(handler, 2) == [("connected", "web1"), ("disconnected", "web1")]
+        sock.close()
+    finally:
+        aggregator.stop()
+
+
+def test_closing_a_replaced_connection_does_not_disconnect_the_agent():
+    handler = Events()
+    aggregator = Aggregator("127.0.0.1", 0, handler)
+    aggregator.start()
+    try:
+        old = connect(aggregator, "web1")
+        wait_for(handler, 1)
+        new = connect(aggregator, "web1")
+        wait_for(handler, 2)
+        old.close()
+        time.sleep(0.3)
+        assert handler.events == [("connected", "web1"), ("connected", "web1")]
+        new.close()
+        assert wait_for(handler, 3)[-1] == ("disconnected", "web1")
+    finally:
+        aggregator.stop()
@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+from anomaly import AnomalyEngine, DETECTORS
+
+
+def false_positive_rate(detector, use_numpy):
+    # Two days of stationary Gaussian samples, one every 10 seconds; the seasonal baseline
+    # is scaled to that rate (a week half-life and an hour of warmup per hour of the day)
+    engine = AnomalyEngine([detector], seasonal_halflife=2520, seasonal_warmup=360, use_numpy=use_numpy)
+    rng = random.Random(1)
+    start = 1_700_000_000
+    flagged = checked = 0
+    for i in range(2 * 8640):
+        engine.observe("cpu", rng.gauss(50, 5))
+        anomalies = engine.evaluate(start + i * 10)
+        if i >= 8640:
+            checked += 1
+            flagged += len(anomalies)
+    return flagged / checked
+
+
+@pytest.mark.parametrize("detector", DETECTORS)
+def test_few_false_positives_on_stationary_data(detector):
+    assert false_positive_rate(detector, use_numpy=False) < 1e-3
+
+
+@pytest.mark.parametrize("detector", DETECTORS)
+def test_numpy_matches_python(detector):
+    pytest.importorskip("numpy")
+    assert false_positive_rate(detector, use_numpy=True) == false_positive_rate(detector, use_numpy=False)
+
+
+def test_spike_is_found():
+    engine = AnomalyEngine(use_numpy=False)
+    rng = random.Random(2)
+    for i in range(600):
+        engine.observe("cpu", rng.gauss(20, 2))
+        engine.evaluate(1_700_000_000 + i)
+    engine.observe("cpu", 60)
+    detectors = {anomaly.detector for anomaly in engine.evaluate(1_700_000_600)}
+    assert detectors == {"ewma", "zscore"}
+
+
+def test_sustained_anomaly_is_logged_once(monkeypatch, caplog):
+    import logging
+
+    import monitor
+
+    alerts = []
+    monkeypatch.setattr(monitor, "anomaly_engine", AnomalyEngine(["seasonal"], seasonal_warmup=60, use_numpy=False))
+    monkeypatch.setattr(monitor, "anomalous_series", set())
+    monkeypatch.setattr(monitor, "raise_alert", lambda alert_type, message, value=None: alerts.append(alert_type))
+    rng = random.Random(1)
+    start = 1_700_000_000
+    with caplog.at_level(logging.WARNING, logger="warning_logger"):
+        # A slow baseline keeps flagging a leak for a long time; then the memory is freed
+        for i, value in enumerate([50] * 200 + [90] * 300 + [50] * 10):
+            monitor.anomaly_engine.observe("memory", value + rng.gauss(0, 1))
+            monitor.check_anomalies(start + i)
+    messages = [record.getMessage() for record in caplog.records]
+    assert len(messages) == 2
+    assert messages[0].startswith("Anomaly detected in memory!")
+    assert messages[1] == "Anomaly in memory ended."
+    assert alerts == ["Anomaly Warning (memory)"]
@@ -0,0 +1,20 @@
+from collections import namedtuple
+
+import psutil
+
+from disks import DiskSampler
+
+Partition = namedtuple("Partition", ["device", "mountpoint", "fstype", "opts"])
+
+
+def test_read_only_and_image_mounts_are_skipped(monkeypatch):
+    partitions = [
+        Partition("/dev/sda1", "/", "ext4", "rw,relatime"),
+        Partition("/dev/loop0", "/snap/core/1", "squashfs", "ro,nodev,relatime"),
+        Partition("/dev/sr0", "/media/cdrom", "iso9660", "nosuid,nodev"),
+        Partition("/dev/sdb1", "/mnt/backup", "ext4", "ro,relatime"),
+        Partition("/dev/sdc1", "/data", "xfs", "rw,noatime,errors=remount-ro"),
+    ]
+    monkeypatch.setattr(psutil, "disk_partitions", lambda all=False: partitions)
+    sampler = DiskSampler()
+    assert [p.mountpoint for p in sampler.refresh_partitions()] == ["/", "/data"]
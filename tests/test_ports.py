@@ -0,0 +1,17 @@
+from ports import Socket, diff_snapshots, format_socket, socket_key
+
+
+def test_restarted_service_is_not_a_change():
+    ssh = Socket("tcp", "0.0.0.0", 22, "LISTEN", 1001)
+    web = Socket("tcp6", "::", 443, "LISTEN", 1002)
+    snapshot, opened, closed = diff_snapshots(None, [ssh, web], key=socket_key)
+    assert (opened, closed) == ([ssh, web], [])
+
+    # The web server restarts: same port, new socket inode
+    restarted = web._replace(inode=2002)
+    snapshot, opened, closed = diff_snapshots(snapshot, [ssh, restarted], key=socket_key)
+    assert (opened, closed) == ([], [])
+    assert format_socket(restarted) == format_socket(web)
+
+    snapshot, opened, closed = diff_snapshots(snapshot, [ssh], key=socket_key)
+    assert (opened, closed) == ([], [restarted])
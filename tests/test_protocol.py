@@ -0,0 +1,41 @@
+import logging
+
+import monitor
+from collector import Reporter
+from protocol import FILES, HEADER, decode, encode_delta
+
+
+def frames(data):
+    position = 0
+    while position < len(data):
+        length, message_type = HEADER.unpack_from(data, position)
+        position += HEADER.size
+        yield decode(message_type, data[position:position + length])
+        position += length
+
+
+def test_long_reset_is_split_and_marked():
+    lines = [f"/etc/file-{i:05d}-{'x' * 40}" for i in range(3000)]
+    deltas = list(frames(encode_delta(FILES, lines, [], reset=True)))
+    assert len(deltas) > 1
+    assert all(delta.reset for delta in deltas)
+    assert [delta.more for delta in deltas] == [True] * (len(deltas) - 1) + [False]
+    assert [line for delta in deltas for line in delta.added] == lines
+
+
+def test_resent_state_logs_only_changes(caplog):
+    handler = monitor.MonitorAgentHandler(Reporter())
+    handler.agent_connected("web1", ("127.0.0.1", 5000))
+    lines = [f"/etc/file-{i:05d}-{'x' * 40}" for i in range(3000)]
+    with caplog.at_level(logging.WARNING, logger="warning_logger"):
+        for delta in frames(encode_delta(FILES, lines, [], reset=True)):
+            handler.agent_delta("web1", delta)
+        assert caplog.records == []  # The first state is not a change
+
+        # The agent reconnects and resends its state, with one file fixed and one found
+        changed = lines[1:] + ["/etc/new"]
+        for delta in frames(encode_delta(FILES, changed, [], reset=True)):
+            handler.agent_delta("web1", delta)
+    messages = sorted(record.getMessage() for record in caplog.records)
+    assert messages == [f"Insecure file fixed on agent web1: {lines[0]}", "Insecure file found on agent web1: /etc/new"]
+    assert handler.agents["web1"].insecure_files == 3000
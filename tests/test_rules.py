@@ -0,0 +1,48 @@
+from rules import Condition, Rule, RuleEngine, parse_rule
+
+
+def observe(engine, series, start, end, value):
+    events = []
+    for timestamp in range(start, end):
+        events.extend(engine.observe(series, timestamp, value))
+    return events
+
+
+def test_rule_fires_after_its_duration():
+    engine = RuleEngine([parse_rule("High CPU: cpu > 90 for 5m clear when < 80 for 1m")])
+    events = observe(engine, "cpu", 0, 400, 95)
+    assert [(event.active, event.timestamp) for event in events] == [(True, 300)]
+
+
+def test_rule_clears_after_the_clear_duration():
+    engine = RuleEngine([parse_rule("High CPU: cpu > 90 for 5m clear when < 80 for 1m")])
+    observe(engine, "cpu", 0, 400, 95)
+    assert observe(engine, "cpu", 400, 450, 85) == []
+    events = observe(engine, "cpu", 450, 600, 70)
+    assert [event.active for event in events] == [False]
+
+
+def test_fractional_rule_stays_clear_after_clearing():
+    engine = RuleEngine([parse_rule("Uplink: net_sent > 100 for 80% of 10m clear when < 50 for 1m")])
+    events = observe(engine, "net_sent", 0, 700, 150)
+    events += observe(engine, "net_sent", 700, 2000, 10)
+    assert [(event.active, event.timestamp) for event in events] == [(True, 600), (False, 759)]
+
+
+def test_sample_after_a_gap_does_not_fire_on_its_own():
+    engine = RuleEngine([parse_rule("High CPU: cpu > 90 for 5m")])
+    observe(engine, "cpu", 0, 400, 50)
+    # The series goes quiet for longer than the window, then comes back above the threshold
+    assert observe(engine, "cpu", 1000, 1001, 95) == []
+    assert engine.observe("cpu", 1200, 95) == []
+    events = observe(engine, "cpu", 1201, 1400, 95)
+    assert [event.active for event in events] == [True]
+    assert events[0].timestamp >= 1000 + 300
+
+
+def test_generated_rule_fires_once_and_clears():
+    engine = RuleEngine([])
+    rule = Rule("Disk Usage Warning (/data)", "mount /data", Condition(">", 90.0, 0.0, 1.0), None)
+    events = [engine.observe_rule(rule, "mount /data", timestamp, value)
+              for timestamp, value in enumerate([50, 95, 96, 97, 80, 85, 99])]
+    assert [event and event.active for event in events] == [None, True, None, None, False, None, True]
@@ -0,0 +1,60 @@
+import os
+
+from scanner import InsecureFileScanner
+
+
+def scan_until_changed(scanner):
+    for _ in range(scanner.full_rescan_every):
+        changes = scanner.scan()
+        if changes != ([], []):
+            return changes
+    return changes
+
+
+def test_mode_change_in_unchanged_directory_is_found(tmp_path):
+    directory = tmp_path / "sub"
+    directory.mkdir()
+    paths = []
+    for i in range(5):
+        path = directory / f"file{i}"
+        path.write_text("")
+        path.chmod(0o600)
+        paths.append(str(path))
+
+    scanner = InsecureFileScanner([str(tmp_path)], full_rescan_every=3, workers=1)
+    assert scanner.scan() == ([], [])
+
+    # chmod does not change the mtime of the directory, so it is not listed again, but the
+    # file is stat'ed again within full_rescan_every scans
+    os.chmod(paths[3], 0o644)
+    assert scan_until_changed(scanner) == ([paths[3]], [])
+    os.chmod(paths[3], 0o600)
+    assert scan_until_changed(scanner) == ([], [paths[3]])
+
+
+def test_files_are_restated_in_shares(tmp_path):
+    paths = []
+    for i in range(10):
+        path = tmp_path / f"file{i}"
+        path.write_text("")
+        path.chmod(0o600)
+        paths.append(str(path))
+
+    scanner = InsecureFileScanner([str(tmp_path)], full_rescan_every=5, workers=1)
+    scanner.scan()
+    for path in paths:
+        os.chmod(path, 0o644)
+    # Every scan stats a fifth of the files, the fifth one being the full rescan
+    found = [scanner.scan()[0] for _ in range(5)]
+    assert [len(added) for added in found] == [2, 2, 2, 2, 2]
+    assert sorted(path for added in found for path in added) == sorted(paths)
+
+
+def test_removed_file_is_dropped(tmp_path):
+    path = tmp_path / "file"
+    path.write_text("")
+    path.chmod(0o644)
+    scanner = InsecureFileScanner([str(tmp_path)], workers=1)
+    assert scanner.scan() == ([str(path)], [])
+    path.unlink()
+    assert scanner.scan() == ([], [str(path)])